@@ -1,16 +1,47 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Request, Query
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import sys
 import shutil
 import subprocess
+import tarfile
 import asyncio
+import functools
+import hashlib
+import multiprocessing
+import re
+import tempfile
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from typing import List
 import json
 from datetime import datetime
 import logging
 
+import pandas as pd
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+import batch
+import background_store
+import chain_contacts
+import compute_summary
+import downloads
+import generate_ints
+import metrics
+import pipeline
+from naccess_runner import available_cores
+from interface_store import InterfaceStore
+from job_store import EventSink, JobStore, new_job_id
+from result_cache import ResultCache, cache_key, parameters as cache_parameters
+from scheduler import PDB_BYTES_PER_ATOM, AtomCounter, JobScheduler, QueueFull, estimate_atoms
+from results_dataset import ResultsDataset
+from structure import input_path, load_structure
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,108 +62,530 @@ INPUT_DIR = "input"
 INTERFACE_DIR = "interface"
 SPLIT_DIR = "split_chains"
 RSA_DIR = "rsa"
+CACHE_DIR = os.environ.get("PDI_CACHE_DIR", "cache")
+# Every finished structure is also appended to a partitioned Parquet dataset (GET /results)
+RESULTS_DIR = os.environ.get("PDI_RESULTS_DIR", "results")
+# Per-atom and per-residue interface rows of every structure (GET /interface/...)
+INTERFACE_DB = os.environ.get("PDI_INTERFACE_DB", "interface.sqlite")
+# Every job runs in its own workspaces/<job_id>/{input,split_chains,rsa,interface}
+WORKSPACE_DIR = os.environ.get("PDI_WORKSPACE_DIR", "workspaces")
+CACHE_MAX_BYTES = int(os.environ.get("PDI_CACHE_MAX_BYTES", 1 << 30))
+JOBS_DB = os.environ.get("PDI_JOBS_DB", "jobs.sqlite")
+JOB_TTL = float(os.environ.get("PDI_JOB_TTL", 7 * 24 * 3600))
+CLEANUP_INTERVAL = float(os.environ.get("PDI_CLEANUP_INTERVAL", 3600))
+# Each API process refreshes its unfinished jobs every PDI_HEARTBEAT_INTERVAL seconds; jobs that
+# missed three heartbeats belong to a process that died and are failed ("Interrupted by restart")
+HEARTBEAT_INTERVAL = float(os.environ.get("PDI_HEARTBEAT_INTERVAL", 30))
+# Progress events: how often /events polls the job store, and the keep-alive period
+EVENT_POLL_INTERVAL = float(os.environ.get("PDI_EVENT_POLL_INTERVAL", 0.5))
+EVENT_KEEPALIVE = 15.0
+
+# Job execution: "pool" runs the pipeline in long-lived worker processes,
+# "snakemake" shells out to the Snakemake workflow for every upload
+BACKEND = os.environ.get("PDI_BACKEND", "pool")
+WORKERS = int(os.environ.get("PDI_WORKERS", available_cores()))
+MAX_JOBS = int(os.environ.get("PDI_MAX_JOBS", WORKERS))
+# Admission control: at most PDI_MAX_QUEUE jobs wait for a slot, PDI_CLIENT_QUEUE of them from one
+# client (further uploads get 429), and one client holds at most PDI_CLIENT_JOBS slots at a time
+MAX_QUEUE = int(os.environ.get("PDI_MAX_QUEUE", 100))
+CLIENT_QUEUE = int(os.environ.get("PDI_CLIENT_QUEUE", 20))
+CLIENT_JOBS = int(os.environ.get("PDI_CLIENT_JOBS", max(1, MAX_JOBS // 2)))
+# Waiting jobs run smallest first; a job's estimated size halves every PDI_PRIORITY_AGING seconds it waits
+PRIORITY_AGING = float(os.environ.get("PDI_PRIORITY_AGING", 120))
+# Clients are told apart by this request header (e.g. X-API-Key behind a proxy), else by their address
+CLIENT_HEADER = os.environ.get("PDI_CLIENT_HEADER", "")
+# Which chain pairs ΔASA is computed for: "protein_nucleic" (protein vs DNA/RNA chains in contact) or "all"
+INTERFACE_MODE = os.environ.get("PDI_INTERFACE_MODE", chain_contacts.DEFAULT_MODE)
+# Residue background of every job: the Residue,Frequency table PDI_BACKGROUND_TABLE, else the pinned set
+# PDI_BACKGROUND_SET ("name[:version]", default the built-in "reference") of PDI_BACKGROUND_DB. It is never
+# derived from a job's own .rsa files, so a result does not depend on what else was uploaded with it.
+BACKGROUND_TABLE = os.environ.get("PDI_BACKGROUND_TABLE") or None
+BACKGROUND_DB = os.environ.get("PDI_BACKGROUND_DB", os.path.join(RSA_DIR, background_store.DEFAULT_DB))
+BACKGROUND_SET = os.environ.get("PDI_BACKGROUND_SET", background_store.REFERENCE_SET)
+
+# Uploads are streamed into a per-request staging directory next to the workspaces
+# and moved into place only once every file has been received
+STAGING_DIR = os.path.join(WORKSPACE_DIR, ".staging")
+UPLOAD_CHUNK = 1 << 20
+MAX_FILE_BYTES = int(os.environ.get("PDI_MAX_FILE_BYTES", 100 << 20))
+MAX_REQUEST_BYTES = int(os.environ.get("PDI_MAX_REQUEST_BYTES", 500 << 20))
+MAX_BATCH_BYTES = int(os.environ.get("PDI_MAX_BATCH_BYTES", 4 << 30))
+# Multipart boundaries and part headers on top of the file bytes
+MULTIPART_OVERHEAD = 1 << 20
+
+class BodyLimit:
+    """
+    ASGI middleware: a request to one of ``limits``' paths is answered with 413 as soon as its
+    body exceeds the path's byte budget, before it is spooled (chunked requests included)
+    """
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        detail = f"Request exceeds {limit - MULTIPART_OVERHEAD} bytes"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > limit:
+                # Raised inside the form parsing of the endpoint, so it is answered like any HTTPException
+                raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+# The decompressed sizes are checked again while each file is stored (stream_upload)
+app.add_middleware(BodyLimit, limits={"/upload": MAX_REQUEST_BYTES + MULTIPART_OVERHEAD,
+                                      "/batch": MAX_BATCH_BYTES + MULTIPART_OVERHEAD})
 
 # Create directories if they don't exist
-for directory in [INPUT_DIR, INTERFACE_DIR, SPLIT_DIR, RSA_DIR]:
+for directory in [INPUT_DIR, INTERFACE_DIR, SPLIT_DIR, RSA_DIR, WORKSPACE_DIR, STAGING_DIR]:
     os.makedirs(directory, exist_ok=True)
 
-# Store job status
-job_status = {}
+result_cache = ResultCache(CACHE_DIR, CACHE_MAX_BYTES)
+results_dataset = ResultsDataset(RESULTS_DIR)
+interface_store = InterfaceStore(INTERFACE_DB)
+# Absolute paths for the workers and Snakemake; a set pinned without a version keeps the version
+# that was the latest at startup
+BACKGROUND = {
+    "background_set": None if BACKGROUND_TABLE else background_store.resolve_set(BACKGROUND_SET, BACKGROUND_DB),
+    "background_table": BACKGROUND_TABLE and os.path.abspath(BACKGROUND_TABLE),
+    "background_db": os.path.abspath(BACKGROUND_DB),
+}
+# Entries computed against another background are not reused
+CACHE_PARAMS = cache_parameters(interface_mode=INTERFACE_MODE,
+                                background=compute_summary.load_background(**BACKGROUND)[0])
 
-class JobManager:
-    def __init__(self):
-        self.jobs = {}
-    
-    def create_job(self, job_id: str, pdb_files: List[str]):
-        self.jobs[job_id] = {
-            "status": "pending",
-            "pdb_files": pdb_files,
-            "created_at": datetime.now().isoformat(),
-            "progress": 0,
-            "message": "Job created",
-            "output_files": []
-        }
-    
-    def update_job(self, job_id: str, status: str, progress: int = None, message: str = None):
-        if job_id in self.jobs:
-            self.jobs[job_id]["status"] = status
-            if progress is not None:
-                self.jobs[job_id]["progress"] = progress
-            if message is not None:
-                self.jobs[job_id]["message"] = message
-    
-    def get_job(self, job_id: str):
-        return self.jobs.get(job_id)
+# SHA-256 of an uploaded file -> its result-cache key, so re-uploads skip re-hashing the structure
+# (least recently used entries are dropped beyond UPLOAD_KEYS_MAX)
+UPLOAD_KEYS_MAX = int(os.environ.get("PDI_UPLOAD_KEYS_MAX", 10000))
+upload_keys = OrderedDict()
+
+worker_pool = None
+cleanup_task = None
+heartbeat_task = None
+
+# Uploads are admitted into a bounded queue and run smallest first, with per-client quotas
+scheduler = JobScheduler(MAX_JOBS, MAX_QUEUE, CLIENT_JOBS, CLIENT_QUEUE, PRIORITY_AGING)
+
+# Jobs are kept in SQLite so they survive restarts and are shared by all uvicorn workers
+job_manager = JobStore(JOBS_DB)
+
+# Prometheus metrics of this process (GET /metrics); every uvicorn worker exports its own
+metrics_registry = metrics.Registry()
+stage_seconds = metrics_registry.histogram("pdi_stage_seconds", "Time spent in each stage of a job", ["stage"])
+jobs_total = metrics_registry.counter("pdi_jobs_total", "Finished jobs by outcome", ["status"])
+upload_bytes = metrics_registry.counter("pdi_upload_bytes_total", "Bytes of structure files received")
+queue_depth = metrics_registry.gauge("pdi_queue_depth", "Admitted jobs waiting for a free job slot")
+active_jobs = metrics_registry.gauge("pdi_active_jobs", "Jobs holding a job slot")
+rejected_jobs = metrics_registry.counter("pdi_rejected_jobs_total", "Uploads refused with 429", ["reason"])
+pool_workers = metrics_registry.gauge("pdi_workers", "Processes in the worker pool")
+active_workers = metrics_registry.gauge("pdi_active_workers", "Worker processes running a pipeline task")
+cache_hits = metrics_registry.counter("pdi_cache_hits_total", "Result cache lookups that found an entry")
+cache_misses = metrics_registry.counter("pdi_cache_misses_total", "Result cache lookups that found no entry")
+cache_hit_ratio = metrics_registry.gauge("pdi_cache_hit_ratio", "Share of result cache lookups that were hits")
+cache_bytes = metrics_registry.gauge("pdi_cache_bytes", "Size of the result cache")
+# Pipeline tasks submitted to the worker pool and not finished yet
+pool_tasks = 0
+
+def job_workspace(job_id: str):
+    """Private input/split_chains/rsa/interface directories of one job"""
+    root = os.path.join(WORKSPACE_DIR, job_id)
+    return {
+        "root": root,
+        "input": os.path.join(root, "input"),
+        "split_chains": os.path.join(root, "split_chains"),
+        "rsa": os.path.join(root, "rsa"),
+        "interface": os.path.join(root, "interface"),
+    }
+
+def create_workspace(job_id: str):
+    workspace = job_workspace(job_id)
+    for category in ("input", "split_chains", "rsa", "interface"):
+        os.makedirs(workspace[category], exist_ok=True)
+    return workspace
+
+def output_files_for(pdb_id: str, job_id: str):
+    """Interface CSVs of a PDB ID that exist in a job's workspace"""
+    interface_dir = job_workspace(job_id)["interface"]
+    output_files = []
+    for file_type, suffix in (("interface_summary", "interface_summary"), ("residue_propensity", "residue_propensity")):
+        filename = f"{pdb_id}_{suffix}.csv"
+        path = os.path.join(interface_dir, filename)
+        if os.path.exists(path):
+            output_files.append({
+                "filename": filename,
+                "type": file_type,
+                "pdb_id": pdb_id,
+                "path": path,
+                "url": f"/jobs/{job_id}/download/{filename}"
+            })
+    return output_files
+
+def profile_files_for(pdb_id: str, job_id: str):
+    """cProfile dump of a PDB ID in a job's workspace (jobs uploaded with profile=true)"""
+    filename = f"{pdb_id}.prof"
+    path = os.path.join(job_workspace(job_id)["interface"], filename)
+    if not os.path.exists(path):
+        return []
+    return [{"filename": filename, "type": "profile", "pdb_id": pdb_id, "path": path,
+             "url": f"/jobs/{job_id}/download/{filename}"}]
+
+def cache_files_for(pdb_id: str, job_id: str):
+    """Pipeline outputs of a PDB ID in a job's workspace, grouped by cache category"""
+    workspace = job_workspace(job_id)
+    split_dir, rsa_dir = workspace["split_chains"], workspace["rsa"]
+    chains = sorted(generate_ints.chain_asa_files(pdb_id, rsa_dir))
+    return {
+        # The pool writes split_chains/<pdb>_<chain>.pdb, Snakemake split_chains/<pdb>/<pdb>_<chain>.pdb
+        "split_chains": [
+            path for directory in (split_dir, os.path.join(split_dir, pdb_id))
+            for path in [os.path.join(directory, f"{pdb_id}_{chain}.pdb") for chain in chains]
+            if os.path.exists(path)
+        ],
+        "rsa": [
+            path for path in [os.path.join(rsa_dir, f"{pdb_id}{suffix}") for suffix in (".asa", ".rsa")]
+            + [os.path.join(rsa_dir, f"{pdb_id}_{chain}{suffix}") for chain in chains for suffix in (".asa", ".rsa")]
+            if os.path.exists(path)
+        ] + compute_summary.int_files(pdb_id, rsa_dir, chains),
+        "interface": [f["path"] for f in output_files_for(pdb_id, job_id)],
+    }
+
+def append_results_from_csv(job_id: str, pdb_ids: List[str]):
+    """Add structures whose tables only exist as CSVs (cache hits, Snakemake runs) to the results dataset"""
+    workspace = job_workspace(job_id)
+    tables, chains = {}, {}
+    for pdb_id in pdb_ids:
+        paths = [os.path.join(workspace["interface"], f"{pdb_id}_{suffix}.csv")
+                 for suffix in ("interface_summary", "residue_propensity")]
+        if all(os.path.exists(path) for path in paths):
+            tables[pdb_id] = tuple(pd.read_csv(path) for path in paths)
+            # The chains the pipeline splits the (first model of the) upload into
+            structure = load_structure(input_path(workspace["input"], pdb_id))
+            chains[pdb_id] = sorted(set(structure.chain_ids.tolist()))
+    if tables:
+        results_dataset.append(*compute_summary.dataset_rows(tables, chains), batch=job_id)
+
+def index_interfaces(job_id: str, pdb_ids: List[str], keys: dict):
+    """Store the interface rows of structures the workers did not store themselves (Snakemake runs)"""
+    workspace = job_workspace(job_id)
+    for pdb_id in pdb_ids:
+        structure = load_structure(input_path(workspace["input"], pdb_id))
+        paths = compute_summary.int_files(pdb_id, workspace["rsa"], set(structure.chain_ids.tolist()))
+        if paths:
+            interface_store.add(pdb_id, compute_summary.read_int_columns(paths), structure, job_id, keys[pdb_id],
+                                chain_contacts.partners_or_all(structure, INTERFACE_MODE, name=pdb_id)[1])
+
+def restore_cached(job_id: str, pdb_id: str, key: str):
+    """Copy a cached result into the job's workspace; returns its output files, or None on a cache miss"""
+    if not result_cache.lookup(key):
+        return None
+    result_cache.restore(key, {"interface": job_workspace(job_id)["interface"]}, pdb_id)
+    interface_store.alias(key, pdb_id, job_id)
+    return output_files_for(pdb_id, job_id)
+
+def store_result(job_id: str, pdb_id: str, key: str):
+    """Publish a computed structure to the result cache; returns its output and profile files"""
+    files = output_files_for(pdb_id, job_id)
+    if files:
+        with metrics.span("cache_store", pdb_id=pdb_id):
+            result_cache.store(key, pdb_id, cache_files_for(pdb_id, job_id), {"params": CACHE_PARAMS})
+    return files + profile_files_for(pdb_id, job_id)
+
+def record_spans(job_id: str, spans: list):
+    """Add timing spans to the stage histograms and to the job's events (GET /jobs/{job_id}/spans)"""
+    for record in spans:
+        stage_seconds.observe(record["seconds"], stage=record["span"])
+    if spans:
+        job_manager.add_spans(job_id, spans)
+
+def set_pool_tasks(change: int):
+    global pool_tasks
+    pool_tasks += change
+    active_workers.set(min(pool_tasks, WORKERS))
+
+def client_id(request: Request):
+    """Who an upload counts against for the per-client quotas"""
+    if CLIENT_HEADER and request.headers.get(CLIENT_HEADER):
+        return request.headers[CLIENT_HEADER].split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def too_many_requests(e: QueueFull):
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
-job_manager = JobManager()
+async def run_pool_workflow(job_id: str, pdb_ids: List[str], keys: dict):
+    """Run the pipeline stages on the long-lived worker pool, one task per PDB ID"""
+    loop = asyncio.get_running_loop()
+    workspace = job_workspace(job_id)
+    profile = job_manager.get_job(job_id).get("profile", False)
+    futures = []
+    for pdb_id in pdb_ids:
+        # Workers report every stage straight into the job store through an EventSink
+        call = functools.partial(
+            pipeline.run_pipeline, pdb_id, workspace["input"], workspace["split_chains"], workspace["rsa"],
+            workspace["interface"],
+            progress=EventSink(JOBS_DB, job_id, pdb_id, len(pdb_ids)), dataset=results_dataset, batch=job_id,
+            interface_store=interface_store, key=keys[pdb_id], interface_mode=INTERFACE_MODE, **BACKGROUND)
+        if profile:
+            call = functools.partial(metrics.call_profiled, os.path.join(workspace["interface"], f"{pdb_id}.prof"),
+                                     call)
+        futures.append(loop.run_in_executor(worker_pool, call))
+    set_pool_tasks(len(futures))
+    errors = []
+    for done, future in enumerate(asyncio.as_completed(futures), start=1):
+        try:
+            result = await future
+            record_spans(job_id, result["spans"])
+            logger.info(f"Pipeline finished for {result['pdb_id']}")
+        except Exception as e:
+            logger.error(f"Pipeline failed: {str(e)}")
+            errors.append(str(e))
+        finally:
+            set_pool_tasks(-1)
+        job_manager.update_job(job_id, "running", message=f"Processed {done}/{len(futures)} structures...")
+    if errors:
+        raise RuntimeError("; ".join(errors))
+
+SNAKEMAKE_RULE = re.compile(r"^(?:local)?(?:rule|checkpoint) (\w+):")
+SNAKEMAKE_STEPS = re.compile(r"(\d+) of (\d+) steps \(\d+%\) done")
 
 async def run_snakemake_workflow(job_id: str, pdb_ids: List[str]):
     """Run the Snakemake workflow for given PDB IDs"""
+    # Create PDB IDs string for snakemake
+    pdb_ids_str = ",".join(pdb_ids)
+    workspace = job_workspace(job_id)
+
+    # Run snakemake command on the job's workspace; --nolock lets several jobs run at once.
+    # Chains are separate jobs, so the job's share of the cores computes them in parallel.
+    cmd = [
+        "snakemake",
+        "--cores", str(max(1, WORKERS // MAX_JOBS)),
+        "--nolock",
+        "--config", f"pdb_ids={pdb_ids_str}",
+        f"input_dir={workspace['input']}",
+        f"split_dir={workspace['split_chains']}",
+        f"rsa_dir={workspace['rsa']}",
+        f"interface_dir={workspace['interface']}",
+        f"interface_mode={INTERFACE_MODE}",
+        f"background_db={BACKGROUND['background_db']}",
+        f"background_table={BACKGROUND['background_table']}" if BACKGROUND_TABLE
+        else f"background_set={BACKGROUND['background_set']}",
+    ]
+
+    logger.info(f"Running command: {' '.join(cmd)}")
+    job_manager.update_job(job_id, "running", 10, "Processing PDB files...")
+
+    # Run the subprocess
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE
+    )
+
+    # Snakemake logs every rule it starts and "N of M steps (P%) done" to stderr
+    log = []
+    async for raw in process.stderr:
+        line = raw.decode(errors="replace").rstrip()
+        log.append(line)
+        rule = SNAKEMAKE_RULE.match(line)
+        steps = SNAKEMAKE_STEPS.search(line)
+        if rule:
+            job_manager.add_event(job_id, rule.group(1), f"Running rule {rule.group(1)}")
+        elif steps:
+            done, total = int(steps.group(1)), int(steps.group(2))
+            job_manager.add_event(job_id, "steps", f"{done} of {total} steps done",
+                                  10 + 70 * done // max(total, 1), done=done, total=total)
+    await process.wait()
+
+    if process.returncode != 0:
+        error_msg = "\n".join(log[-50:]) or "Unknown error"
+        logger.error(f"Snakemake failed: {error_msg}")
+        raise RuntimeError(error_msg)
+
+async def run_workflow(job_id: str, pdb_ids: List[str]):
+    """Serve cached structures, run the pipeline for the rest and cache the results"""
+    with metrics.recording() as spans:
+        try:
+            await compute_job(job_id, pdb_ids)
+            jobs_total.inc(status="completed")
+        except Exception as e:
+            logger.error(f"Error running workflow: {str(e)}")
+            job_manager.update_job(job_id, "failed", 0, f"Workflow failed: {str(e)}")
+            jobs_total.inc(status="failed")
+        finally:
+            # Jobs served from the cache (or failed before computing) leave the queue without a slot
+            scheduler.discard(job_id)
+    record_spans(job_id, spans)
+
+async def compute_job(job_id: str, pdb_ids: List[str]):
+    """run_workflow() without the error handling: raises if any structure fails"""
+    job_manager.update_job(job_id, "running", 5, "Checking result cache...")
+
+    # Structures analysed before with the same parameters are served from the cache
+    hashes = job_manager.get_job(job_id).get("sha256", {})
+    workspace = job_workspace(job_id)
+    keys = {}
+    for pdb_id in pdb_ids:
+        digest = hashes.get(pdb_id)
+        if digest in upload_keys:
+            upload_keys.move_to_end(digest)
+            keys[pdb_id] = upload_keys[digest]
+            continue
+        # Hashing, cache lookups and file copies run in threads so the event loop keeps serving requests
+        with metrics.span("cache_key", pdb_id=pdb_id):
+            keys[pdb_id] = await asyncio.to_thread(cache_key, input_path(workspace["input"], pdb_id), CACHE_PARAMS)
+        if digest is not None:
+            upload_keys[digest] = keys[pdb_id]
+            while len(upload_keys) > UPLOAD_KEYS_MAX:
+                upload_keys.popitem(last=False)
+    cached_files = []
+    pending = []
+    for pdb_id in pdb_ids:
+        with metrics.span("cache_lookup", pdb_id=pdb_id) as record:
+            files = await asyncio.to_thread(restore_cached, job_id, pdb_id, keys[pdb_id])
+            record["hit"] = files is not None
+            if record["hit"]:
+                cached_files.extend(files)
+            else:
+                pending.append(pdb_id)
+    await asyncio.to_thread(append_results_from_csv, job_id, [pdb_id for pdb_id in pdb_ids if pdb_id not in pending])
+
+    if not pending:
+        await asyncio.to_thread(remove_scratch, workspace)
+        job_manager.update_job(job_id, "completed", 100, f"Analysis completed from cache! {len(cached_files)} files.",
+                               output_files=cached_files)
+        return
+
+    # At most MAX_JOBS uploads compute at a time; the rest wait here
+    job_manager.update_job(job_id, "queued", 8, "Waiting for a free worker...")
+    async with scheduler.slot(job_id):
+        if BACKEND == "snakemake":
+            job_manager.update_job(job_id, "running", 10, "Starting Snakemake workflow...")
+            # Snakemake runs every stage in a process of its own; only the whole run is timed
+            with metrics.span("snakemake", structures=len(pending)):
+                await run_snakemake_workflow(job_id, pending)
+            await asyncio.to_thread(append_results_from_csv, job_id, pending)
+            await asyncio.to_thread(index_interfaces, job_id, pending, keys)
+        else:
+            job_manager.update_job(job_id, "running", 10, "Running pipeline on worker pool...")
+            await run_pool_workflow(job_id, pending, keys)
+
+    job_manager.update_job(job_id, "running", 80, "Workflow completed, checking outputs...")
+
+    # Check for output files and publish them to the shared content-addressed cache
+    output_files = list(cached_files)
+    for pdb_id in pending:
+        output_files.extend(await asyncio.to_thread(store_result, job_id, pdb_id, keys[pdb_id]))
+    await asyncio.to_thread(remove_scratch, workspace)
+
+    job_manager.update_job(job_id, "completed", 100, f"Analysis completed! Generated {len(output_files)} files.",
+                           output_files=output_files)
+
+async def run_batch_job(job_id: str, archive: str):
+    """Analyse every structure of an uploaded tarball into one Parquet summary/propensity pair"""
+    workspace = job_workspace(job_id)
     try:
-        job_manager.update_job(job_id, "running", 10, "Starting Snakemake workflow...")
-        
-        # Create PDB IDs string for snakemake
-        pdb_ids_str = ",".join(pdb_ids)
-        
-        # Run snakemake command
-        cmd = [
-            "snakemake", 
-            "--cores", "1",
-            "--config", f"pdb_ids={pdb_ids_str}",
-            "-f"  # Force re-run
+        job_manager.update_job(job_id, "queued", 5, "Waiting for a free worker...")
+        async with scheduler.slot(job_id):
+            job_manager.update_job(job_id, "running", 10, "Running batch...")
+
+            def progress(done, total):
+                job_manager.update_job(job_id, "running", 10 + 85 * done // max(total, 1),
+                                       f"Processed {done}/{total} structures...")
+
+            # Shards go to the shared worker pool (or a pool of their own with the Snakemake backend)
+            result = await asyncio.to_thread(batch.run_batch, archive, workspace["interface"], WORKERS,
+                                             executor=worker_pool, progress=progress,
+                                             dataset=results_dataset, batch_name=job_id,
+                                             interface_store=interface_store, interface_mode=INTERFACE_MODE,
+                                             **BACKGROUND)
+
+        output_files = [
+            {"filename": os.path.basename(result[kind]), "type": f"batch_{kind}",
+             "path": result[kind], "url": f"/jobs/{job_id}/download/{os.path.basename(result[kind])}"}
+            for kind in ("summary", "propensity")
         ]
-        
-        logger.info(f"Running command: {' '.join(cmd)}")
-        job_manager.update_job(job_id, "running", 30, "Processing PDB files...")
-        
-        # Run the subprocess
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode == 0:
-            job_manager.update_job(job_id, "running", 80, "Workflow completed, checking outputs...")
-            
-            # Check for output files
-            output_files = []
-            for pdb_id in pdb_ids:
-                interface_file = f"{pdb_id}_interface_summary.csv"
-                propensity_file = f"{pdb_id}_residue_propensity.csv"
-                
-                interface_path = os.path.join(INTERFACE_DIR, interface_file)
-                propensity_path = os.path.join(INTERFACE_DIR, propensity_file)
-                
-                if os.path.exists(interface_path):
-                    output_files.append({
-                        "filename": interface_file,
-                        "type": "interface_summary",
-                        "pdb_id": pdb_id,
-                        "path": interface_path
-                    })
-                
-                if os.path.exists(propensity_path):
-                    output_files.append({
-                        "filename": propensity_file,
-                        "type": "residue_propensity", 
-                        "pdb_id": pdb_id,
-                        "path": propensity_path
-                    })
-            
-            job_manager.jobs[job_id]["output_files"] = output_files
-            job_manager.update_job(job_id, "completed", 100, f"Analysis completed! Generated {len(output_files)} files.")
-            
-        else:
-            error_msg = stderr.decode() if stderr else "Unknown error"
-            logger.error(f"Snakemake failed: {error_msg}")
-            job_manager.update_job(job_id, "failed", 0, f"Workflow failed: {error_msg}")
-            
+        remove_scratch(workspace)
+        job_manager.update_job(job_id, "completed", 100,
+                               f"Batch completed! {result['done']} structures analysed, {result['failed']} failed.",
+                               output_files=output_files)
+        jobs_total.inc(status="completed")
     except Exception as e:
-        logger.error(f"Error running workflow: {str(e)}")
-        job_manager.update_job(job_id, "failed", 0, f"Error: {str(e)}")
+        logger.error(f"Error running batch: {str(e)}")
+        job_manager.update_job(job_id, "failed", 0, f"Batch failed: {str(e)}")
+        jobs_total.inc(status="failed")
+    finally:
+        scheduler.discard(job_id)
+
+def remove_scratch(workspace):
+    """Drop a finished job's inputs and intermediates; its interface CSVs stay until the job expires"""
+    for category in ("input", "split_chains", "rsa"):
+        shutil.rmtree(workspace[category], ignore_errors=True)
+
+def remove_job_artifacts(jobs):
+    """Delete the workspaces of expired jobs (published results stay in the cache)"""
+    for job in jobs:
+        shutil.rmtree(job_workspace(job["job_id"])["root"], ignore_errors=True)
+        interface_store.remove_job(job["job_id"])
+
+async def cleanup_jobs():
+    """Drop finished jobs older than JOB_TTL (and their files) every CLEANUP_INTERVAL seconds"""
+    while True:
+        try:
+            expired = job_manager.cleanup(JOB_TTL)
+            if expired:
+                remove_job_artifacts(expired)
+                logger.info(f"Removed {len(expired)} expired jobs")
+        except Exception as e:
+            logger.error(f"Job cleanup failed: {str(e)}")
+        await asyncio.sleep(CLEANUP_INTERVAL)
+
+def fail_interrupted_jobs():
+    """Fail the jobs of API processes that stopped (their workspaces go with the TTL cleanup)"""
+    interrupted = job_manager.fail_stale(3 * HEARTBEAT_INTERVAL)
+    if interrupted:
+        jobs_total.inc(len(interrupted), status="failed")
+        logger.warning(f"Failed {len(interrupted)} jobs interrupted by a restart: {', '.join(interrupted)}")
+
+async def heartbeat_jobs():
+    """Keep this process' jobs alive every HEARTBEAT_INTERVAL seconds and fail those of dead processes"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        try:
+            await asyncio.to_thread(job_manager.heartbeat)
+            await asyncio.to_thread(fail_interrupted_jobs)
+        except Exception as e:
+            logger.error(f"Job heartbeat failed: {str(e)}")
+
+@app.on_event("startup")
+async def start_worker_pool():
+    """Start the worker processes once; every job afterwards reuses them"""
+    global worker_pool, cleanup_task, heartbeat_task
+    fail_interrupted_jobs()
+    cleanup_task = asyncio.create_task(cleanup_jobs())
+    heartbeat_task = asyncio.create_task(heartbeat_jobs())
+    if BACKEND == "pool":
+        worker_pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                          initializer=pipeline.warm_up)
+        pool_workers.set(WORKERS)
+        logger.info(f"Started worker pool with {WORKERS} processes")
+
+@app.on_event("shutdown")
+async def stop_worker_pool():
+    for task in (cleanup_task, heartbeat_task):
+        if task is not None:
+            task.cancel()
+    if worker_pool is not None:
+        worker_pool.shutdown(wait=True, cancel_futures=True)
 
 @app.get("/", response_class=HTMLResponse)
 async def get_frontend():
@@ -384,7 +837,7 @@ async def get_frontend():
                 <div class="upload-icon">📁</div>
                 <h3>Drop PDB files here or click to browse</h3>
                 <p>Support for multiple PDB files (max 15 files)</p>
-                <input type="file" id="fileInput" class="file-input" multiple accept=".pdb">
+                <input type="file" id="fileInput" class="file-input" multiple accept=".pdb,.cif,.bcif,.gz">
                 <button class="upload-btn" onclick="document.getElementById('fileInput').click()">
                     Choose Files
                 </button>
@@ -410,6 +863,9 @@ async def get_frontend():
             <div class="results-section" id="resultsSection">
                 <h3>📊 Analysis Results</h3>
                 <div class="result-files" id="resultFiles"></div>
+                <a id="downloadAll" class="download-btn" style="display: none;" download>
+                    📦 Download all (ZIP)
+                </a>
             </div>
         </div>
         
@@ -425,6 +881,10 @@ async def get_frontend():
             
             fileInput.addEventListener('change', handleFileSelect);
             
+            function isStructureFile(file) {
+                return ['.pdb', '.cif', '.bcif'].some(ext => file.name.endsWith(ext) || file.name.endsWith(ext + '.gz'));
+            }
+
             // Drag and drop functionality
             uploadSection.addEventListener('dragover', (e) => {
                 e.preventDefault();
@@ -439,7 +899,7 @@ async def get_frontend():
             uploadSection.addEventListener('drop', (e) => {
                 e.preventDefault();
                 uploadSection.classList.remove('dragover');
-                const files = Array.from(e.dataTransfer.files).filter(file => file.name.endsWith('.pdb'));
+                const files = Array.from(e.dataTransfer.files).filter(isStructureFile);
                 handleFiles(files);
             });
             
@@ -454,9 +914,9 @@ async def get_frontend():
                     return;
                 }
                 
-                const pdbFiles = files.filter(file => file.name.endsWith('.pdb'));
+                const pdbFiles = files.filter(isStructureFile);
                 if (pdbFiles.length !== files.length) {
-                    showError('Please select only PDB files (.pdb extension)');
+                    showError('Please select only PDB or mmCIF files (.pdb, .cif, .bcif, optionally .gz)');
                     return;
                 }
                 
@@ -510,7 +970,7 @@ async def get_frontend():
                     if (response.ok) {
                         currentJobId = result.job_id;
                         showSuccess(`Files uploaded successfully! Job ID: ${currentJobId}`);
-                        pollJobStatus();
+                        watchJob();
                     } else {
                         showError(result.detail || 'Upload failed');
                         processBtn.disabled = false;
@@ -521,6 +981,35 @@ async def get_frontend():
                 }
             }
             
+            function watchJob() {
+                if (!currentJobId || !window.EventSource) return pollJobStatus();
+                
+                // Stage events are pushed by the server; polling is the fallback
+                const source = new EventSource(`/events/${currentJobId}`);
+                const onEvent = (e) => {
+                    const event = JSON.parse(e.data);
+                    if (event.progress !== null) {
+                        updateProgress(event.progress, event.message || '');
+                    } else if (event.message) {
+                        document.getElementById('statusMessage').textContent = event.message;
+                    }
+                    if (event.status === 'completed') {
+                        source.close();
+                        showResults(event.output_files || []);
+                        processBtn.disabled = false;
+                    } else if (event.status === 'failed') {
+                        source.close();
+                        showError('Processing failed: ' + event.message);
+                        processBtn.disabled = false;
+                    }
+                };
+                source.onmessage = onEvent;
+                source.onerror = () => {
+                    source.close();
+                    pollJobStatus();
+                };
+            }
+            
             async function pollJobStatus() {
                 if (!currentJobId) return;
                 
@@ -563,13 +1052,14 @@ async def get_frontend():
                     const fileCard = document.createElement('div');
                     fileCard.className = 'file-card';
                     
-                    const fileType = file.type === 'interface_summary' ? '🔬 Interface Summary' : '🧪 Residue Propensity';
+                    const fileType = file.type === 'interface_summary' ? '🔬 Interface Summary'
+                        : file.type === 'profile' ? '⏱️ Profile' : '🧪 Residue Propensity';
                     
                     fileCard.innerHTML = `
                         <h4>${fileType}</h4>
                         <p><strong>PDB ID:</strong> ${file.pdb_id}</p>
                         <p><strong>Filename:</strong> ${file.filename}</p>
-                        <a href="/download/${file.filename}" class="download-btn" download>
+                        <a href="${file.url || '/download/' + file.filename}" class="download-btn" download>
                             ⬇️ Download
                         </a>
                     `;
@@ -577,6 +1067,11 @@ async def get_frontend():
                     resultFiles.appendChild(fileCard);
                 });
                 
+                // One request for every file of the job
+                const downloadAll = document.getElementById('downloadAll');
+                downloadAll.href = `/download/job/${currentJobId}`;
+                downloadAll.style.display = outputFiles.length > 1 ? 'inline-block' : 'none';
+                
                 resultsSection.style.display = 'block';
             }
             
@@ -607,9 +1102,63 @@ async def get_frontend():
     """
     return html_content
 
+UPLOAD_SUFFIXES = {".pdb.gz": ".pdb", ".pdb": ".pdb", ".cif.gz": ".cif", ".cif": ".cif",
+                   ".bcif.gz": ".bcif", ".bcif": ".bcif"}
+
+def upload_name(filename: str):
+    """(stored file name, PDB ID) of an upload, or None if it is not a .pdb/.cif/.bcif file (optionally gzipped)"""
+    name = os.path.basename(filename or "")
+    for suffix, stored in UPLOAD_SUFFIXES.items():
+        if name.endswith(suffix) and len(name) > len(suffix):
+            pdb_id = name[:-len(suffix)]
+            return f"{pdb_id}{stored}", pdb_id
+    return None
+
+def inflate(inflater, chunk: bytes):
+    """Decompressed pieces of one gzip chunk, at most UPLOAD_CHUNK bytes each (guards against gzip bombs)"""
+    data = inflater.decompress(chunk, UPLOAD_CHUNK)
+    while data:
+        yield data
+        data = inflater.decompress(inflater.unconsumed_tail, UPLOAD_CHUNK) if inflater.unconsumed_tail else b""
+
+async def stream_upload(file: UploadFile, dest: str, limit: int, counter: AtomCounter = None):
+    """
+    Copy one upload to dest in chunks, gunzipping .gz uploads; returns (bytes, sha256 of the stored data).
+    A counter is fed the stored data to count its atoms on the way.
+    """
+    digest = hashlib.sha256()
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if file.filename.endswith(".gz") else None
+    written = 0
+    out = await asyncio.to_thread(open, dest, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK)
+            if not chunk:
+                break
+            for data in (inflate(inflater, chunk) if inflater else (chunk,)):
+                written += len(data)
+                if written > limit:
+                    raise HTTPException(status_code=413, detail=f"File {file.filename} exceeds the upload size limit")
+                digest.update(data)
+                if counter is not None:
+                    counter.update(data)
+                # Disk writes run in a thread so other requests (status polling) are not blocked
+                await asyncio.to_thread(out.write, data)
+        if inflater and not inflater.eof:
+            raise HTTPException(status_code=400, detail=f"File {file.filename} is not a complete gzip stream")
+    except zlib.error:
+        raise HTTPException(status_code=400, detail=f"File {file.filename} is not valid gzip data")
+    finally:
+        await asyncio.to_thread(out.close)
+    return written, digest.hexdigest()
+
 @app.post("/upload")
-async def upload_files(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...)):
-    """Upload PDB files and start processing"""
+async def upload_files(request: Request, background_tasks: BackgroundTasks, files: List[UploadFile] = File(...),
+                       profile: bool = False):
+    """
+    Upload structure files (.pdb, .cif or .bcif, optionally gzipped) and start processing;
+    with profile=true every structure is run under cProfile and its .prof file is one of the outputs
+    """
     
     if len(files) > 15:
         raise HTTPException(status_code=400, detail="Maximum 15 files allowed")
@@ -617,51 +1166,137 @@ async def upload_files(background_tasks: BackgroundTasks, files: List[UploadFile
     # Validate file extensions
     pdb_files = []
     for file in files:
-        if not file.filename.endswith('.pdb'):
-            raise HTTPException(status_code=400, detail=f"File {file.filename} is not a PDB file")
-        pdb_files.append(file)
+        names = upload_name(file.filename)
+        if names is None:
+            raise HTTPException(status_code=400, detail=f"File {file.filename} is not a PDB/mmCIF/BinaryCIF file")
+        pdb_files.append((file, *names))
     
     if not pdb_files:
         raise HTTPException(status_code=400, detail="No valid PDB files provided")
+
+    # Refuse early when the queue (or this client's share of it) is full
+    client = client_id(request)
+    try:
+        scheduler.check(client)
+    except QueueFull as e:
+        raise too_many_requests(e)
     
     # Generate job ID
-    job_id = f"job_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    job_id = new_job_id()
     
-    # Save files to input directory
+    # Stream files into a private staging directory
+    staging = tempfile.mkdtemp(prefix=f"{job_id}-", dir=STAGING_DIR)
     saved_files = []
     pdb_ids = []
+    hashes = {}
+    duplicates = []
     
+    spans = []
+    atoms = 0
     try:
-        for file in pdb_files:
-            file_path = os.path.join(INPUT_DIR, file.filename)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            saved_files.append(file.filename)
-            # Extract PDB ID (filename without extension, preserving case)
-            pdb_id = os.path.splitext(file.filename)[0]
+        received = 0
+        staged = []
+        for file, stored_name, pdb_id in pdb_files:
+            if pdb_id in hashes:
+                raise HTTPException(status_code=400, detail=f"PDB ID {pdb_id} uploaded more than once")
+            staged_path = os.path.join(staging, stored_name)
+            # Atoms are counted while streaming (BinaryCIF: from its row count) to rank the job in the queue
+            counter = None if stored_name.endswith(".bcif") else AtomCounter()
+            with metrics.span("upload", pdb_id=pdb_id) as record:
+                size, digest = await stream_upload(file, staged_path,
+                                                   min(MAX_FILE_BYTES, MAX_REQUEST_BYTES - received), counter)
+                record["bytes"] = size
+                record["atoms"] = counter.finish() if counter else await asyncio.to_thread(estimate_atoms,
+                                                                                            staged_path)
+            spans.append(record)
+            upload_bytes.inc(size)
+            received += size
+
+            # Identical content uploaded under another name is processed once
+            if digest in hashes.values():
+                duplicates.append(file.filename)
+                continue
+            hashes[pdb_id] = digest
+            staged.append((staged_path, stored_name))
+            saved_files.append(stored_name)
             pdb_ids.append(pdb_id)
+            atoms += record["atoms"]
+
+        # Take a place in the queue (other uploads may have filled it while this one streamed)
+        try:
+            scheduler.admit(job_id, client, atoms)
+        except QueueFull as e:
+            raise too_many_requests(e)
+
+        # Every file arrived within the limits: move them into the job's workspace atomically
+        workspace = create_workspace(job_id)
+        for staged_path, stored_name in staged:
+            os.replace(staged_path, os.path.join(workspace["input"], stored_name))
         
         # Create job
-        job_manager.create_job(job_id, saved_files)
+        job_manager.create_job(job_id, saved_files, sha256=hashes, profile=profile, atoms=atoms)
+        record_spans(job_id, spans)
         
         # Start background task
-        background_tasks.add_task(run_snakemake_workflow, job_id, pdb_ids)
+        background_tasks.add_task(run_workflow, job_id, pdb_ids)
         
         return {
             "message": "Files uploaded successfully",
             "job_id": job_id,
             "files": saved_files,
-            "pdb_ids": pdb_ids
+            "pdb_ids": pdb_ids,
+            "sha256": hashes,
+            "duplicates": duplicates,
+            "atoms": atoms,
+            "queue_position": scheduler.position(job_id)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        # Clean up on error
-        for file_name in saved_files:
-            file_path = os.path.join(INPUT_DIR, file_name)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        scheduler.discard(job_id)
         raise HTTPException(status_code=500, detail=f"Error saving files: {str(e)}")
+    finally:
+        # Nothing half-written ever reaches a workspace
+        shutil.rmtree(staging, ignore_errors=True)
+
+@app.post("/batch")
+async def upload_batch(request: Request, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """Upload a tarball (.tar, .tar.gz, .tgz) of PDB files and analyse them as one batch job"""
+    if not file.filename.endswith((".tar", ".tar.gz", ".tgz")):
+        raise HTTPException(status_code=400, detail=f"File {file.filename} is not a tarball")
+    client = client_id(request)
+    try:
+        scheduler.check(client)
+    except QueueFull as e:
+        raise too_many_requests(e)
+
+    job_id = new_job_id()
+    workspace = create_workspace(job_id)
+    archive = os.path.join(workspace["input"], "batch.tar")
+    try:
+        # .tar.gz is gunzipped while streaming like .pdb.gz; tarfile reads .tgz as it is
+        size, digest = await stream_upload(file, archive, MAX_BATCH_BYTES)
+        if not tarfile.is_tarfile(archive):
+            raise HTTPException(status_code=400, detail=f"File {file.filename} is not a valid tar archive")
+        # A batch is ranked by its size as if it were one structure of PDB records
+        scheduler.admit(job_id, client, size // PDB_BYTES_PER_ATOM)
+    except QueueFull as e:
+        shutil.rmtree(workspace["root"], ignore_errors=True)
+        raise too_many_requests(e)
+    except BaseException:
+        shutil.rmtree(workspace["root"], ignore_errors=True)
+        raise
+
+    job_manager.create_job(job_id, [file.filename], sha256={"batch": digest}, batch=True)
+    background_tasks.add_task(run_batch_job, job_id, archive)
+    return {
+        "message": "Batch uploaded successfully",
+        "job_id": job_id,
+        "bytes": size,
+        "sha256": digest,
+        "queue_position": scheduler.position(job_id)
+    }
 
 @app.get("/status/{job_id}")
 async def get_job_status(job_id: str):
@@ -669,22 +1304,210 @@ async def get_job_status(job_id: str):
     job = job_manager.get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    
+
+    # Place in this process' queue (1 = next to run); None once the job runs or if another worker holds it
+    job["queue_position"] = scheduler.position(job_id)
+    job["queue_length"] = len(scheduler.queued)
     return job
 
+@app.get("/events/{job_id}")
+async def job_events(job_id: str, request: Request):
+    """Server-sent events: every stage of a job as it happens, until it completes or fails"""
+    if not job_manager.get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    last_id = request.headers.get("last-event-id", "0")
+    last_id = int(last_id) if last_id.isdigit() else 0
+
+    async def stream():
+        nonlocal last_id
+        idle = 0.0
+        while not await request.is_disconnected():
+            events = job_manager.events_since(job_id, last_id)
+            for event in events:
+                last_id = event["id"]
+                yield f"id: {last_id}\ndata: {json.dumps(event)}\n\n"
+                if event["stage"] == "status" and event["status"] in ("completed", "failed"):
+                    return
+            if events:
+                idle = 0.0
+                continue
+            idle += EVENT_POLL_INTERVAL
+            if idle >= EVENT_KEEPALIVE:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/results")
+async def query_results(table: str = "summary", pdb_id: str = None, batch: str = None, since: str = None,
+                        until: str = None, filter: List[str] = Query([]), limit: int = 100, offset: int = 0):
+    """
+    Rows of the results dataset: one per structure (table=summary) or per structure and residue
+    (table=propensity). Filters look like total_area>=1000; since/until are YYYY-MM-DD dates.
+    """
+    pdb_ids = pdb_id.split(",") if pdb_id else None
+    limit, offset = max(0, min(limit, 1000)), max(0, offset)
+    try:
+        total, rows = await asyncio.to_thread(results_dataset.query, table, filter, batch, since, until, pdb_ids,
+                                              limit, offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"table": table, "total": total, "limit": limit, "offset": offset, "rows": rows}
+
+@app.get("/interface/{pdb_id}")
+async def interface_chains(pdb_id: str, job_id: str = None):
+    """Chains of a structure with their number of interface residues"""
+    structure_id = interface_store.find(pdb_id, job_id)
+    if structure_id is None:
+        raise HTTPException(status_code=404, detail="Structure not found")
+    return {"pdb_id": pdb_id, "job_id": job_id, "chains": interface_store.chains(structure_id)}
+
+@app.get("/interface/{pdb_id}/{chain}")
+async def interface_rows(pdb_id: str, chain: str, job_id: str = None, level: str = "residue", resnum: int = None):
+    """
+    Interface residues (level=residue) or atoms (level=atom) of one chain, with complex/monomer ASA,
+    ΔASA and partner chain; the newest run of pdb_id unless job_id is given
+    """
+    if level not in ("residue", "atom"):
+        raise HTTPException(status_code=400, detail="level must be residue or atom")
+    structure_id = interface_store.find(pdb_id, job_id)
+    if structure_id is None:
+        raise HTTPException(status_code=404, detail="Structure not found")
+    if level == "atom":
+        rows = interface_store.atoms(structure_id, chain, resnum)
+    else:
+        rows = interface_store.residues(structure_id, chain)
+    return {"pdb_id": pdb_id, "chain": chain, "job_id": job_id, "level": level, "rows": rows}
+
+@app.get("/jobs")
+async def list_jobs(status: str = None, limit: int = 50):
+    """Most recent jobs, optionally filtered by status"""
+    return {"jobs": job_manager.list_jobs(status, min(limit, 500))}
+
+def media_type_for(filename: str):
+    return {".csv": "text/csv", ".parquet": "application/vnd.apache.parquet", ".zip": "application/zip"}.get(
+        os.path.splitext(filename)[1], "application/octet-stream")
+
+def attachment(filename: str):
+    return f'attachment; filename="{filename}"'
+
+async def send_file(request: Request, path: str, filename: str):
+    """
+    A result file with a content-hash ETag: 304 for a matching If-None-Match/If-Modified-Since,
+    206 for a byte range, otherwise the whole file, brotli/gzip-compressed if the client accepts it
+    """
+    stat = os.stat(path)
+    range_header = request.headers.get("range")
+    # Ranges address the file's own bytes, so they are never combined with compression
+    encoding = None if range_header else downloads.choose_encoding(request.headers.get("accept-encoding"),
+                                                                   filename, stat.st_size)
+    etag = downloads.variant_etag(await asyncio.to_thread(downloads.file_etag, path), encoding)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": downloads.http_date(stat.st_mtime),
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+    }
+    if downloads.not_modified(request.headers, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = attachment(filename)
+    media_type = media_type_for(filename)
+
+    if encoding is not None:
+        body = await asyncio.to_thread(downloads.compress_file, path, encoding)
+        return Response(body, media_type=media_type, headers={**headers, "Content-Encoding": encoding})
+    try:
+        byte_range = downloads.parse_range(range_header, stat.st_size, request.headers.get("if-range"), etag,
+                                           stat.st_mtime)
+    except downloads.RangeNotSatisfiable:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={"Content-Range": f"bytes */{stat.st_size}"})
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(downloads.read_range(path, start, end), status_code=206, media_type=media_type,
+                                 headers=headers)
+    return FileResponse(path=path, filename=filename, media_type=media_type, headers=headers, stat_result=stat)
+
+def job_output_paths(job_id: str):
+    """(filename, path) of every output file of a job that still exists"""
+    job = job_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    interface_dir = job_workspace(job_id)["interface"]
+    paths = [(f["filename"], os.path.join(interface_dir, f["filename"])) for f in job["output_files"]]
+    return [(filename, path) for filename, path in paths if os.path.exists(path)]
+
+@app.get("/jobs/{job_id}/download/{filename}")
+async def download_job_file(job_id: str, filename: str, request: Request):
+    """Download a result file of one job (conditional, compressed and range requests are supported)"""
+    paths = dict(job_output_paths(job_id))
+    if filename not in paths:
+        raise HTTPException(status_code=404, detail="File not found")
+    return await send_file(request, paths[filename], filename)
+
+@app.get("/download/job/{job_id}")
+async def download_job_zip(job_id: str, request: Request):
+    """Every output file of a job in one ZIP, streamed while it is built"""
+    paths = job_output_paths(job_id)
+    if not paths:
+        raise HTTPException(status_code=404, detail="No output files")
+    # The archive's ETag derives from its members' content hashes, so unchanged results give 304 unbuilt
+    etags = await asyncio.to_thread(lambda: [(name, downloads.file_etag(path)) for name, path in paths])
+    headers = {"ETag": downloads.bundle_etag(etags), "Cache-Control": "no-cache"}
+    if downloads.etag_listed(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = attachment(f"{job_id}.zip")
+    return StreamingResponse(downloads.zip_stream(paths), media_type="application/zip", headers=headers)
+
+@app.get("/jobs/{job_id}/spans")
+async def job_spans(job_id: str):
+    """Timing spans of a job (upload, cache lookup, queue and every pipeline stage) and their total per stage"""
+    if not job_manager.get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    spans = job_manager.spans(job_id)
+    totals = {}
+    for record in spans:
+        totals[record["span"]] = round(totals.get(record["span"], 0.0) + record["seconds"], 6)
+    return {"job_id": job_id, "spans": spans, "totals": totals}
+
 @app.get("/download/{filename}")
-async def download_file(filename: str):
+async def download_file(filename: str, request: Request):
     """Download result file"""
     file_path = os.path.join(INTERFACE_DIR, filename)
     
-    if not os.path.exists(file_path):
+    if not os.path.isfile(file_path):
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type='text/csv'
-    )
+    return await send_file(request, file_path, filename)
+
+@app.get("/queue")
+async def queue_stats():
+    """Job scheduler limits and occupancy"""
+    return scheduler.stats()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Result cache hit/miss counters and size"""
+    return result_cache.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: stage time histograms, queue depth, active workers and result cache hit ratio"""
+    stats = await asyncio.to_thread(result_cache.stats)
+    queue_depth.set(len(scheduler.queued))
+    active_jobs.set(len(scheduler.running))
+    for reason, count in scheduler.rejected.items():
+        rejected_jobs.set_total(count, reason=reason)
+    cache_hits.set_total(stats["hits"])
+    cache_misses.set_total(stats["misses"])
+    cache_hit_ratio.set(stats["hit_ratio"])
+    cache_bytes.set(stats["bytes"])
+    return PlainTextResponse(metrics_registry.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/files")
 async def list_output_files():
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Persistent residue-background store.
+
+Keeps the amino-acid counts of every .rsa file it has seen in SQLite, together
+with running totals, so background frequencies are a 20-row read instead of a
+rescan of the whole rsa directory.  Files are re-read only when their size or
+mtime changes, and can be removed again.  A frequency table can be pinned
+under a name; every pin of the same name gets the next version number, so a
+summary can be reproduced against an exact background.
+
+The built-in set REFERENCE_SET ("reference", version 1) is the background the
+reference results under interface/ were computed with.  It is read from
+reference_background.csv next to this module, needs no database and is the
+default background of every summary.
+"""
+import argparse
+import contextlib
+import os
+import sqlite3
+import time
+
+AMINO_ACIDS = [
+    'ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
+    'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL'
+]
+
+DEFAULT_DB = "background.sqlite"
+REFERENCE_SET = "reference"
+REFERENCE_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference_background.csv")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    residues INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counts (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    residue TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (path, residue)
+);
+CREATE TABLE IF NOT EXISTS totals (
+    residue TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pinned (
+    name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    residue TEXT NOT NULL,
+    frequency REAL NOT NULL,
+    residues INTEGER NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (name, version, residue)
+);
+"""
+
+
+def rsa_counts(path):
+    """{residue: count} of the amino-acid RES records of one .rsa file."""
+    counts = dict.fromkeys(AMINO_ACIDS, 0)
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 4 and parts[0] == "RES":
+                resname = parts[1].upper()
+                if resname in counts:
+                    counts[resname] += 1
+    return counts
+
+
+def write_frequencies(freqs, path):
+    """Write {residue: frequency} as the Residue,Frequency table compute_summary reads."""
+    with open(path, "w") as f:
+        f.write("Residue,Frequency\n")
+        for aa in AMINO_ACIDS:
+            f.write(f"{aa},{freqs.get(aa, 0)}\n")
+
+
+def read_frequencies(path):
+    """{residue: frequency} of a Residue,Frequency table (write_frequencies())."""
+    with open(path) as f:
+        rows = [line.strip().split(",") for line in f if line.strip()][1:]
+    return {residue: float(freq) for residue, freq in rows}
+
+
+def reference_frequencies(version=None):
+    """Frequencies of the built-in REFERENCE_SET (its only version is 1)."""
+    if version not in (None, 1):
+        raise KeyError(f"No pinned background set {REFERENCE_SET}:{version}")
+    return read_frequencies(REFERENCE_TABLE)
+
+
+def load_frequencies(spec=REFERENCE_SET, db=DEFAULT_DB):
+    """Frequencies of the pinned set "name[:version]" in the store at db; REFERENCE_SET needs no store."""
+    name, version = parse_set(spec)
+    if name == REFERENCE_SET:
+        return reference_frequencies(version)
+    with BackgroundStore(db) as store:
+        return store.frequencies(name, version)
+
+
+def resolve_set(spec, db=DEFAULT_DB):
+    """"name:version" of the pinned set spec; without a version, the latest version of the name."""
+    name, version = parse_set(spec)
+    if version is None:
+        if name == REFERENCE_SET:
+            version = 1
+        else:
+            with BackgroundStore(db) as store:
+                version = store.latest_version(name)
+    return f"{name}:{version}"
+
+
+def parse_set(spec):
+    """"name" or "name:version" → (name, version or None)."""
+    name, _, version = spec.partition(":")
+    return name, int(version) if version else None
+
+
+class BackgroundStore:
+    """Per-file residue counts and running totals in an SQLite database."""
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        # Autocommit; writes go through _write() so concurrent syncs of one database serialize
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextlib.contextmanager
+    def _write(self):
+        """BEGIN IMMEDIATE ... COMMIT: reads inside the block see no other writer until it ends."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _subtract(self, path):
+        rows = self.conn.execute("SELECT residue, count FROM counts WHERE path = ?", (path,)).fetchall()
+        self.conn.executemany("UPDATE totals SET count = count - ? WHERE residue = ?",
+                              [(count, residue) for residue, count in rows])
+        self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def add(self, rsa_path):
+        """Count one .rsa file; unchanged files (same size and mtime) are skipped. Returns True if counted."""
+        path = os.path.abspath(rsa_path)
+        st = os.stat(path)
+        known = self.conn.execute("SELECT mtime, size FROM files WHERE path = ?", (path,)).fetchone()
+        if known == (st.st_mtime, st.st_size):
+            return False
+        counts = rsa_counts(path)
+        with self._write():
+            # Another process may have counted the file since the check above
+            known = self.conn.execute("SELECT mtime, size FROM files WHERE path = ?", (path,)).fetchone()
+            if known == (st.st_mtime, st.st_size):
+                return False
+            if known:
+                self._subtract(path)
+            self.conn.execute("INSERT INTO files VALUES (?, ?, ?, ?)",
+                              (path, st.st_mtime, st.st_size, sum(counts.values())))
+            self.conn.executemany("INSERT INTO counts VALUES (?, ?, ?)",
+                                  [(path, aa, n) for aa, n in counts.items() if n])
+            self.conn.executemany(
+                "INSERT INTO totals VALUES (?, ?) ON CONFLICT(residue) DO UPDATE SET count = count + excluded.count",
+                [(aa, n) for aa, n in counts.items() if n])
+        return True
+
+    def remove(self, rsa_path):
+        """Drop a file's counts; returns True if it was known."""
+        path = os.path.abspath(rsa_path)
+        with self._write():
+            if not self.conn.execute("SELECT 1 FROM files WHERE path = ?", (path,)).fetchone():
+                return False
+            self._subtract(path)
+        return True
+
+    def sync(self, rsa_dir):
+        """Bring the store in line with the *.rsa files of rsa_dir; returns (added, removed)."""
+        rsa_dir = os.path.abspath(rsa_dir)
+        present = {
+            os.path.join(rsa_dir, name) for name in os.listdir(rsa_dir) if name.endswith(".rsa")
+        }
+        known = {
+            path for (path,) in self.conn.execute("SELECT path FROM files")
+            if os.path.dirname(path) == rsa_dir
+        }
+        added = sum(self.add(path) for path in sorted(present))
+        removed = sum(self.remove(path) for path in sorted(known - present))
+        return added, removed
+
+    def totals(self):
+        """{residue: count} over every file in the store."""
+        counts = dict.fromkeys(AMINO_ACIDS, 0)
+        counts.update(self.conn.execute("SELECT residue, count FROM totals"))
+        return counts
+
+    def frequencies(self, name=None, version=None):
+        """
+        Background frequencies: the running totals, or a pinned set (latest
+        version unless ``version`` is given).
+        """
+        if name == REFERENCE_SET:
+            return reference_frequencies(version)
+        if name is None:
+            counts = self.totals()
+            total = sum(counts.values())
+            return {aa: counts[aa] / total if total > 0 else 0 for aa in AMINO_ACIDS}
+        if version is None:
+            version = self.latest_version(name)
+        rows = self.conn.execute("SELECT residue, frequency FROM pinned WHERE name = ? AND version = ?",
+                                 (name, version)).fetchall()
+        if not rows:
+            raise KeyError(f"No pinned background set {name}:{version}")
+        return dict(rows)
+
+    def latest_version(self, name):
+        """Highest pinned version of name; KeyError if there is none."""
+        version = self.conn.execute("SELECT MAX(version) FROM pinned WHERE name = ?", (name,)).fetchone()[0]
+        if version is None:
+            raise KeyError(f"No pinned background set {name}")
+        return version
+
+    def pin(self, name, rsa_paths=None):
+        """
+        Freeze the current totals (or the counts of ``rsa_paths`` only) as the
+        next version of ``name``; returns the version number.
+        """
+        if name == REFERENCE_SET:
+            raise ValueError(f"{REFERENCE_SET!r} is the built-in background set, pin under another name")
+        if rsa_paths is None:
+            counts = self.totals()
+        else:
+            for path in rsa_paths:
+                self.add(path)
+            paths = [os.path.abspath(p) for p in rsa_paths]
+            counts = dict.fromkeys(AMINO_ACIDS, 0)
+            counts.update(self.conn.execute(
+                f"SELECT residue, SUM(count) FROM counts WHERE path IN ({','.join('?' * len(paths))}) GROUP BY residue",
+                paths))
+        total = sum(counts.values())
+        with self._write():
+            version = 1 + self.conn.execute("SELECT COALESCE(MAX(version), 0) FROM pinned WHERE name = ?",
+                                            (name,)).fetchone()[0]
+            now = time.time()
+            self.conn.executemany("INSERT INTO pinned VALUES (?, ?, ?, ?, ?, ?)", [
+                (name, version, aa, counts[aa] / total if total > 0 else 0, total, now) for aa in AMINO_ACIDS
+            ])
+        return version
+
+    def sets(self):
+        """(name, version, residues, created) of every pinned set."""
+        return self.conn.execute(
+            "SELECT name, version, MAX(residues), MAX(created) FROM pinned GROUP BY name, version ORDER BY name, version"
+        ).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the residue-background store")
+    parser.add_argument("--db", default=os.path.join("rsa", DEFAULT_DB), help="SQLite database path")
+    parser.add_argument("--sync", metavar="DIR", help="Add new/changed .rsa files of DIR, drop deleted ones")
+    parser.add_argument("--add", nargs="+", metavar="RSA", default=[], help=".rsa files to add")
+    parser.add_argument("--remove", nargs="+", metavar="RSA", default=[], help=".rsa files to remove")
+    parser.add_argument("--pin", metavar="NAME", help="Pin the current background as the next version of NAME")
+    parser.add_argument("--show", metavar="NAME[:VERSION]", nargs="?", const="",
+                        help="Print background frequencies (running totals, or a pinned set)")
+    parser.add_argument("--list", action="store_true", help="List pinned sets")
+    parser.add_argument("--export", metavar="CSV",
+                        help="Write the background frequencies (the --show set, default the running totals) "
+                             "as a Residue,Frequency table")
+    args = parser.parse_args()
+
+    with BackgroundStore(args.db) as store:
+        if args.sync:
+            added, removed = store.sync(args.sync)
+            print(f"✅ Synced {args.sync}: {added} added/updated, {removed} removed")
+        for path in args.add:
+            store.add(path)
+        for path in args.remove:
+            store.remove(path)
+        if args.pin:
+            print(f"📌 Pinned {args.pin}:{store.pin(args.pin)}")
+        if args.show is not None:
+            name, version = parse_set(args.show) if args.show else (None, None)
+            for aa, freq in store.frequencies(name, version).items():
+                print(f"{aa},{freq}")
+        if args.export:
+            name, version = parse_set(args.show) if args.show else (None, None)
+            write_frequencies(store.frequencies(name, version), args.export)
+            print(f"✅ Background table saved to {args.export}")
+        if args.list:
+            for name, version, residues, created in store.sets():
+                print(f"{name}:{version}\t{residues} residues\t{time.strftime('%Y-%m-%d %H:%M', time.localtime(created))}")
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Batch analysis of many structures into one columnar output.
+
+Inputs come from a manifest (one PDB path or ID per line), a directory or a
+tarball of .pdb/.pdb.gz (or PDB-mirror pdbXXXX.ent.gz) or .cif/.bcif(.gz) files.  The structures
+are cut into shards that run on a local process pool; every structure is
+analysed in its own scratch directory, which is removed afterwards.
+
+Each finished shard is written as a pair of Parquet parts and its IDs are
+appended to checkpoint.jsonl, so a crashed run picks up where it stopped.
+The parts are finally consolidated into summary.parquet (one wide row per
+structure) and propensity.parquet (one row per structure and residue).
+
+Every structure is scored against the same residue background: a pinned set
+(default the built-in reference set) or a Residue,Frequency table, never the
+.rsa files of its own scratch directory.
+"""
+import argparse
+import glob
+import gzip
+import json
+import multiprocessing
+import os
+import shutil
+import tarfile
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import compute_summary
+from background_store import DEFAULT_DB, REFERENCE_SET, resolve_set
+import mmcif
+import pipeline
+from chain_contacts import DEFAULT_MODE, MODES
+from interface_store import InterfaceStore
+from naccess_runner import available_cores
+from results_dataset import ResultsDataset
+from structure import input_path
+
+CHECKPOINT = "checkpoint.jsonl"
+PARTS_DIR = "parts"
+SUMMARY_FILE = "summary.parquet"
+PROPENSITY_FILE = "propensity.parquet"
+DEFAULT_SHARD_SIZE = 8
+
+SUFFIXES = (".pdb.gz", ".pdb", ".ent.gz", ".ent") + mmcif.MMCIF_SUFFIXES + mmcif.BCIF_SUFFIXES
+
+
+def pdb_id_of(filename):
+    """PDB ID of a structure file name, or None if it is not one (pdb1abc.ent.gz → 1abc)."""
+    name = os.path.basename(filename)
+    for suffix in SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            pdb_id = name[:-len(suffix)]
+            if suffix.startswith(".ent") and pdb_id.startswith("pdb"):
+                pdb_id = pdb_id[3:]
+            return pdb_id
+    return None
+
+
+# ----------------------
+# 1. Inputs
+# ----------------------
+def extract_tarball(tar_path, dest_dir):
+    """Extract the structure files of a tarball (flattened) into dest_dir; returns {pdb_id: path}."""
+    os.makedirs(dest_dir, exist_ok=True)
+    found = {}
+    with tarfile.open(tar_path) as tar:
+        for member in tar:
+            pdb_id = pdb_id_of(member.name) if member.isfile() else None
+            if pdb_id is None or pdb_id in found:
+                continue
+            path = os.path.join(dest_dir, os.path.basename(member.name))
+            with tar.extractfile(member) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            found[pdb_id] = path
+    return found
+
+
+def read_manifest(manifest_path, input_dir="input"):
+    """
+    {pdb_id: path} of a manifest: one entry per line, blank lines and # comments
+    skipped.  An entry is a file path (relative to the manifest) or a bare PDB
+    ID, looked up as <input_dir>/<id>.pdb (or .cif/.bcif).
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    found = {}
+    with open(manifest_path) as f:
+        for line in f:
+            entry = line.split("#", 1)[0].strip()
+            if not entry:
+                continue
+            pdb_id = pdb_id_of(entry)
+            if pdb_id is None:
+                pdb_id, path = entry, input_path(input_dir, entry)
+            else:
+                path = entry if os.path.isabs(entry) else os.path.join(base, entry)
+            found.setdefault(pdb_id, path)
+    return found
+
+
+def collect_inputs(source, work_dir, input_dir="input"):
+    """{pdb_id: structure file} from a directory, a tarball or a manifest; the first of duplicate IDs wins."""
+    if os.path.isdir(source):
+        found = {}
+        for path in sorted(glob.glob(os.path.join(source, "*"))):
+            pdb_id = pdb_id_of(path)
+            if pdb_id is not None and os.path.isfile(path):
+                found.setdefault(pdb_id, path)
+        return found
+    if tarfile.is_tarfile(source):
+        return extract_tarball(source, os.path.join(work_dir, "extracted"))
+    return read_manifest(source, input_dir)
+
+
+# ----------------------
+# 2. Workers
+# ----------------------
+def analyse(pdb_id, path, scratch_root, engine="native", interface_store=None, batch_name=None,
+            interface_mode=DEFAULT_MODE, background=None):
+    """Run the pipeline for one structure in a private scratch directory; returns (summary row, propensity)."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Missing PDB file: {path}")
+    scratch = tempfile.mkdtemp(prefix=f"{pdb_id}-", dir=scratch_root)
+    try:
+        dirs = {name: os.path.join(scratch, name) for name in ("input", "split_chains", "rsa")}
+        for directory in dirs.values():
+            os.makedirs(directory)
+        suffix = ".bcif" if mmcif.is_bcif(path) else ".cif" if mmcif.is_mmcif(path) else ".pdb"
+        pdb_path = os.path.join(dirs["input"], pdb_id + suffix)
+        if path.endswith(".gz"):
+            with gzip.open(path, "rb") as src, open(pdb_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        else:
+            os.symlink(os.path.abspath(path), pdb_path)
+        result = pipeline.run_pipeline(pdb_id, dirs["input"], dirs["split_chains"], dirs["rsa"], None, engine,
+                                       interface_store=interface_store, batch=batch_name,
+                                       interface_mode=interface_mode, **(background or {}))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    row = compute_summary.wide_summary(pdb_id, result["summary"])
+    row["chains"] = ",".join(result["chains"])
+    propensity = result["propensity"].rename(columns={"Residue": "residue", "Propensity": "propensity"})
+    propensity.insert(0, "pdb_id", pdb_id)
+    return row, propensity
+
+
+def run_shard(shard, scratch_root, engine="native", interface_store=None, batch_name=None,
+              interface_mode=DEFAULT_MODE, background=None):
+    """Analyse a list of (pdb_id, path); returns (summary rows, propensity frames, {pdb_id: error})."""
+    rows, propensities, failed = [], [], {}
+    for pdb_id, path in shard:
+        try:
+            row, propensity = analyse(pdb_id, path, scratch_root, engine, interface_store, batch_name,
+                                      interface_mode, background)
+        except Exception as e:
+            failed[pdb_id] = f"{type(e).__name__}: {e}"
+            continue
+        rows.append(row)
+        propensities.append(propensity)
+    return rows, propensities, failed
+
+
+# ----------------------
+# 3. Checkpoint and output
+# ----------------------
+def read_checkpoint(out_dir):
+    """{pdb_id: checkpoint record} of a previous run (the last record of an ID wins)."""
+    done = {}
+    path = os.path.join(out_dir, CHECKPOINT)
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line of a crashed run
+                done[record["pdb_id"]] = record
+    return done
+
+
+def write_shard(out_dir, rows, propensities, failed, checkpoint, dataset=None, batch_name=None):
+    """Write one shard's Parquet parts (and dataset rows), then record its IDs in the checkpoint."""
+    part = None
+    if rows:
+        part = f"part-{uuid.uuid4().hex[:12]}"
+        for kind, table in (("summary", pd.DataFrame(rows)), ("propensity", pd.concat(propensities))):
+            path = os.path.join(out_dir, PARTS_DIR, f"{part}.{kind}.parquet")
+            table.to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+        if dataset is not None:
+            dataset.append(rows, pd.concat(propensities), batch=batch_name)
+    for row in rows:
+        checkpoint.write(json.dumps({"pdb_id": row["pdb_id"], "status": "done", "part": part}) + "\n")
+    for pdb_id, error in failed.items():
+        checkpoint.write(json.dumps({"pdb_id": pdb_id, "status": "failed", "error": error}) + "\n")
+    checkpoint.flush()
+    os.fsync(checkpoint.fileno())
+
+
+def consolidate(out_dir):
+    """Merge every part into SUMMARY_FILE and PROPENSITY_FILE; returns their paths."""
+    parts_dir = os.path.join(out_dir, PARTS_DIR)
+    done = {pdb_id for pdb_id, record in read_checkpoint(out_dir).items() if record["status"] == "done"}
+    outputs = []
+    for kind, name in (("summary", SUMMARY_FILE), ("propensity", PROPENSITY_FILE)):
+        parts = sorted(glob.glob(os.path.join(parts_dir, f"*.{kind}.parquet")))
+        table = pd.concat([pd.read_parquet(p) for p in parts], ignore_index=True) if parts else pd.DataFrame()
+        if len(table):
+            # A structure retried after a crash may sit in two parts; keep one copy
+            table = table[table["pdb_id"].isin(done)]
+            keys = ["pdb_id"] if kind == "summary" else ["pdb_id", "residue"]
+            table = table.drop_duplicates(keys, keep="last").sort_values(keys, kind="stable")
+        path = os.path.join(out_dir, name)
+        table.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        outputs.append(path)
+    return outputs
+
+
+def run_batch(source, out_dir, workers=None, shard_size=DEFAULT_SHARD_SIZE, engine="native",
+              input_dir="input", retry_failed=False, executor=None, progress=None, dataset=None,
+              batch_name=None, interface_store=None, interface_mode=DEFAULT_MODE,
+              background_set=REFERENCE_SET, background_table=None, background_db=None):
+    """
+    Analyse every structure of ``source`` (manifest, directory or tarball)
+    into out_dir, skipping IDs a previous run already checkpointed.  Shards
+    run on ``executor`` if given, else on a new pool of ``workers`` processes.
+    ``progress(done, total)`` is called after every shard.  With a
+    results_dataset.ResultsDataset as ``dataset``, every shard is also
+    appended to it under ``batch_name`` (default: the name of out_dir); with
+    an interface_store.InterfaceStore, every structure's interface rows are
+    stored under the same name.  ``interface_mode`` is passed on to
+    pipeline.run_pipeline().
+
+    Every structure uses the Residue,Frequency table ``background_table``,
+    else the pinned ``background_set`` of the store at ``background_db``
+    (default rsa/background.sqlite); a set without a version is resolved to
+    its latest version once, before the first shard.
+
+    Returns {"total", "done", "failed", "skipped", "summary", "propensity"}.
+    """
+    out_dir = os.path.abspath(out_dir)
+    batch_name = batch_name or os.path.basename(out_dir)
+    os.makedirs(os.path.join(out_dir, PARTS_DIR), exist_ok=True)
+    background_db = os.path.abspath(background_db or os.path.join("rsa", DEFAULT_DB))
+    background = {
+        "background_set": None if background_table else resolve_set(background_set or REFERENCE_SET, background_db),
+        "background_table": background_table and os.path.abspath(background_table),
+        "background_db": background_db,
+    }
+    work_dir = tempfile.mkdtemp(prefix=".batch-", dir=out_dir)
+    try:
+        inputs = collect_inputs(source, work_dir, input_dir)
+        previous = read_checkpoint(out_dir)
+        skip = {pdb_id for pdb_id, record in previous.items()
+                if record["status"] == "done" or not retry_failed}
+        todo = [(pdb_id, path) for pdb_id, path in inputs.items() if pdb_id not in skip]
+        shards = [todo[i:i + shard_size] for i in range(0, len(todo), shard_size)]
+        print(f"📦 {len(inputs)} structures: {len(todo)} to run in {len(shards)} shards, "
+              f"{len(inputs) - len(todo)} already checkpointed")
+
+        own_pool = executor is None
+        if own_pool:
+            executor = ProcessPoolExecutor(max_workers=workers or available_cores(),
+                                           mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=pipeline.warm_up)
+        counts = {"done": 0, "failed": 0}
+        try:
+            with open(os.path.join(out_dir, CHECKPOINT), "a") as checkpoint:
+                futures = [executor.submit(run_shard, shard, work_dir, engine, interface_store, batch_name,
+                                           interface_mode, background) for shard in shards]
+                for finished, future in enumerate(as_completed(futures), start=1):
+                    rows, propensities, failed = future.result()
+                    write_shard(out_dir, rows, propensities, failed, checkpoint, dataset, batch_name)
+                    counts["done"] += len(rows)
+                    counts["failed"] += len(failed)
+                    for pdb_id, error in failed.items():
+                        print(f"❌ {pdb_id}: {error}")
+                    if progress:
+                        progress(counts["done"] + counts["failed"], len(todo))
+        finally:
+            if own_pool:
+                executor.shutdown(cancel_futures=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary_out, prop_out = consolidate(out_dir)
+    print(f"✅ {counts['done']} done, {counts['failed']} failed → {summary_out}, {prop_out}")
+    return {"total": len(inputs), "skipped": len(inputs) - len(todo), **counts,
+            "summary": summary_out, "propensity": prop_out}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse many structures into one Parquet output")
+    parser.add_argument("source", help="Manifest file, directory or tarball (.tar/.tar.gz) of PDB files")
+    parser.add_argument("out_dir", help="Output directory (checkpoint, parts, summary/propensity Parquet)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: available cores)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Structures per work item")
+    parser.add_argument("--input-dir", default="input", help="Where bare PDB IDs of a manifest are looked up")
+    parser.add_argument("--engine", choices=("native", "naccess"), default="native")
+    parser.add_argument("--retry-failed", action="store_true", help="Run structures that failed last time again")
+    parser.add_argument("--dataset", default=None, metavar="DIR",
+                        help="Also append the rows to the partitioned results dataset in DIR")
+    parser.add_argument("--batch", default=None, help="Dataset batch partition (default: name of out_dir)")
+    parser.add_argument("--interface-db", default=None, metavar="DB",
+                        help="Also store per-atom/per-residue interface rows in this SQLite interface store")
+    parser.add_argument("--interface-mode", choices=MODES, default=DEFAULT_MODE,
+                        help="protein_nucleic: ΔASA between protein and DNA/RNA chains in contact; "
+                             "all: every chain against the whole complex")
+    parser.add_argument("--background-set", default=REFERENCE_SET, metavar="NAME[:VERSION]",
+                        help=f"Pinned residue background set (default: the built-in {REFERENCE_SET!r} set)")
+    parser.add_argument("--background-table", default=None, metavar="CSV",
+                        help="Residue,Frequency background table instead of a pinned set")
+    parser.add_argument("--background-db", default=None, metavar="DB",
+                        help="Background store holding --background-set (default: rsa/background.sqlite)")
+    args = parser.parse_args()
+
+    dataset = ResultsDataset(args.dataset) if args.dataset else None
+    interface_store = InterfaceStore(args.interface_db) if args.interface_db else None
+    run_batch(args.source, args.out_dir, args.workers, args.shard_size, args.engine, args.input_dir,
+              args.retry_failed, dataset=dataset, batch_name=args.batch, interface_store=interface_store,
+              interface_mode=args.interface_mode, background_set=args.background_set,
+              background_table=args.background_table, background_db=args.background_db)
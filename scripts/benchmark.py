@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Benchmark the pipeline stages and track them across runs.
+
+Every case (a bundled structure from input/, or a synthetic assembly made of
+several translated copies of one) runs in a fresh worker process, stage by
+stage: parse, split, complex ASA, chain ASA (one run per split chain), the
+single-pass ΔASA the pipeline uses, .int generation and the summary.  Each
+stage records its best wall time over ``--repeat`` runs, atoms per second and
+peak resident memory (sampled from /proc while the stage runs).  With the API
+enabled, every bundled structure is also uploaded to the FastAPI app and
+timed until its job completes.
+
+Runs are appended to a JSON history.  Stages slower (or larger) than in the
+baseline run by more than the threshold are flagged as regressions.  In
+interface mode "all" the summary and propensity tables of the bundled
+structures are also checked against the reference CSVs in interface/,
+computed with the built-in reference residue background.
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+import chain_contacts
+import compute_summary
+import generate_ints
+import sasa
+import split_chains
+from structure import Structure
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+DEFAULT_HISTORY = "benchmark_history.json"
+BUNDLED = ("1A3Q", "1RM1", "1rff", "8ucu")
+DEFAULT_SYNTHETIC = ("8ucu:8",)
+STAGES = ("parse", "split", "contacts", "complex_asa", "chain_asa", "delta_asa", "ints", "summary")
+
+# A stage regresses when it is this much slower (or larger) than the baseline,
+# and slower by more than NOISE_FLOOR seconds
+DEFAULT_THRESHOLD = 0.2
+NOISE_FLOOR = 0.05
+# Summary values are compared with math.isclose(rel_tol, abs_tol): areas are sums
+# of per-atom values rounded to 0.01 Å², so they may differ in the last digit
+REL_TOLERANCE = 1e-4
+ABS_TOLERANCE = 0.01
+
+CHAIN_IDS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+
+# ----------------------
+# 1. Measuring
+# ----------------------
+class RssSampler:
+    """Peak resident set size (MB) while the block runs, sampled from /proc/self/statm."""
+
+    interval = 0.005
+
+    def __init__(self):
+        self.peak = 0
+        self._stop = threading.Event()
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+    def _rss(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            # No procfs: fall back to the process-wide high-water mark
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._rss())
+
+    @property
+    def peak_mb(self):
+        return round(self.peak / (1 << 20), 1)
+
+
+@contextlib.contextmanager
+def quiet_stdout():
+    """Silence stdout at the file-descriptor level, including threads and worker processes."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, "w") as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        sys.stdout.flush()
+        os.dup2(saved, 1)
+        os.close(saved)
+
+
+class StageTimer:
+    """Best wall time and largest peak RSS of every stage over repeated runs."""
+
+    def __init__(self, atoms):
+        self.atoms = atoms
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        with RssSampler() as rss:
+            start = time.perf_counter()
+            yield
+            wall = time.perf_counter() - start
+        best = self.stages.setdefault(name, {"wall_s": math.inf, "peak_rss_mb": 0.0})
+        best["wall_s"] = min(best["wall_s"], wall)
+        best["peak_rss_mb"] = max(best["peak_rss_mb"], rss.peak_mb)
+
+    def results(self):
+        out = {}
+        for name, stage in self.stages.items():
+            wall = round(stage["wall_s"], 4)
+            out[name] = {"wall_s": wall, "atoms_per_s": round(self.atoms / wall) if wall else None,
+                         "peak_rss_mb": stage["peak_rss_mb"]}
+        return out
+
+
+# ----------------------
+# 2. Cases
+# ----------------------
+def synthetic_assembly(pdb_path, copies, out_path, gap=20.0):
+    """
+    Write ``copies`` translated copies of a structure (on a cubic grid, ``gap``
+    Å apart) as one PDB with fresh chain IDs; returns out_path.
+    """
+    structure = Structure.from_pdb(pdb_path)
+    chains = list(structure.chains)
+    if copies * len(chains) > len(CHAIN_IDS):
+        raise ValueError(f"{copies} copies of {len(chains)} chains need more than {len(CHAIN_IDS)} chain IDs")
+    extent = structure.xyz.max(axis=0) - structure.xyz.min(axis=0) + gap
+    side = math.ceil(copies ** (1 / 3))
+    lines = structure.pdb_lines()
+    chain_of = structure.chain_index
+    with open(out_path, "wb") as f:
+        for copy in range(copies):
+            offset = extent * np.array([copy % side, copy // side % side, copy // side // side])
+            names = [CHAIN_IDS[copy * len(chains) + k].encode() for k in range(len(chains))]
+            xyz = structure.xyz + offset
+            for i, line in enumerate(lines):
+                f.write(line[:21] + names[chain_of[i]] + line[22:30] + b"%8.3f%8.3f%8.3f" % tuple(xyz[i])
+                        + line[54:] + b"\n")
+        f.write(b"END\n")
+    return out_path
+
+
+def parse_synthetic(spec):
+    """"PDB_ID:COPIES" → (pdb_id, copies)."""
+    pdb_id, _, copies = spec.partition(":")
+    return pdb_id, int(copies or 4)
+
+
+def compare_reference(pdb_id, interface_dir, reference_dir):
+    """Mismatches between computed and reference summary/propensity CSVs (empty when equal)."""
+    mismatches = []
+    for suffix, key, value in (("interface_summary", "Interface Properties", "Value"),
+                               ("residue_propensity", "Residue", "Propensity")):
+        reference_csv = os.path.join(reference_dir, f"{pdb_id}_{suffix}.csv")
+        if not os.path.exists(reference_csv):
+            mismatches.append(f"{suffix}: no reference {reference_csv}")
+            continue
+        expected = pd.read_csv(reference_csv).set_index(key)[value]
+        actual = pd.read_csv(os.path.join(interface_dir, f"{pdb_id}_{suffix}.csv")).set_index(key)[value]
+        for name, want in expected.items():
+            got = actual.get(name)
+            if got is None or not math.isclose(got, want, rel_tol=REL_TOLERANCE, abs_tol=ABS_TOLERANCE):
+                mismatches.append(f"{suffix}: {name} = {got}, reference {want}")
+    return mismatches
+
+
+def run_case(pdb_id, pdb_path, repeat=1, interface_mode="all", reference_dir=None):
+    """
+    Time every stage of one structure ``repeat`` times (in the calling
+    process); returns {"atoms", "chains", "stages", "reference"}.
+    """
+    atoms = len(Structure.from_pdb(pdb_path))
+    timer = StageTimer(atoms)
+    mismatches = None
+    for _ in range(repeat):
+        scratch = tempfile.mkdtemp(prefix=f"bench-{pdb_id}-")
+        try:
+            dirs = {name: os.path.join(scratch, name) for name in ("split", "complex", "chains", "rsa", "interface")}
+            for directory in dirs.values():
+                os.makedirs(directory)
+            # The stages print progress lines; keep the benchmark output readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                with timer.stage("parse"):
+                    structure = Structure.from_pdb(pdb_path)
+                with timer.stage("split"):
+                    chains = split_chains.split_structure(structure, dirs["split"], pdb_id)
+                with timer.stage("contacts"):
+                    partners = chain_contacts.interface_partners(structure, interface_mode)
+                with timer.stage("complex_asa"):
+                    sasa.run_sasa(structure, dirs["complex"])
+                with timer.stage("chain_asa"):
+                    for chain in chains:
+                        sasa.run_sasa(os.path.join(dirs["split"], f"{pdb_id}_{chain}.pdb"), dirs["chains"])
+                with timer.stage("delta_asa"):
+                    results = sasa.run_delta_sasa(structure, dirs["rsa"],
+                                                  partners=None if interface_mode == "all" else partners)
+                with timer.stage("ints"):
+                    ints = generate_ints.generate_ints_from_results(pdb_id, results, dirs["rsa"])
+                with timer.stage("summary"):
+                    compute_summary.compute_interface_summary({pdb_id: ints}, dirs["rsa"], dirs["interface"])
+            if reference_dir and interface_mode == "all":
+                mismatches = compare_reference(pdb_id, dirs["interface"], reference_dir)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    reference = None if mismatches is None else {"equal": not mismatches, "mismatches": mismatches}
+    return {"atoms": atoms, "chains": len(chains), "stages": timer.results(), "reference": reference}
+
+
+def run_case_isolated(*args, **kwargs):
+    """run_case() in a fresh process, so every case starts from the same memory baseline."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(run_case, *args, **kwargs).result()
+
+
+def run_api(pdb_paths, interface_mode="all", timeout=600):
+    """
+    Upload every structure to the FastAPI app (worker-pool backend, empty
+    cache, private directories) and time it until the job completes.
+    Returns {pdb_id: stage results}, or None when FastAPI is not installed.
+    """
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError:
+        return None
+    workdir = tempfile.mkdtemp(prefix="bench-api-")
+    previous = os.getcwd()
+    os.environ.update({"PDI_CACHE_DIR": os.path.join(workdir, "cache"), "PDI_INTERFACE_MODE": interface_mode,
+                       "PDI_JOBS_DB": os.path.join(workdir, "jobs.sqlite"),
+                       "PDI_RESULTS_DIR": os.path.join(workdir, "results"),
+                       "PDI_INTERFACE_DB": os.path.join(workdir, "interface.sqlite"),
+                       "PDI_WORKSPACE_DIR": os.path.join(workdir, "workspaces")})
+    sys.path.insert(0, ROOT)
+    results = {}
+    try:
+        os.chdir(workdir)
+        with quiet_stdout():
+            import main
+            with TestClient(main.app) as client:
+                for pdb_id, pdb_path in pdb_paths.items():
+                    with open(pdb_path, "rb") as f:
+                        data = f.read()
+                    timer = StageTimer(len(Structure.from_pdb(pdb_path)))
+                    with timer.stage("api"):
+                        job_id = client.post("/upload", files=[("files", (f"{pdb_id}.pdb", data))]).json()["job_id"]
+                        deadline = time.monotonic() + timeout
+                        while True:
+                            status = client.get(f"/status/{job_id}").json()["status"]
+                            if status in ("completed", "failed") or time.monotonic() > deadline:
+                                break
+                            time.sleep(0.05)
+                    if status != "completed":
+                        raise RuntimeError(f"API job for {pdb_id} ended as {status}")
+                    results[pdb_id] = timer.results()
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# ----------------------
+# 3. History and regressions
+# ----------------------
+def load_history(path):
+    if not os.path.exists(path):
+        return {"runs": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path, history):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def pick_baseline(history, run_id=None, interface_mode=None):
+    """
+    The run named run_id, else the newest run (in ``interface_mode``, when
+    given) marked as baseline, else the newest such run.
+    """
+    runs = history["runs"]
+    if run_id is not None:
+        for run in runs:
+            if run["id"] == run_id:
+                return run
+        raise ValueError(f"No run {run_id} in the history")
+    if interface_mode is not None:
+        runs = [run for run in runs if run.get("interface_mode") == interface_mode]
+    marked = [run for run in runs if run.get("baseline")]
+    return (marked or runs or [None])[-1]
+
+
+def find_regressions(run, baseline, threshold=DEFAULT_THRESHOLD):
+    """Stages of ``run`` slower or larger than in ``baseline`` by more than ``threshold``."""
+    if baseline is None:
+        return []
+    flagged = []
+    for case, result in run["cases"].items():
+        before_case = baseline["cases"].get(case)
+        if not before_case or before_case.get("atoms") != result.get("atoms"):
+            continue
+        for stage, now in result["stages"].items():
+            before = before_case["stages"].get(stage)
+            if not before:
+                continue
+            if now["wall_s"] > before["wall_s"] * (1 + threshold) and now["wall_s"] - before["wall_s"] > NOISE_FLOOR:
+                flagged.append({"case": case, "stage": stage, "metric": "wall_s",
+                                "baseline": before["wall_s"], "value": now["wall_s"]})
+            if now["peak_rss_mb"] > before["peak_rss_mb"] * (1 + threshold):
+                flagged.append({"case": case, "stage": stage, "metric": "peak_rss_mb",
+                                "baseline": before["peak_rss_mb"], "value": now["peak_rss_mb"]})
+    return flagged
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(structures=BUNDLED, synthetic=DEFAULT_SYNTHETIC, input_dir=None, repeat=1,
+                   interface_mode="all", api=True, reference_dir=None):
+    """Run every case; returns the history entry (without regressions)."""
+    input_dir = input_dir or os.path.join(ROOT, "input")
+    reference_dir = reference_dir or os.path.join(ROOT, "interface")
+    paths = {pdb_id: os.path.join(input_dir, f"{pdb_id}.pdb") for pdb_id in structures}
+    cases = {}
+    for pdb_id, path in paths.items():
+        print(f"⏱️  {pdb_id}...")
+        cases[pdb_id] = run_case_isolated(pdb_id, path, repeat, interface_mode, reference_dir)
+
+    scratch = tempfile.mkdtemp(prefix="bench-synthetic-")
+    try:
+        for spec in synthetic:
+            pdb_id, copies = parse_synthetic(spec)
+            name = f"{pdb_id}x{copies}"
+            path = synthetic_assembly(os.path.join(input_dir, f"{pdb_id}.pdb"), copies,
+                                      os.path.join(scratch, f"{name}.pdb"))
+            print(f"⏱️  {name} (synthetic)...")
+            cases[name] = run_case_isolated(name, path, repeat, interface_mode)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if api:
+        print("⏱️  API...")
+        timings = run_api(paths, interface_mode)
+        if timings is None:
+            print("⚠️  FastAPI is not installed; skipping the API benchmark")
+        for pdb_id, stages in (timings or {}).items():
+            cases[pdb_id]["stages"].update(stages)
+
+    return {
+        "id": datetime.now().strftime("%Y%m%dT%H%M%S"),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "host": platform.node(),
+        "cpus": os.cpu_count(),
+        "interface_mode": interface_mode,
+        "repeat": repeat,
+        "cases": cases,
+    }
+
+
+def print_run(run):
+    stages = [stage for stage in STAGES + ("api",) if any(stage in c["stages"] for c in run["cases"].values())]
+    print(f"{'case':<10}{'atoms':>8}  " + "".join(f"{stage:>12}" for stage in stages) + "   (wall s)")
+    for case, result in run["cases"].items():
+        print(f"{case:<10}{result['atoms']:>8}  " + "".join(
+            f"{result['stages'][stage]['wall_s']:>12.3f}" if stage in result["stages"] else f"{'-':>12}"
+            for stage in stages))
+    for case, result in run["cases"].items():
+        reference = result.get("reference")
+        if reference is not None:
+            print(f"{'✅' if reference['equal'] else '❌'} {case}: "
+                  + ("matches the reference CSVs" if reference["equal"] else "; ".join(reference["mismatches"])))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages and flag regressions")
+    parser.add_argument("--structures", default=",".join(BUNDLED), help="Bundled PDB IDs to run (from input/)")
+    parser.add_argument("--synthetic", default=",".join(DEFAULT_SYNTHETIC), metavar="PDB_ID:COPIES,...",
+                        help="Synthetic assemblies of translated copies ('' for none)")
+    parser.add_argument("--input-dir", default=None, help="Directory with the bundled structures")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case; the best wall time is kept")
+    parser.add_argument("--interface-mode", choices=chain_contacts.MODES, default="all",
+                        help="Interface mode; the reference CSVs are checked in mode 'all' only")
+    parser.add_argument("--no-api", action="store_true", help="Skip the end-to-end API benchmark")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="JSON history file")
+    parser.add_argument("--baseline", default=None, metavar="RUN_ID",
+                        help="Run to compare with (default: newest run in the same interface mode marked "
+                             "as baseline, else the newest one)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown/growth flagged as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Mark this run as the baseline")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Exit with status 1 on regressions or reference mismatches")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    baseline = pick_baseline(history, args.baseline, args.interface_mode)
+    run = run_benchmarks([s for s in args.structures.split(",") if s], [s for s in args.synthetic.split(",") if s],
+                         args.input_dir, args.repeat, args.interface_mode, not args.no_api)
+    run["baseline_id"] = baseline["id"] if baseline else None
+    run["regressions"] = find_regressions(run, baseline, args.threshold)
+    run["baseline"] = args.save_baseline
+    history["runs"].append(run)
+    save_history(args.history, history)
+
+    print_run(run)
+    for reg in run["regressions"]:
+        print(f"⚠️  Regression {reg['case']}/{reg['stage']}: {reg['metric']} {reg['baseline']} → {reg['value']}")
+    print(f"📈 Run {run['id']} saved to {args.history}"
+          + (f" (compared with {run['baseline_id']})" if run["baseline_id"] else ""))
+    mismatched = any(c.get("reference") and not c["reference"]["equal"] for c in run["cases"].values())
+    if args.fail_on_regression and (run["regressions"] or mismatched):
+        raise SystemExit(1)
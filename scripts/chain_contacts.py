@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Molecule types of chains and the chain pairs that are in contact.
+
+Every chain is typed from its residue names: protein when most of its
+residues are amino acids, DNA or RNA when most are nucleotides (DA/DC/DG/DT,
+A/C/G/U, ...).  Chain pairs in contact come from one cell-list search
+(sasa.NeighborGrid) over the ATOM records of all chains: two chains touch
+when an atom of one lies within CONTACT_CUTOFF of an atom of the other.
+Atoms farther apart than that cannot bury each other's surface, so chain
+pairs that do not touch contribute no ΔASA.
+
+interface_partners() combines both into the chains each chain's ΔASA is
+computed against, for an interface mode:
+
+    all               every other chain (the whole complex)
+    protein_nucleic   protein chains against the DNA/RNA chains they touch,
+                      and nucleic-acid chains against the proteins touching them
+"""
+import argparse
+import json
+
+import numpy as np
+
+from sasa import NeighborGrid
+from structure import load_structure
+
+# Atoms lose accessibility only to atoms within r_i + r_j + 2 * probe (< 8 Å)
+CONTACT_CUTOFF = 8.0
+
+MODES = ("protein_nucleic", "all")
+DEFAULT_MODE = "protein_nucleic"
+
+AMINO_ACIDS = {
+    "ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE", "LEU", "LYS", "MET",
+    "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL", "ASX", "GLX", "SEC", "PYL", "MSE", "UNK",
+}
+DNA_RESIDUES = {"DA", "DC", "DG", "DT", "DU", "DI", "DN"}
+RNA_RESIDUES = {"A", "C", "G", "U", "I", "N", "PSU", "2MG", "H2U"}
+NUCLEIC = ("dna", "rna")
+
+
+def residue_type(resname):
+    """"protein", "dna", "rna" or None for anything else (ligands, water, ions)."""
+    if resname in AMINO_ACIDS:
+        return "protein"
+    if resname in DNA_RESIDUES:
+        return "dna"
+    if resname in RNA_RESIDUES:
+        return "rna"
+    return None
+
+
+def chain_types(structure):
+    """{chain: "protein" | "dna" | "rna" | "other"} by the majority of each chain's polymer residues."""
+    names = np.asarray(structure.residue_names, dtype=object)[structure.residue_name_code]
+    chains = np.asarray(structure.chains)[structure.residue_chain]
+    counts = {chain: {} for chain in structure.chains}
+    for chain, resname in zip(chains.tolist(), names.tolist()):
+        kind = residue_type(resname)
+        if kind is not None:
+            counts[chain][kind] = counts[chain].get(kind, 0) + 1
+    return {chain: max(kinds, key=kinds.get) if kinds else "other" for chain, kinds in counts.items()}
+
+
+def contact_pairs(xyz, chain_ids, cutoff=CONTACT_CUTOFF):
+    """
+    {(a, b): atom pairs} for every pair of chains a < b with atoms closer
+    than ``cutoff``; only pairs across chains are kept and counted.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+    if not len(xyz):
+        return {}
+    # Sorted chain names and each atom's index in them, so a < b compares as codes
+    names, codes = np.unique(np.asarray(chain_ids).astype(str), return_inverse=True)
+    grid = NeighborGrid(xyz, cutoff)
+    i, j = grid.candidate_pairs()
+    keep = codes[i] < codes[j]
+    i, j = i[keep], j[keep]
+    keep = np.sum((xyz[i] - xyz[j]) ** 2, axis=1) < cutoff ** 2
+    pairs, counts = np.unique(codes[i[keep]] * len(names) + codes[j[keep]], return_counts=True)
+    return {(str(names[p // len(names)]), str(names[p % len(names)])): int(n)
+            for p, n in zip(pairs.tolist(), counts.tolist())}
+
+
+def interface_partners(structure, mode=DEFAULT_MODE, cutoff=CONTACT_CUTOFF):
+    """
+    {chain: [partner chains]} for every chain of ``structure`` under ``mode``
+    (see MODES); chains without partners map to [].  Only ATOM records take
+    part in the contact search, as only they enter the accessibility
+    calculation.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown interface mode: {mode} (expected one of {', '.join(MODES)})")
+    chains = list(structure.chains)
+    if mode == "all":
+        return {chain: [other for other in chains if other != chain] for chain in chains}
+
+    atoms = np.char.startswith(structure.labels, b"ATOM")
+    pairs = contact_pairs(structure.xyz[atoms], structure.chain_ids[atoms], cutoff)
+    return nucleic_partners(chains, chain_types(structure), pairs)
+
+
+def partners_or_all(structure, mode=DEFAULT_MODE, cutoff=CONTACT_CUTOFF, name=None):
+    """
+    (mode, partners) as interface_partners(), except that a structure with no
+    chain pair in contact under ``mode`` (e.g. a protein-only upload in
+    protein_nucleic mode) falls back to "all" with a warning instead of
+    yielding an empty interface.
+    """
+    partners = interface_partners(structure, mode, cutoff)
+    if mode == "all" or any(partners.values()):
+        return mode, partners
+    print(f"⚠️ {name or structure.source}: no chain pairs in contact under interface mode {mode!r}, "
+          f"using 'all' (every chain against the whole complex)")
+    return "all", interface_partners(structure, "all")
+
+
+def nucleic_partners(chains, types, pairs):
+    """{chain: [partner chains]} of the protein–nucleic-acid pairs among ``pairs`` ((a, b) tuples)."""
+    partners = {chain: [] for chain in chains}
+    for a, b in pairs:
+        kinds = {types[a], types[b]}
+        if "protein" in kinds and kinds & set(NUCLEIC):
+            partners[a].append(b)
+            partners[b].append(a)
+    return {chain: sorted(others) for chain, others in partners.items()}
+
+
+def type_partners(structure, mode=DEFAULT_MODE):
+    """
+    interface_partners() from the chain types alone: in protein_nucleic mode
+    every protein chain is paired with every DNA/RNA chain, touching or not.
+    Chains that do not touch bury no surface, so the ΔASA is the same; this
+    suits structures whose contacts change, such as trajectory frames.
+    """
+    if mode != "protein_nucleic":
+        return interface_partners(structure, mode)
+    chains = list(structure.chains)
+    pairs = [(a, b) for i, a in enumerate(chains) for b in chains[i + 1:]]
+    return nucleic_partners(chains, chain_types(structure), pairs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chain molecule types and chain pairs in contact")
+    parser.add_argument("pdb", help="Path to input PDB (e.g. input/1A3Q.pdb)")
+    parser.add_argument("--mode", choices=MODES, default=DEFAULT_MODE, help="Interface mode")
+    parser.add_argument("--cutoff", type=float, default=CONTACT_CUTOFF, help="Contact distance (Å)")
+    args = parser.parse_args()
+
+    structure = load_structure(args.pdb)
+    atoms = np.char.startswith(structure.labels, b"ATOM")
+    print("Chain types: " + json.dumps(chain_types(structure)))
+    for (a, b), n in contact_pairs(structure.xyz[atoms], structure.chain_ids[atoms], args.cutoff).items():
+        print(f"{a}-{b}\t{n} atom pairs")
+    print(f"Partners ({args.mode}): " + json.dumps(interface_partners(structure, args.mode, args.cutoff)))
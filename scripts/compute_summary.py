@@ -1,183 +1,324 @@
 #!/usr/bin/env python3
 import os
-import glob
 import argparse
-import pandas as pd
-import re
 import math
 
+import numpy as np
+import pandas as pd
+
+from background_store import DEFAULT_DB, REFERENCE_SET, load_frequencies, read_frequencies
+from generate_ints import chain_asa_files
+from structure import int_column
+
 NONPOLAR = {'ALA', 'VAL', 'LEU', 'ILE', 'MET', 'PHE', 'TRP', 'PRO', 'GLY'}
 AMINO_ACIDS = [
     'ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
     'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL'
 ]
 
-# ----------------------
-# 1. Parse CLI arguments
-# ----------------------
-p = argparse.ArgumentParser(description="Compute interface summary for a given PDB ID")
-p.add_argument("--pdb-id", required=True, help="PDB ID to process, e.g. 1A3Q")
-p.add_argument("--rsa-dir", default="rsa", help="Path to RSA directory containing .int files")
-p.add_argument("--out-dir", default="interface", help="Directory to write output CSVs")
-args = p.parse_args()
-
-pdb_id = args.pdb_id
-rsa_dir = os.path.abspath(args.rsa_dir)
-out_dir = os.path.abspath(args.out_dir)
-
-# ----------------------
-# 2. Locate matching .int files
-# ----------------------
-int_paths = [
-    f for f in glob.glob(os.path.join(rsa_dir, f"{pdb_id}*.int"))
-    if re.match(rf"{re.escape(pdb_id)}[A-Za-z]\.int$", os.path.basename(f), re.IGNORECASE)
-]
+# Fixed-width .int record (intf.f: A4,2X,I5,2X,A4,A3,1X,A1,I4,A1,3X,3F8.3,2F6.2); chain IDs
+# longer than column 22 follow the record in full
+INT_WIDTH = 66
+INT_FIELDS = {
+    'serial': (6, 11),
+    'atom': (13, 17),
+    'resname': (17, 20),
+    'chain': (21, 22),
+    'resnum': (22, 26),
+    'icode': (26, 27),
+    'x': (30, 38),
+    'y': (38, 46),
+    'z': (46, 54),
+    'asa_chain': (54, 60),
+    'asa_complex': (60, 66),
+}
+
+# Summary table rows → columns of the wide layout (one row per structure)
+SUMMARY_COLUMNS = {
+    'Total Interface Atoms': 'total_atoms',
+    'Total Interface Residues': 'total_residues',
+    'Total Interface Area (Å²)': 'total_area',
+    'Local Atomic Density': 'local_density',
+    'Residue Propensity Score': 'propensity_score',
+    'Fraction of Buried Atoms': 'fraction_buried',
+    'Fraction of Non-Polar Atoms': 'fraction_nonpolar',
+    'Non-Polar Interface Area': 'nonpolar_area',
+}
 
-if not int_paths:
-    raise FileNotFoundError(f"No .int files for {pdb_id} found in {rsa_dir}")
-
-# ----------------------
-# 3. Parse ATOM lines from .int files
-# ----------------------
-records = []
-for path in int_paths:
-    with open(path) as f:
-        for line in f:
-            if not line.lstrip().startswith("ATOM"):
-                continue
-            parts = line.split()
-            try:
-                asa_m = float(parts[-2])
-                asa_c = float(parts[-1])
-            except (ValueError, IndexError):
-                continue
-            delta = asa_m - asa_c
-            records.append({
-                'chain': parts[4],
-                'resnum': parts[5],
-                'resname': parts[3],
-                'delta': delta
-            })
-
-if not records:
-    raise RuntimeError(f"No ATOM records parsed for {pdb_id} from .int files")
-
-df = pd.DataFrame(records)
-
-# ----------------------
-# 4. Compute interface summary
-# ----------------------
-total_atoms       = len(df)
-total_residues    = df.drop_duplicates(['chain', 'resnum']).shape[0]
-total_area        = round(df['delta'].sum(), 2)
-local_density     = round(total_atoms / total_area, 3) if total_area else 0.0
-fraction_buried   = round(1.0, 3)
-nonpolar_df       = df[df['resname'].isin(NONPOLAR)]
-fraction_nonpolar = round(len(nonpolar_df) / total_atoms, 3) if total_atoms else 0.0
-nonpolar_area     = round(nonpolar_df['delta'].sum(), 2)
-
-# ----------------------
-# 5. Build residue background from RSA
-# ----------------------
-background_csv = os.path.join(rsa_dir, f"{pdb_id}_residue_background.csv")
-
-if not os.path.exists(background_csv):
-    print("🔄 Building residue background from .rsa files...")
-    all_rsa_residues = []
-    for file in glob.glob(os.path.join(rsa_dir, "*.rsa")):
-        with open(file) as f:
+
+def int_files(pdb_id, rsa_dir="rsa", chains=None):
+    """
+    <pdb><chain>.int files of pdb_id in rsa_dir for ``chains`` (default: the
+    chains of its <pdb>_<chain>.asa files, one per split chain).  The names
+    are built from the chain IDs rather than matched by prefix, since
+    1A3QXA.int may as well be chain A of 1A3QX.
+    """
+    if chains is None:
+        chains = chain_asa_files(pdb_id, rsa_dir)
+    paths = [os.path.join(rsa_dir, f"{pdb_id}{chain}.int") for chain in sorted(chains)]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def read_int_columns(paths):
+    """
+    Parse the ATOM records of .int files into typed NumPy columns in one pass:
+    the lines are packed into an (n, INT_WIDTH) byte matrix and every field is
+    a column slice of it.
+    """
+    lines, extended = [], []
+    for path in paths:
+        with open(path, "rb") as f:
             for line in f:
-                parts = line.split()
-                if len(parts) >= 4 and parts[0] == "RES":
-                    resname = parts[1].upper()
-                    if resname in AMINO_ACIDS:
-                        all_rsa_residues.append(resname)
-    surface_counts_all = {aa: all_rsa_residues.count(aa) for aa in AMINO_ACIDS}
-    total_res = len(all_rsa_residues)
-    background_freqs = {
-        aa: surface_counts_all[aa] / total_res if total_res > 0 else 0
-        for aa in AMINO_ACIDS
+                if line.lstrip().startswith(b"ATOM"):
+                    line = line.rstrip(b"\r\n")
+                    lines.append(line.ljust(INT_WIDTH)[:INT_WIDTH])
+                    extended.append(line[INT_WIDTH:].strip())
+    raw = np.frombuffer(b"".join(lines), dtype="S1").reshape(len(lines), INT_WIDTH)
+
+    def field(name):
+        start, end = INT_FIELDS[name]
+        return np.ascontiguousarray(raw[:, start:end]).view(f"S{end - start}").ravel()
+
+    extended = np.array(extended, dtype=bytes)
+    chain = np.where(extended != b"", extended, field('chain')) if len(lines) else field('chain')
+    return {
+        'serial': int_column(field('serial')),
+        'atom': np.char.strip(field('atom')).astype("U4"),
+        'resname': np.char.strip(field('resname')).astype("U3"),
+        'chain': chain.astype("U"),
+        'resnum': int_column(field('resnum')),
+        'icode': np.char.strip(field('icode')).astype("U1"),
+        'x': field('x').astype(np.float64),
+        'y': field('y').astype(np.float64),
+        'z': field('z').astype(np.float64),
+        'asa_chain': field('asa_chain').astype(np.float64),
+        'asa_complex': field('asa_complex').astype(np.float64),
     }
-    pd.DataFrame(list(background_freqs.items()), columns=["Residue", "Frequency"]).to_csv(background_csv, index=False)
-    print(f"✅ Background table saved to {background_csv} with {total_res} residues.")
-
-# Load background frequencies
-bg_df = pd.read_csv(background_csv)
-background_freqs = dict(zip(bg_df["Residue"], bg_df["Frequency"]))
-
-# ----------------------
-# 6. Compute residue propensity
-# ----------------------
-residue_list_int = df['resname'].tolist()
-interface_counts = {aa: residue_list_int.count(aa) for aa in AMINO_ACIDS}
-total_int_res = len(residue_list_int)
-
-log_weighted_values = []
-propensity_scores = {}
-
-for aa in AMINO_ACIDS:
-    freq_int = interface_counts[aa]
-    freq_bg = background_freqs.get(aa, 0)
-
-    if freq_bg == 0 or freq_int == 0:
-        prop_score = 0
-        log_weighted = 0
-    else:
-        prop_score = (freq_int / total_int_res) / freq_bg
-        log_val = math.log(prop_score)
-        log_weighted = max(log_val * freq_int, 0)  # avoid negatives
-
-    propensity_scores[aa] = round(prop_score, 3)
-    log_weighted_values.append(log_weighted)
-
-log_weighted_propensity_score = round(sum(log_weighted_values), 3)
-
-# ----------------------
-# 7. Save summary and propensity table
-# ----------------------
-os.makedirs(out_dir, exist_ok=True)
-
-summary = pd.DataFrame({
-    'Interface Properties': [
-        'Total Interface Atoms',
-        'Total Interface Residues',
-        'Total Interface Area (Å²)',
-        'Local Atomic Density',
-        'Residue Propensity Score',
-        'Fraction of Buried Atoms',
-        'Fraction of Non-Polar Atoms',
-        'Non-Polar Interface Area'
-    ],
-    'Value': [
-        total_atoms,
-        total_residues,
-        total_area,
-        local_density,
-        log_weighted_propensity_score,
-        fraction_buried,
-        fraction_nonpolar,
-        nonpolar_area
-    ],
-    'Notes': [
-        'Count atoms with ΔASA > 0',
-        'Based on ΔASA at residue level',
-        'ΔASA sum',
-        'atoms / area',
-        'log-weighted: log(freq_int/freq_bg) * count, clamped ≥ 0',
-        'ΔASA atoms / total atoms',
-        'Use residue types',
-        'ΔASA only for non-polar residues'
-    ]
-})
-
-summary_out = os.path.join(out_dir, f"{pdb_id}_interface_summary.csv")
-summary.to_csv(summary_out, index=False)
-print(f"✅ Wrote summary → {summary_out}")
-
-# Write per-residue propensity table
-prop_df = pd.DataFrame(list(propensity_scores.items()), columns=["Residue", "Propensity"])
-prop_df.sort_values(by="Propensity", ascending=False, inplace=True)
-prop_out = os.path.join(out_dir, f"{pdb_id}_residue_propensity.csv")
-prop_df.to_csv(prop_out, index=False)
-print(f"✅ Wrote residue propensity table → {prop_out}")
-print(f"Parsed {total_int_res} interface residues and loaded background from {background_csv}")
+
+
+def concat_columns(arrays):
+    """Merge generate_ints() output ({chain: columns}) into one set of columns."""
+    if 'resname' in arrays:
+        return arrays
+    parts = [arrays[chain] for chain in sorted(arrays)]
+    return {name: np.concatenate([p[name] for p in parts]) for name in INT_FIELDS}
+
+
+def load_background(background_db=DEFAULT_DB, background_set=None, background_table=None):
+    """
+    (frequencies, name) of the residue background: the Residue,Frequency
+    table ``background_table`` (background_store.py --export) if given, else
+    the pinned ``background_set`` ("name[:version]", default the built-in
+    reference set) of the store at background_db.  It is never derived from
+    the .rsa files next to the structure, so a summary does not depend on
+    what else was analysed in the same directory.
+    """
+    if background_table:
+        print(f"🔄 Using residue background table {background_table}...")
+        return read_frequencies(background_table), background_table
+    background_set = background_set or REFERENCE_SET
+    print(f"🔄 Using pinned residue background {background_set}...")
+    return load_frequencies(background_set, background_db), background_set
+
+
+def summarize(columns, background_freqs):
+    """Interface summary and residue propensity tables from .int columns."""
+    # ----------------------
+    # 1. Compute interface summary
+    # ----------------------
+    resname = columns['resname']
+    delta = pd.Series(columns['asa_chain'] - columns['asa_complex'])
+    total_atoms       = len(delta)
+    total_residues    = pd.DataFrame({
+        'chain': columns['chain'], 'resnum': columns['resnum'], 'icode': columns['icode']
+    }).drop_duplicates().shape[0]
+    total_area        = round(delta.sum(), 2)
+    local_density     = round(total_atoms / total_area, 3) if total_area else 0.0
+    fraction_buried   = round(1.0, 3)
+    nonpolar          = np.isin(resname, list(NONPOLAR))
+    fraction_nonpolar = round(int(nonpolar.sum()) / total_atoms, 3) if total_atoms else 0.0
+    nonpolar_area     = round(delta[nonpolar].sum(), 2)
+
+    # ----------------------
+    # 2. Compute residue propensity
+    # ----------------------
+    # AMINO_ACIDS is sorted, so searchsorted maps names to their index in it
+    aa_index = np.searchsorted(AMINO_ACIDS, resname[np.isin(resname, AMINO_ACIDS)])
+    interface_counts = np.bincount(aa_index, minlength=len(AMINO_ACIDS))
+    total_int_res = total_atoms
+
+    log_weighted_values = []
+    propensity_scores = {}
+
+    for aa, freq_int in zip(AMINO_ACIDS, interface_counts.tolist()):
+        freq_bg = background_freqs.get(aa, 0)
+
+        if freq_bg == 0 or freq_int == 0:
+            prop_score = 0
+            log_weighted = 0
+        else:
+            prop_score = (freq_int / total_int_res) / freq_bg
+            log_val = math.log(prop_score)
+            log_weighted = max(log_val * freq_int, 0)  # avoid negatives
+
+        propensity_scores[aa] = round(prop_score, 3)
+        log_weighted_values.append(log_weighted)
+
+    log_weighted_propensity_score = round(sum(log_weighted_values), 3)
+
+    summary = pd.DataFrame({
+        'Interface Properties': [
+            'Total Interface Atoms',
+            'Total Interface Residues',
+            'Total Interface Area (Å²)',
+            'Local Atomic Density',
+            'Residue Propensity Score',
+            'Fraction of Buried Atoms',
+            'Fraction of Non-Polar Atoms',
+            'Non-Polar Interface Area'
+        ],
+        'Value': [
+            total_atoms,
+            total_residues,
+            total_area,
+            local_density,
+            log_weighted_propensity_score,
+            fraction_buried,
+            fraction_nonpolar,
+            nonpolar_area
+        ],
+        'Notes': [
+            'Count atoms with ΔASA > 0',
+            'Based on ΔASA at residue level',
+            'ΔASA sum',
+            'atoms / area',
+            'log-weighted: log(freq_int/freq_bg) * count, clamped ≥ 0',
+            'ΔASA atoms / total atoms',
+            'Use residue types',
+            'ΔASA only for non-polar residues'
+        ]
+    })
+
+    prop_df = pd.DataFrame(list(propensity_scores.items()), columns=["Residue", "Propensity"])
+    prop_df.sort_values(by="Propensity", ascending=False, inplace=True)
+    return summary, prop_df
+
+
+def wide_summary(pdb_id, summary):
+    """The summary table of one structure as a single row (dict keyed by SUMMARY_COLUMNS)."""
+    row = {'pdb_id': pdb_id}
+    for prop, value in zip(summary['Interface Properties'], summary['Value']):
+        row[SUMMARY_COLUMNS[prop]] = value
+    row['total_atoms'] = int(row['total_atoms'])
+    row['total_residues'] = int(row['total_residues'])
+    return row
+
+
+def dataset_rows(results, chains=None):
+    """
+    (summary rows, propensity rows) for results_dataset from {pdb_id: (summary, propensity)};
+    ``chains`` ({pdb_id: chain IDs}) fills the summary rows' chains column.
+    """
+    chains = chains or {}
+    summary_rows, propensity_rows = [], []
+    for pdb_id, (summary, prop_df) in results.items():
+        row = wide_summary(pdb_id, summary)
+        row['chains'] = ",".join(chains[pdb_id]) if chains.get(pdb_id) else None
+        summary_rows.append(row)
+        propensity_rows.extend(
+            {'pdb_id': pdb_id, 'residue': residue, 'propensity': value}
+            for residue, value in zip(prop_df['Residue'], prop_df['Propensity'])
+        )
+    return summary_rows, propensity_rows
+
+
+def compute_interface_summary(structures, rsa_dir="rsa", out_dir="interface", background_db=None,
+                              background_set=None, dataset=None, batch=None, background_table=None):
+    """
+    Summaries for many structures in one call.
+
+    ``structures`` is a PDB ID, a list of PDB IDs (their .int files are read
+    from rsa_dir) or a dict {pdb_id: columns}, where columns is the output of
+    generate_ints.generate_ints() or read_int_columns().  Writes
+    <pdb>_interface_summary.csv and <pdb>_residue_propensity.csv into out_dir
+    (nothing when out_dir is None) and returns {pdb_id: (summary, propensity)}.
+
+    Every structure gets the same background (see load_background()): the
+    Residue,Frequency table ``background_table``, or the pinned
+    ``background_set`` (default the built-in reference set) of the store at
+    ``background_db`` (default <rsa_dir>/background.sqlite).
+    With a results_dataset.ResultsDataset as ``dataset``, all tables are
+    also appended to it as one part under ``batch``.
+    """
+    if isinstance(structures, str):
+        structures = [structures]
+    if not isinstance(structures, dict):
+        structures = dict.fromkeys(structures)
+    rsa_dir = os.path.abspath(rsa_dir)
+    if out_dir is not None:
+        out_dir = os.path.abspath(out_dir)
+        os.makedirs(out_dir, exist_ok=True)
+
+    background_freqs, background_name = load_background(background_db or os.path.join(rsa_dir, DEFAULT_DB),
+                                                        background_set, background_table)
+    results, chains = {}, {}
+    for pdb_id, arrays in structures.items():
+        chains[pdb_id] = sorted(chain_asa_files(pdb_id, rsa_dir))
+        if arrays is None:
+            int_paths = int_files(pdb_id, rsa_dir)
+            if not int_paths:
+                raise FileNotFoundError(f"No .int files for {pdb_id} found in {rsa_dir}")
+            columns = read_int_columns(int_paths)
+        else:
+            columns = concat_columns(arrays)
+        if not len(columns['resname']):
+            raise RuntimeError(f"No ATOM records parsed for {pdb_id} from .int files")
+
+        summary, prop_df = summarize(columns, background_freqs)
+        results[pdb_id] = (summary, prop_df)
+
+        if out_dir is not None:
+            summary_out = os.path.join(out_dir, f"{pdb_id}_interface_summary.csv")
+            summary.to_csv(summary_out, index=False)
+            print(f"✅ Wrote summary → {summary_out}")
+
+            prop_out = os.path.join(out_dir, f"{pdb_id}_residue_propensity.csv")
+            prop_df.to_csv(prop_out, index=False)
+            print(f"✅ Wrote residue propensity table → {prop_out}")
+        print(f"Parsed {len(columns['resname'])} interface residues against the background {background_name}")
+    if dataset is not None and results:
+        dataset.append(*dataset_rows(results, chains), batch=batch)
+        print(f"✅ Appended {len(results)} structures to the results dataset {dataset.root}")
+    return results
+
+
+def compute_summary(pdb_id, rsa_dir="rsa", out_dir="interface", arrays=None, background_set=None):
+    """Write <pdb>_interface_summary.csv and <pdb>_residue_propensity.csv; returns both paths."""
+    compute_interface_summary({pdb_id: arrays}, rsa_dir, out_dir, background_set=background_set)
+    out_dir = os.path.abspath(out_dir)
+    return (os.path.join(out_dir, f"{pdb_id}_interface_summary.csv"),
+            os.path.join(out_dir, f"{pdb_id}_residue_propensity.csv"))
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Compute interface summaries for one or more PDB IDs")
+    p.add_argument("--pdb-id", required=True, help="PDB ID(s) to process, comma-separated, e.g. 1A3Q,8ucu")
+    p.add_argument("--rsa-dir", default="rsa", help="Path to RSA directory containing .int files")
+    p.add_argument("--out-dir", default="interface", help="Directory to write output CSVs")
+    p.add_argument("--background-db", default=None, help="Background store (default: <rsa-dir>/background.sqlite)")
+    p.add_argument("--background-set", default=None, metavar="NAME[:VERSION]",
+                   help=f"Pinned background set (default: the built-in {REFERENCE_SET!r} set)")
+    p.add_argument("--background-table", default=None, metavar="CSV",
+                   help="Use this Residue,Frequency table (background_store.py --export) instead of a pinned set")
+    p.add_argument("--dataset", default=None, metavar="DIR",
+                   help="Also append the results to the Parquet results dataset in DIR")
+    p.add_argument("--batch", default=None, help="Dataset batch partition (default: manual)")
+    p.add_argument("--no-csv", action="store_true", help="Skip the per-structure CSV files")
+    args = p.parse_args()
+
+    dataset = None
+    if args.dataset:
+        from results_dataset import ResultsDataset
+        dataset = ResultsDataset(args.dataset)
+    compute_interface_summary(args.pdb_id.split(","), args.rsa_dir, None if args.no_csv else args.out_dir,
+                              args.background_db, args.background_set, dataset, args.batch, args.background_table)
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+HTTP download helpers for result files: content-hash ETags, conditional
+requests, compression, byte ranges and ZIP bundles streamed on the fly.
+
+ETags are the SHA-256 of a file's contents, cached by path, size and mtime,
+so an unchanged result keeps its tag across restarts and workspaces.  A
+compressed response has an ETag of its own ("<hash>-gzip").  Brotli is used
+when the optional ``brotli`` package is installed, gzip otherwise.  Ranges
+are served from the uncompressed file only; a single range is honoured and
+multi-range requests get the whole file, as RFC 9110 allows.
+
+zip_stream() writes a ZIP archive to a non-seekable sink, so the archive is
+produced chunk by chunk while it is sent: no temp file, and memory bounded
+by the chunk size.
+"""
+import argparse
+import email.utils
+import gzip
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+
+CHUNK = 1 << 16
+# Files smaller than this are sent as they are; the headers would eat the saving
+MIN_COMPRESS_BYTES = 1024
+# Parquet is compressed already
+INCOMPRESSIBLE = (".parquet", ".gz", ".zip", ".bcif")
+ETAG_CACHE_SIZE = 4096
+
+_etags = OrderedDict()
+_etags_lock = threading.Lock()
+
+
+class RangeNotSatisfiable(ValueError):
+    """A Range header that selects no byte of the file."""
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+# ----------------------
+# 1. Validators
+# ----------------------
+def file_etag(path):
+    """Strong ETag (quoted SHA-256 of the contents, first 32 hex digits) of a file."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _etags_lock:
+        if key in _etags:
+            _etags.move_to_end(key)
+            return _etags[key]
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    etag = f'"{digest.hexdigest()[:32]}"'
+    with _etags_lock:
+        _etags[key] = etag
+        while len(_etags) > ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return etag
+
+
+def variant_etag(etag, encoding):
+    """ETag of the ``encoding`` (None for identity) representation."""
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def bundle_etag(named_etags):
+    """ETag of an archive built from (name, etag) pairs."""
+    digest = hashlib.sha256()
+    for name, etag in named_etags:
+        digest.update(f"{name}\0{etag}\n".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_listed(header, etag):
+    """Whether an If-None-Match / If-Match header lists ``etag`` (weak comparison)."""
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in header.split(","))
+
+
+def not_modified(headers, etag, mtime):
+    """Whether a GET with these request headers can be answered with 304 Not Modified."""
+    if "if-none-match" in headers:
+        return etag_listed(headers["if-none-match"], etag)
+    since = headers.get("if-modified-since")
+    if since:
+        try:
+            return int(mtime) <= email.utils.parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def http_date(timestamp):
+    return email.utils.formatdate(timestamp, usegmt=True)
+
+
+# ----------------------
+# 2. Ranges and compression
+# ----------------------
+def parse_range(header, size, if_range=None, etag=None, mtime=None):
+    """
+    (start, end) inclusive of a ``Range: bytes=...`` header, or None to send
+    the whole file (no header, several ranges, another unit, or an If-Range
+    that no longer matches).  Raises RangeNotSatisfiable for ranges past the end.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    if if_range is not None:
+        if if_range.startswith(('"', 'W/"')):
+            if if_range != etag:
+                return None
+        elif if_range != http_date(mtime):
+            return None
+    first, sep, last = header[len("bytes="):].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, end
+
+
+def read_range(path, start, end, chunk=CHUNK):
+    """Bytes start..end (inclusive) of a file, in chunks."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(chunk, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def choose_encoding(accept_encoding, filename, size):
+    """"br", "gzip" or None (identity) for a file, from the request's Accept-Encoding."""
+    if size < MIN_COMPRESS_BYTES or filename.endswith(INCOMPRESSIBLE) or not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    candidates = (["br"] if _brotli() is not None else []) + ["gzip"]
+    accepted = [c for c in candidates if weights.get(c, weights.get("*", 0.0)) > 0]
+    if not accepted:
+        return None
+    # Highest weight wins; on a tie brotli (listed first) is preferred
+    return max(accepted, key=lambda c: weights.get(c, weights.get("*", 0.0)))
+
+
+def compress_file(path, encoding):
+    """Contents of a file compressed with ``encoding`` ("br" or "gzip")."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if encoding == "br":
+        return _brotli().compress(data, quality=5)
+    # mtime=0 keeps the output, and so its ETag, identical for identical contents
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+# ----------------------
+# 3. Streaming ZIP
+# ----------------------
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile writes to and zip_stream() drains."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_stream(entries, chunk=CHUNK):
+    """
+    Bytes of a ZIP archive of ``entries`` ((name in the archive, path) pairs),
+    yielded as they are produced.  Already compressed files are stored.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, path in entries:
+            info = zipfile.ZipInfo.from_file(path, name)
+            info.compress_type = zipfile.ZIP_STORED if name.endswith(INCOMPRESSIBLE) else zipfile.ZIP_DEFLATED
+            with open(path, "rb") as src, archive.open(info, "w") as dst:
+                for block in iter(lambda: src.read(chunk), b""):
+                    dst.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print ETags of result files, or bundle them into a ZIP")
+    parser.add_argument("paths", nargs="+", help="Result files")
+    parser.add_argument("--zip", metavar="OUT", help="Write a ZIP of the files (as the API streams it)")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        print(f"{file_etag(path)}  {path}")
+    if args.zip:
+        with open(args.zip, "wb") as out:
+            for data in zip_stream([(os.path.basename(p), p) for p in args.paths]):
+                out.write(data)
+        print(f"✅ Wrote {args.zip}")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Build <pdb><chain>.int interface files from NACCESS .asa output.
+
+Python replacement for scripts/intf_new (intf.f): an atom is in the interface
+when its accessibility in the isolated chain exceeds the one in the complex by
+at least 0.1 Å².  Atoms are matched through a hash index on
+(chain, residue number, insertion code, atom name), so each file is read once.
+
+Accessibilities are held in single precision, as in intf_new, so the delta
+test and the rounding of the written values give .int files identical to the
+ones the Fortran program writes.
+"""
+import argparse
+import glob
+import os
+import re
+
+import numpy as np
+
+from structure import CHAIN_ID_PATTERN, hybrid36_value, record_chain
+
+MIN_DELTA = 0.1
+# Columns of an .asa record and of an .int record; longer chain IDs follow them
+ASA_WIDTH = 68
+INT_WIDTH = 66
+
+INT_COLUMNS = ("serial", "atom", "resname", "chain", "resnum", "icode",
+               "x", "y", "z", "asa_chain", "asa_complex")
+
+
+def asa_key(line, chain=None):
+    """(chain, resnum, icode, atom name) of an .asa line (or of a record label with its ``chain``)."""
+    return chain or record_chain(line.rstrip("\n"), ASA_WIDTH), line[22:26], line[26], line[12:16]
+
+
+def asa_value(line):
+    """Accessibility of an .asa line as a REAL*4, like intf_new."""
+    return np.float32(line[54:62])
+
+
+def read_complex_asa(path):
+    """Hash index of complex accessibilities keyed by asa_key()."""
+    index = {}
+    with open(path) as f:
+        for line in f:
+            if line.startswith(("ATOM", "HETATM")):
+                index[asa_key(line)] = asa_value(line)
+    return index
+
+
+def interface_rows(chain_asa, complex_index, min_delta=MIN_DELTA):
+    """Stream a chain .asa file and yield (line, asa_chain, asa_complex, chain) for interface atoms."""
+    with open(chain_asa) as f:
+        for line in f:
+            if not line.startswith(("ATOM", "HETATM")):
+                continue
+            key = asa_key(line)
+            asa_c = complex_index.get(key)
+            if asa_c is None:
+                continue
+            asa_m = asa_value(line)
+            if asa_m - asa_c >= np.float32(min_delta):
+                yield line, asa_m, asa_c, key[0]
+
+
+def format_int_line(line, asa_m, asa_c, chain):
+    """
+    intf.f output record: A4,2X,I5,2X,A4,A3,1X,A1,I4,A1,3X,3F8.3,2F6.2,
+    followed by the chain ID when it is longer than column 22.
+    """
+    extended = f" {chain}" if len(chain) > 1 else ""
+    return (f"{line[0:4]}  {line[6:11]}  {line[13:17]}{line[17:20]} {line[21]}{line[22:26]}{line[26]}   "
+            f"{line[30:54]}{asa_m:6.2f}{asa_c:6.2f}{extended}\n")
+
+
+def asa_records(result):
+    """
+    (asa_key, .asa-style line, value) per atom of a sasa.SasaResult, without
+    writing or reading the .asa file.  Values go through the file's %8.3f
+    rounding so they match what read_complex_asa() would see.
+    """
+    accs = np.char.mod("%8.3f", result.accs).astype(np.float32)
+    atoms = result.atoms
+    for label, (x, y, z), acc, chain in zip(atoms.labels, atoms.xyz, accs, atoms.chain_ids):
+        yield asa_key(label, chain), f"{label:<30s}{x:8.3f}{y:8.3f}{z:8.3f}", acc
+
+
+def int_arrays(rows):
+    """
+    Columnar view of interface rows, ready for the summary stage.  The
+    accessibilities are the two-decimal values written to the .int file.
+    """
+    rows = list(rows)
+    return {
+        "serial": np.array([hybrid36_value(line[6:11]) for line, *_ in rows], dtype=np.int64),
+        "atom": np.array([line[12:16].strip() for line, *_ in rows]),
+        "resname": np.array([line[17:20].strip() for line, *_ in rows]),
+        "chain": np.array([chain for *_, chain in rows]),
+        "resnum": np.array([hybrid36_value(line[22:26]) for line, *_ in rows], dtype=np.int64),
+        "icode": np.array([line[26].strip() for line, *_ in rows]),
+        "x": np.array([float(line[30:38]) for line, *_ in rows]),
+        "y": np.array([float(line[38:46]) for line, *_ in rows]),
+        "z": np.array([float(line[46:54]) for line, *_ in rows]),
+        "asa_chain": np.array([float(f"{m:6.2f}") for _, m, _, _ in rows], dtype=np.float64),
+        "asa_complex": np.array([float(f"{c:6.2f}") for _, _, c, _ in rows], dtype=np.float64),
+    }
+
+
+def chain_asa_files(pdb_id, rsa_dir):
+    """{chain: path} for every <pdb>_<chain>.asa in rsa_dir."""
+    found = {}
+    pattern = re.compile(rf"{re.escape(pdb_id)}_({CHAIN_ID_PATTERN})\.asa$")
+    for path in sorted(glob.glob(os.path.join(rsa_dir, f"{pdb_id}_*.asa"))):
+        match = pattern.match(os.path.basename(path))
+        if match:
+            found[match.group(1)] = path
+    return found
+
+
+def write_int_file(pdb_id, chain, rows, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, f"{pdb_id}{chain}.int")
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.writelines(format_int_line(*row) for row in rows)
+    os.replace(tmp_path, out_path)
+    print(f"✅ {out_path}: {len(rows)} interface atoms")
+
+
+def generate_ints(pdb_id, rsa_dir="rsa", out_dir=None, min_delta=MIN_DELTA, write=True, chains=None):
+    """
+    Write <pdb><chain>.int for every chain of pdb_id (or only ``chains``)
+    and return {chain: int_arrays(...)}.  With write=False nothing is written.
+    """
+    out_dir = out_dir or rsa_dir
+    complex_asa = os.path.join(rsa_dir, f"{pdb_id}.asa")
+    if not os.path.exists(complex_asa):
+        raise FileNotFoundError(f"Missing complex file {complex_asa}")
+    found = chain_asa_files(pdb_id, rsa_dir)
+    if chains:
+        missing = [ch for ch in chains if ch not in found]
+        if missing:
+            raise FileNotFoundError(f"No .asa file for chain(s) {','.join(missing)} of {pdb_id} in {rsa_dir}")
+        found = {ch: found[ch] for ch in chains}
+    if not found:
+        raise FileNotFoundError(f"No chain .asa files for {pdb_id} found in {rsa_dir}")
+    chains = found
+
+    complex_index = read_complex_asa(complex_asa)
+    results = {}
+    for chain, chain_asa in chains.items():
+        rows = list(interface_rows(chain_asa, complex_index, min_delta))
+        if write:
+            write_int_file(pdb_id, chain, rows, out_dir)
+        results[chain] = int_arrays(rows)
+    return results
+
+
+def generate_ints_from_results(pdb_id, results, out_dir="rsa", min_delta=MIN_DELTA, write=True):
+    """
+    generate_ints() for the in-memory output of sasa.run_delta_sasa()
+    ({None: complex result, chain: chain result}); the .asa files are not read.
+    """
+    complex_index = {key: acc for key, _, acc in asa_records(results[None])}
+    threshold = np.float32(min_delta)
+    ints = {}
+    for chain in sorted(c for c in results if c is not None):
+        rows = []
+        for key, line, asa_m in asa_records(results[chain]):
+            asa_c = complex_index.get(key)
+            if asa_c is not None and asa_m - asa_c >= threshold:
+                rows.append((line, asa_m, asa_c, key[0]))
+        if write:
+            write_int_file(pdb_id, chain, rows, out_dir)
+        ints[chain] = int_arrays(rows)
+    return ints
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Generate <pdb><chain>.int interface files from .asa output")
+    p.add_argument("--pdb-id", required=True, help="PDB ID to process, e.g. 1A3Q")
+    p.add_argument("--rsa-dir", default="rsa", help="Directory with <pdb>.asa and <pdb>_<chain>.asa files")
+    p.add_argument("--out-dir", default=None, help="Directory for .int files (default: --rsa-dir)")
+    p.add_argument("--min-delta", type=float, default=MIN_DELTA, help="Minimum ΔASA (Å²) of an interface atom")
+    p.add_argument("--chain", action="append", default=None,
+                   help="Only write the .int file of this chain (repeatable; default: every chain)")
+    args = p.parse_args()
+
+    generate_ints(args.pdb_id, args.rsa_dir, args.out_dir, args.min_delta, chains=args.chain)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Indexed store of per-atom and per-residue interface data.
+
+The summary stage reduces the .int columns to a handful of numbers; this
+store keeps the rows themselves in SQLite: every interface atom with its
+complex and isolated-chain accessibility, ΔASA and partner chain, and the
+same summed per residue.  Rows are indexed by structure and chain, so the
+interface residues of one chain are a single indexed read.
+
+The partner of an atom is the chain of the nearest atom of another chain in
+the complex (within PARTNER_CUTOFF Å), found with sasa.NeighborGrid.  A
+structure is stored under its PDB ID, the job that produced it and the
+result-cache key of its contents, so a cache hit can be re-filed under a
+new job without recomputing anything.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from compute_summary import concat_columns, int_files, read_int_columns
+from sasa import NeighborGrid
+from structure import input_path, load_structure
+
+DEFAULT_DB = "interface.sqlite"
+# Interface atoms lose accessibility to atoms within r_i + r_j + 2 * probe (< 8 Å)
+PARTNER_CUTOFF = 8.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS structures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pdb_id TEXT NOT NULL,
+    job_id TEXT,
+    key TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS structures_pdb ON structures (pdb_id, id);
+CREATE INDEX IF NOT EXISTS structures_job ON structures (job_id, pdb_id);
+CREATE INDEX IF NOT EXISTS structures_key ON structures (key);
+CREATE TABLE IF NOT EXISTS atoms (
+    structure_id INTEGER NOT NULL,
+    chain TEXT NOT NULL,
+    resname TEXT NOT NULL,
+    resnum INTEGER NOT NULL,
+    icode TEXT NOT NULL,
+    atom TEXT NOT NULL,
+    serial INTEGER,
+    x REAL, y REAL, z REAL,
+    asa_complex REAL NOT NULL,
+    asa_chain REAL NOT NULL,
+    delta REAL NOT NULL,
+    partner TEXT
+);
+CREATE INDEX IF NOT EXISTS atoms_chain ON atoms (structure_id, chain, resnum, icode);
+CREATE TABLE IF NOT EXISTS residues (
+    structure_id INTEGER NOT NULL,
+    chain TEXT NOT NULL,
+    resname TEXT NOT NULL,
+    resnum INTEGER NOT NULL,
+    icode TEXT NOT NULL,
+    atoms INTEGER NOT NULL,
+    asa_complex REAL NOT NULL,
+    asa_chain REAL NOT NULL,
+    delta REAL NOT NULL,
+    partners TEXT
+);
+CREATE INDEX IF NOT EXISTS residues_chain ON residues (structure_id, chain, resnum, icode);
+"""
+
+ATOM_COLUMNS = ("chain", "resname", "resnum", "icode", "atom", "serial", "x", "y", "z",
+                "asa_complex", "asa_chain", "delta", "partner")
+RESIDUE_COLUMNS = ("chain", "resname", "resnum", "icode", "atoms", "asa_complex", "asa_chain", "delta",
+                   "partners")
+
+
+def partner_chains(xyz, chains, ref_xyz=None, ref_chains=None, cutoff=PARTNER_CUTOFF, allowed=None):
+    """
+    Chain of the nearest ``ref`` atom of another chain for every atom of
+    ``xyz`` (None when there is none within ``cutoff``).  Without a
+    reference, the atoms themselves are searched.  ``allowed`` ({chain:
+    partner chains}, see chain_contacts) limits the chains each chain may
+    pair with.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64).reshape(-1, 3)
+    chains = np.asarray(chains).astype(str)
+    if ref_xyz is None:
+        ref_xyz, ref_chains = xyz, chains
+    ref_xyz = np.asarray(ref_xyz, dtype=np.float64).reshape(-1, 3)
+    ref_chains = np.asarray(ref_chains).astype(str)
+    n = len(xyz)
+    partners = np.full(n, None, dtype=object)
+    if not n or not len(ref_xyz):
+        return partners
+
+    # One grid over query and reference atoms; keep query → reference pairs across chains
+    grid = NeighborGrid(np.concatenate([xyz, ref_xyz]), cutoff)
+    i, j = grid.candidate_pairs(np.arange(n))
+    j = j - n
+    keep = (j >= 0)
+    i, j = i[keep], j[keep]
+    keep = chains[i] != ref_chains[j]
+    if allowed is not None:
+        names, codes = np.unique(np.concatenate([chains, ref_chains]), return_inverse=True)
+        lookup = {name: code for code, name in enumerate(names.tolist())}
+        pairs = np.zeros((len(names), len(names)), dtype=bool)
+        for chain, others in allowed.items():
+            for other in others:
+                if chain in lookup and other in lookup:
+                    pairs[lookup[chain], lookup[other]] = True
+        keep &= pairs[codes[:n][i], codes[n:][j]]
+    i, j = i[keep], j[keep]
+    d2 = np.sum((xyz[i] - ref_xyz[j]) ** 2, axis=1)
+    keep = d2 < cutoff ** 2
+    i, j, d2 = i[keep], j[keep], d2[keep]
+    # Nearest per query atom: sort by (atom, distance) and take each atom's first pair
+    order = np.lexsort((d2, i))
+    i, j = i[order], j[order]
+    first = np.ones(len(i), dtype=bool)
+    first[1:] = i[1:] != i[:-1]
+    partners[i[first]] = ref_chains[j[first]]
+    return partners
+
+
+class InterfaceStore:
+    """Interface atoms and residues in SQLite; one connection per thread, picklable."""
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, pdb_id, columns, structure=None, job_id=None, key=None, allowed=None):
+        """
+        Store the interface atoms of one structure (.int columns, either
+        {chain: columns} or concatenated); partner chains are searched in
+        ``structure`` (a structure.Structure) or, without one, among the
+        interface atoms, limited to the ``allowed`` chain pairs if given.
+        Returns the structure id.
+        """
+        columns = concat_columns(columns)
+        xyz = np.stack([columns["x"], columns["y"], columns["z"]], axis=1)
+        if structure is None:
+            partners = partner_chains(xyz, columns["chain"], allowed=allowed)
+        else:
+            partners = partner_chains(xyz, columns["chain"], structure.xyz, structure.chain_ids, allowed=allowed)
+        atoms = pd.DataFrame({name: columns[name] for name in ATOM_COLUMNS if name in columns})
+        atoms["delta"] = np.round(atoms["asa_chain"] - atoms["asa_complex"], 2)
+        atoms["partner"] = partners
+        residue_keys = ["chain", "resname", "resnum", "icode"]
+        residues = atoms.groupby(residue_keys, sort=False).agg(
+            atoms=("atom", "size"), asa_complex=("asa_complex", "sum"), asa_chain=("asa_chain", "sum"),
+            delta=("delta", "sum"),
+            partners=("partner", lambda p: ",".join(p.dropna().value_counts().index) or None),
+        ).reset_index()
+        for name in ("asa_complex", "asa_chain", "delta"):
+            residues[name] = residues[name].round(2)
+
+        conn = self._conn()
+        with conn:
+            structure_id = conn.execute(
+                "INSERT INTO structures (pdb_id, job_id, key, created_at) VALUES (?, ?, ?, ?)",
+                (pdb_id, job_id, key, time.time())).lastrowid
+            conn.executemany(
+                f"INSERT INTO atoms (structure_id, {', '.join(ATOM_COLUMNS)}) "
+                f"VALUES (?{', ?' * len(ATOM_COLUMNS)})",
+                [(structure_id, *row) for row in atoms[list(ATOM_COLUMNS)].itertuples(index=False)])
+            conn.executemany(
+                f"INSERT INTO residues (structure_id, {', '.join(RESIDUE_COLUMNS)}) "
+                f"VALUES (?{', ?' * len(RESIDUE_COLUMNS)})",
+                [(structure_id, *row) for row in residues[list(RESIDUE_COLUMNS)].itertuples(index=False)])
+        return structure_id
+
+    def alias(self, key, pdb_id, job_id=None):
+        """File the newest structure stored under ``key`` again as pdb_id/job_id; returns the new id or None."""
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT id FROM structures WHERE key = ? ORDER BY id DESC LIMIT 1", (key,)).fetchone()
+            if row is None:
+                return None
+            structure_id = conn.execute(
+                "INSERT INTO structures (pdb_id, job_id, key, created_at) VALUES (?, ?, ?, ?)",
+                (pdb_id, job_id, key, time.time())).lastrowid
+            for table, names in (("atoms", ATOM_COLUMNS), ("residues", RESIDUE_COLUMNS)):
+                conn.execute(
+                    f"INSERT INTO {table} (structure_id, {', '.join(names)}) "
+                    f"SELECT ?, {', '.join(names)} FROM {table} WHERE structure_id = ?",
+                    (structure_id, row["id"]))
+        return structure_id
+
+    def find(self, pdb_id, job_id=None):
+        """Id of the newest stored structure named pdb_id (of one job, if given), or None."""
+        if job_id is None:
+            row = self._conn().execute(
+                "SELECT id FROM structures WHERE pdb_id = ? ORDER BY id DESC LIMIT 1", (pdb_id,)).fetchone()
+        else:
+            row = self._conn().execute(
+                "SELECT id FROM structures WHERE pdb_id = ? AND job_id = ? ORDER BY id DESC LIMIT 1",
+                (pdb_id, job_id)).fetchone()
+        return None if row is None else row["id"]
+
+    def chains(self, structure_id):
+        """{chain: interface residue count} of a stored structure."""
+        return dict(self._conn().execute(
+            "SELECT chain, COUNT(*) FROM residues WHERE structure_id = ? GROUP BY chain ORDER BY chain",
+            (structure_id,)).fetchall())
+
+    def residues(self, structure_id, chain):
+        """Interface residues of one chain, in sequence order."""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(RESIDUE_COLUMNS)} FROM residues WHERE structure_id = ? AND chain = ? "
+            "ORDER BY resnum, icode", (structure_id, chain))
+        return [dict(row) for row in rows]
+
+    def atoms(self, structure_id, chain, resnum=None):
+        """Interface atoms of one chain (or of one residue number of it), in sequence order."""
+        query = f"SELECT {', '.join(ATOM_COLUMNS)} FROM atoms WHERE structure_id = ? AND chain = ?"
+        params = [structure_id, chain]
+        if resnum is not None:
+            query += " AND resnum = ?"
+            params.append(resnum)
+        rows = self._conn().execute(query + " ORDER BY resnum, icode, rowid", params)
+        return [dict(row) for row in rows]
+
+    def remove_job(self, job_id):
+        """Drop every structure stored for a job; returns how many there were."""
+        conn = self._conn()
+        with conn:
+            ids = [(row["id"],) for row in conn.execute("SELECT id FROM structures WHERE job_id = ?", (job_id,))]
+            conn.executemany("DELETE FROM atoms WHERE structure_id = ?", ids)
+            conn.executemany("DELETE FROM residues WHERE structure_id = ?", ids)
+            conn.executemany("DELETE FROM structures WHERE id = ?", ids)
+        return len(ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index .int files or query the interface store")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database path")
+    parser.add_argument("--pdb-id", required=True, help="PDB ID to index or query")
+    parser.add_argument("--add", action="store_true", help="Index the .int files of --pdb-id from --rsa-dir")
+    parser.add_argument("--rsa-dir", default="rsa", help="Directory with <pdb><chain>.int files")
+    parser.add_argument("--input-dir", default="input",
+                        help="Directory with <pdb>.pdb (or .cif/.bcif), used to find partner chains (optional)")
+    parser.add_argument("--chain", default=None, help="Chain to list (default: list the chains)")
+    parser.add_argument("--atoms", action="store_true", help="List atoms instead of residues")
+    args = parser.parse_args()
+
+    store = InterfaceStore(args.db)
+    if args.add:
+        columns = read_int_columns(int_files(args.pdb_id, args.rsa_dir))
+        pdb_path = input_path(args.input_dir, args.pdb_id)
+        structure = load_structure(pdb_path) if os.path.exists(pdb_path) else None
+        store.add(args.pdb_id, columns, structure)
+        print(f"✅ Indexed {len(columns['atom'])} interface atoms of {args.pdb_id}")
+
+    structure_id = store.find(args.pdb_id)
+    if structure_id is None:
+        raise SystemExit(f"{args.pdb_id} is not in {args.db}")
+    if args.chain is None:
+        print(json.dumps(store.chains(structure_id)))
+    else:
+        rows = store.atoms(structure_id, args.chain) if args.atoms else store.residues(structure_id, args.chain)
+        for row in rows:
+            print(json.dumps(row))
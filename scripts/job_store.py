@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+SQLite-backed job store for the web API.
+
+Jobs live in one SQLite database in WAL mode, so several uvicorn worker
+processes on the same host can create, update and read jobs concurrently and
+nothing is lost on restart.  Job IDs carry a random suffix and never collide.
+Finished jobs older than a TTL are removed by cleanup(), which hands them back
+so the caller can delete their artifacts.
+
+Every job records its owner (host, PID and start time of the API process
+that created it) and a heartbeat the owner refreshes.  Unfinished jobs
+whose owner stopped heartbeating, e.g. because the process was restarted,
+are failed by fail_stale() so that cleanup() collects them like any other
+finished job.
+
+Every status change and pipeline stage is also appended to an events table,
+which the API tails to push progress to clients (server-sent events).
+Pipeline workers write their stage events through an EventSink.  Timing
+spans (see metrics.py) are stored as events of stage "span".
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+DEFAULT_DB = "jobs.sqlite"
+FINISHED = ("completed", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    progress INTEGER NOT NULL DEFAULT 0,
+    message TEXT,
+    pdb_files TEXT NOT NULL,
+    output_files TEXT NOT NULL DEFAULT '[]',
+    meta TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    owner TEXT,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT,
+    progress INTEGER,
+    message TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_job ON events (job_id, id);
+"""
+
+# Share of a structure's work done once each pipeline stage has finished
+STAGE_FRACTIONS = {"split": 0.1, "sasa": 0.8, "interface": 0.9, "summary": 1.0}
+
+
+def process_owner():
+    """Owner token of this process: host, PID and start time (a restarted process never reuses it)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{time.time():.3f}"
+
+
+def new_job_id():
+    """Time-ordered, human-readable and collision-free: job_<timestamp>_<random hex>."""
+    return f"job_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:12]}"
+
+
+class JobStore:
+    """Job records in SQLite; one connection per thread."""
+
+    def __init__(self, path=DEFAULT_DB, owner=None):
+        self.path = path
+        self.owner = owner or process_owner()
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add the owner/heartbeat columns to databases created before they existed."""
+        with self._write() as conn:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("heartbeat", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self):
+        return _Transaction(self._conn())
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "pdb_files": json.loads(row["pdb_files"]),
+            "created_at": datetime.fromtimestamp(row["created_at"]).isoformat(),
+            "updated_at": datetime.fromtimestamp(row["updated_at"]).isoformat(),
+            "progress": row["progress"],
+            "message": row["message"],
+            "output_files": json.loads(row["output_files"]),
+        }
+        job.update(json.loads(row["meta"]))
+        return job
+
+    def create_job(self, job_id, pdb_files, **meta):
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, progress, message, pdb_files, meta, created_at, updated_at, owner, "
+                "heartbeat) VALUES (?, 'pending', 0, 'Job created', ?, ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(pdb_files), json.dumps(meta), now, now, self.owner, now),
+            )
+
+    def update_job(self, job_id, status, progress=None, message=None, output_files=None):
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, progress = COALESCE(?, progress), message = COALESCE(?, message), "
+                "output_files = COALESCE(?, output_files), updated_at = ? WHERE id = ?",
+                (status, progress, message, None if output_files is None else json.dumps(output_files),
+                 now, job_id),
+            )
+            progress = conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            data = {} if output_files is None else {"output_files": output_files}
+            conn.execute(
+                "INSERT INTO events (job_id, stage, status, progress, message, data, created_at) "
+                "VALUES (?, 'status', ?, ?, ?, ?, ?)",
+                (job_id, status, progress[0] if progress else None, message, json.dumps(data), now),
+            )
+
+    def add_event(self, job_id, stage, message=None, progress=None, **data):
+        """Append a pipeline event; a progress value is also stored on the job."""
+        now = time.time()
+        with self._write() as conn:
+            if progress is not None:
+                conn.execute("UPDATE jobs SET progress = MAX(progress, ?), message = COALESCE(?, message), "
+                             "updated_at = ? WHERE id = ?", (progress, message, now, job_id))
+            conn.execute(
+                "INSERT INTO events (job_id, stage, progress, message, data, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, stage, progress, message, json.dumps(data), now),
+            )
+
+    def add_spans(self, job_id, spans):
+        """Store timing spans (metrics.span records) as "span" events of a job."""
+        now = time.time()
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT INTO events (job_id, stage, message, data, created_at) VALUES (?, 'span', ?, ?, ?)",
+                [(job_id, f"{record['span']} took {record['seconds']:.3f}s", json.dumps(record), now)
+                 for record in spans],
+            )
+
+    def spans(self, job_id):
+        """The timing spans of a job, oldest first."""
+        rows = self._conn().execute("SELECT data FROM events WHERE job_id = ? AND stage = 'span' ORDER BY id",
+                                    (job_id,))
+        return [json.loads(row["data"]) for row in rows]
+
+    def stage_progress(self, job_id, pdb_id, fraction, total, start=10, span=70):
+        """
+        Job progress once ``pdb_id`` is ``fraction`` done: the mean fraction
+        over the job's ``total`` structures (from earlier events), mapped onto
+        start..start+span.
+        """
+        done = {pdb_id: fraction}
+        for (data,) in self._conn().execute(
+                "SELECT data FROM events WHERE job_id = ? AND stage != 'status'", (job_id,)):
+            data = json.loads(data)
+            if "pdb_id" in data and "fraction" in data:
+                done[data["pdb_id"]] = max(done.get(data["pdb_id"], 0.0), data["fraction"])
+        return int(start + span * sum(done.values()) / max(total, 1))
+
+    def events_since(self, job_id, after_id=0, limit=200):
+        """Events of a job with id > after_id, oldest first."""
+        rows = self._conn().execute(
+            "SELECT * FROM events WHERE job_id = ? AND id > ? ORDER BY id LIMIT ?", (job_id, after_id, limit))
+        events = []
+        for row in rows:
+            event = {
+                "id": row["id"],
+                "stage": row["stage"],
+                "status": row["status"],
+                "progress": row["progress"],
+                "message": row["message"],
+                "time": datetime.fromtimestamp(row["created_at"]).isoformat(),
+            }
+            event.update(json.loads(row["data"]))
+            events.append(event)
+        return events
+
+    def get_job(self, job_id):
+        return self._row(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list_jobs(self, status=None, limit=100):
+        """Newest jobs first, optionally of one status."""
+        conn = self._conn()
+        if status is None:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        else:
+            rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                                (status, limit))
+        return [self._row(row) for row in rows]
+
+    def heartbeat(self):
+        """Mark the unfinished jobs of this store's owner as alive."""
+        with self._write() as conn:
+            conn.execute(
+                f"UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status NOT IN ({','.join('?' * len(FINISHED))})",
+                (time.time(), self.owner, *FINISHED),
+            )
+
+    def fail_stale(self, stale_seconds, message="Interrupted by restart"):
+        """
+        Fail the unfinished jobs of other owners whose last heartbeat (or
+        update, for jobs without one) is older than stale_seconds; returns their IDs.
+        """
+        now = time.time()
+        with self._write() as conn:
+            rows = conn.execute(
+                f"UPDATE jobs SET status = 'failed', message = ?, updated_at = ? "
+                f"WHERE status NOT IN ({','.join('?' * len(FINISHED))}) AND owner IS NOT ? "
+                f"AND COALESCE(heartbeat, updated_at) < ? RETURNING id, progress",
+                (message, now, *FINISHED, self.owner, now - stale_seconds),
+            ).fetchall()
+            conn.executemany(
+                "INSERT INTO events (job_id, stage, status, progress, message, data, created_at) "
+                "VALUES (?, 'status', 'failed', ?, ?, '{}', ?)",
+                [(row["id"], row["progress"], message, now) for row in rows],
+            )
+        return [row["id"] for row in rows]
+
+    def cleanup(self, ttl_seconds):
+        """Delete finished jobs created more than ttl_seconds ago; returns the deleted jobs."""
+        cutoff = time.time() - ttl_seconds
+        with self._write() as conn:
+            rows = conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND created_at < ? RETURNING *",
+                (*FINISHED, cutoff),
+            ).fetchall()
+            conn.executemany("DELETE FROM events WHERE job_id = ?", [(row["id"],) for row in rows])
+        return [self._row(row) for row in rows]
+
+
+class EventSink:
+    """
+    Picklable progress callback for pipeline workers: ``sink(stage, message,
+    **data)`` records an event for one structure of a job.
+    """
+
+    _stores = {}
+
+    def __init__(self, db_path, job_id, pdb_id, total=1):
+        self.db_path = db_path
+        self.job_id = job_id
+        self.pdb_id = pdb_id
+        self.total = total
+
+    def __call__(self, stage, message=None, fraction=None, **data):
+        store = self._stores.get(self.db_path)
+        if store is None:
+            store = self._stores[self.db_path] = JobStore(self.db_path)
+        fraction = STAGE_FRACTIONS.get(stage) if fraction is None else fraction
+        progress = None
+        if fraction is not None:
+            progress = store.stage_progress(self.job_id, self.pdb_id, fraction, self.total)
+            data["fraction"] = fraction
+        store.add_event(self.job_id, stage, message, progress, pdb_id=self.pdb_id, **data)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT around a block (the connection runs in autocommit mode)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or clean up the job store")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database path")
+    parser.add_argument("--status", default=None, help="Only list jobs with this status")
+    parser.add_argument("--limit", type=int, default=20, help="Number of jobs to list")
+    parser.add_argument("--cleanup", type=float, metavar="SECONDS", help="Delete finished jobs older than SECONDS")
+    parser.add_argument("--fail-stale", type=float, metavar="SECONDS",
+                        help="Fail unfinished jobs whose owner has not sent a heartbeat for SECONDS")
+    args = parser.parse_args()
+
+    store = JobStore(args.db)
+    if args.fail_stale is not None:
+        print(f"⚠️ Failed {len(store.fail_stale(args.fail_stale))} interrupted jobs")
+    if args.cleanup is not None:
+        print(f"🧹 Removed {len(store.cleanup(args.cleanup))} jobs")
+    for job in store.list_jobs(args.status, args.limit):
+        print(f"{job['job_id']}\t{job['status']:<9}\t{job['progress']:3d}%\t{job['created_at']}\t{job['message']}")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Timing spans, Prometheus-style metrics and per-job profiles.
+
+Spans: ``with span("split", atoms=n) as record:`` times a block and, inside
+``with recording() as spans:``, appends {"span": "split", "seconds": ...,
+**labels} to ``spans``; the block may add labels to ``record`` as it learns
+them.  Outside a recording a span costs two clock reads, so library code
+(sasa.chain_delta_sasa, pipeline.run_pipeline) is instrumented
+unconditionally.  The recording follows the context (contextvars), so
+concurrent threads and tasks keep their spans apart, and worker processes
+return theirs with their result.
+
+Metrics: Counter, Gauge and Histogram in a Registry, rendered in the
+Prometheus text exposition format (version 0.0.4) without any client
+library.  Values live in the process that records them.
+
+Profiles: call_profiled() runs a function under cProfile and writes the
+stats in the standard pstats format (python -m pstats, snakeviz,
+flameprof, ...).
+"""
+import argparse
+import contextlib
+import contextvars
+import cProfile
+import math
+import pstats
+import threading
+import time
+
+# Stage durations from milliseconds (cache lookups) to minutes (SASA of large assemblies)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+# Starlette adds "; charset=utf-8" to text/ media types
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+_recording = contextvars.ContextVar("metrics_recording", default=None)
+
+
+# ----------------------
+# 1. Spans
+# ----------------------
+@contextlib.contextmanager
+def recording():
+    """Collect the spans of the block (including nested recordings' spans) into the yielded list."""
+    spans = []
+    outer = _recording.get()
+    token = _recording.set(spans)
+    try:
+        yield spans
+    finally:
+        _recording.reset(token)
+        if outer is not None:
+            outer.extend(spans)
+
+
+@contextlib.contextmanager
+def span(name, **labels):
+    """Time the block as one span; the yielded dict is the span record (add labels to it)."""
+    record = {"span": name, **labels}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = round(time.perf_counter() - start, 6)
+        spans = _recording.get()
+        if spans is not None:
+            spans.append(record)
+
+
+def format_spans(spans):
+    """One line per span: name, seconds and labels."""
+    lines = []
+    for record in spans:
+        labels = " ".join(f"{k}={v}" for k, v in record.items() if k not in ("span", "seconds"))
+        lines.append(f"{record['span']:<16}{record['seconds']:10.3f}s  {labels}")
+    return "\n".join(lines)
+
+
+# ----------------------
+# 2. Metrics
+# ----------------------
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """One metric family: a value per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        """(suffix, label values, extra labels, value) of every sample."""
+        with self.lock:
+            return [("", key, (), value) for key, value in sorted(self.values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_labels(self.label_names, key, extra)} {_number(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirror a total counted elsewhere (e.g. ResultCache.hits)."""
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    samples.append(("_bucket", key, (("le", _number(bound)),), count))
+                samples.append(("_sum", key, (), round(total, 6)))
+                samples.append(("_count", key, (), counts[-1]))
+        return samples
+
+
+class Registry:
+    """The metrics of one process, rendered together for a /metrics endpoint."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# ----------------------
+# 3. Profiles
+# ----------------------
+def call_profiled(path, func, *args, **kwargs):
+    """func(*args, **kwargs) under cProfile; the stats are written to ``path`` (pstats format)."""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the top entries of a profile written by call_profiled()")
+    parser.add_argument("profile", help="Profile file (e.g. 8ucu.prof from a job run with profile=true)")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key (cumulative, tottime, calls, ...)")
+    parser.add_argument("--limit", type=int, default=25, help="Number of entries to print")
+    args = parser.parse_args()
+
+    pstats.Stats(args.profile).strip_dirs().sort_stats(args.sort).print_stats(args.limit)
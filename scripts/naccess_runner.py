@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Run NACCESS (or the native engine) for a complex and its chains in parallel.
+
+Every invocation gets a private working directory created inside the output
+directory, so concurrent runs never see each other's accall.input or
+.asa/.rsa/.log files.  Outputs are moved into place with os.replace() only
+after the run succeeded, so readers see either the old or the new file.
+"""
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import sasa
+from structure import file_id, first_model_lines, input_path, is_pdb, iter_lines
+
+OUTPUT_EXTS = ("rsa", "asa", "log")
+
+
+def available_cores():
+    """CPUs this process may run on (respects affinity masks / container limits)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def run_isolated(pdb_path, out_dir, engine="naccess"):
+    """Run one accessibility calculation in its own temp dir; returns the output paths."""
+    if not os.path.isfile(pdb_path):
+        raise FileNotFoundError(f"Missing PDB file: {pdb_path}")
+    if engine == "naccess" and not is_pdb(pdb_path):
+        raise ValueError(f"NACCESS reads PDB files only; use the native engine for {pdb_path}")
+    os.makedirs(out_dir, exist_ok=True)
+    name = os.path.basename(pdb_path)
+    base = file_id(name)
+
+    workdir = tempfile.mkdtemp(prefix=f".{base}-", dir=out_dir)
+    try:
+        if engine == "naccess":
+            # accall names its outputs after the text up to the first "." of the path it is given,
+            # so hand it a bare file name inside the private directory.  It reads every model of a
+            # multi-model file as one structure, so the copy holds the first model only.
+            with open(os.path.join(workdir, name), "wb") as f:
+                f.writelines(first_model_lines(iter_lines(pdb_path)))
+            subprocess.run(["naccess", name], cwd=workdir, check=True,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        else:
+            sasa.run_sasa(pdb_path, workdir)
+
+        outputs = []
+        for ext in OUTPUT_EXTS:
+            src = os.path.join(workdir, f"{base}.{ext}")
+            if not os.path.exists(src):
+                raise RuntimeError(f"{engine} did not produce {base}.{ext} for {pdb_path}")
+            outputs.append((src, os.path.join(out_dir, f"{base}.{ext}")))
+        for src, dst in outputs:
+            os.replace(src, dst)
+        return [dst for _, dst in outputs]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_many(pdb_paths, out_dir, engine="naccess", workers=None):
+    """Run every PDB on a bounded process pool; returns {pdb_path: outputs}."""
+    if not pdb_paths:
+        return {}
+    workers = max(1, min(workers or available_cores(), len(pdb_paths)))
+    if workers == 1:
+        return {path: run_isolated(path, out_dir, engine) for path in pdb_paths}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {path: pool.submit(run_isolated, path, out_dir, engine) for path in pdb_paths}
+        return {path: future.result() for path, future in futures.items()}
+
+
+def run_structure(pdb_id, input_dir="input", chains_dir="split_chains", out_dir="rsa",
+                  engine="naccess", workers=None):
+    """Complex and all split chains of one structure, run concurrently."""
+    complex_pdb = input_path(input_dir, pdb_id)
+    chain_pdbs = sorted(glob.glob(os.path.join(chains_dir, f"{pdb_id}_*.pdb")))
+    if not chain_pdbs:
+        raise FileNotFoundError(f"No chains found for {pdb_id} in {chains_dir}")
+    return run_many([complex_pdb] + chain_pdbs, out_dir, engine, workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the complex and all chains of a PDB ID in parallel")
+    parser.add_argument("--pdb-id", required=True, help="PDB ID (e.g. 8ucu)")
+    parser.add_argument("--input-dir", default="input", help="Directory containing <pdb>.pdb")
+    parser.add_argument("--chains-dir", default="split_chains", help="Directory with split chain PDBs")
+    parser.add_argument("--out-dir", default="rsa", help="Output directory for .asa/.rsa/.log files")
+    parser.add_argument("--engine", choices=("native", "naccess"), default="native",
+                        help="native: in-process sasa.py; naccess: external NACCESS binary")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size (default: available cores)")
+    args = parser.parse_args()
+
+    done = run_structure(args.pdb_id, args.input_dir, args.chains_dir, args.out_dir, args.engine, args.workers)
+    print(f"✅ {len(done)} runs for {args.pdb_id} → {args.out_dir}")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+The workflow stages as plain function calls.
+
+Snakefile runs each stage as its own ``python3 scripts/...`` process; this
+module chains the same stages inside one interpreter so a long-lived worker
+(the API's process pool, batch runs) imports pandas/NumPy once and
+then only pays for the geometry.
+"""
+import argparse
+import functools
+import os
+
+import chain_contacts
+import compute_summary
+import generate_ints
+import metrics
+import naccess_runner
+import sasa
+import split_chains
+from structure import input_path, is_pdb, load_structure
+
+
+def warm_up():
+    """Process-pool initializer: import the heavy dependencies before the first job."""
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    sasa.RadiiTable()
+
+
+def run_pipeline(pdb_id, input_dir="input", split_dir="split_chains", rsa_dir="rsa",
+                 interface_dir="interface", engine="native", structure=None, progress=None,
+                 dataset=None, batch=None, interface_store=None, key=None,
+                 interface_mode=chain_contacts.DEFAULT_MODE, background_set=None, background_table=None,
+                 background_db=None):
+    """
+    split → chain contacts → complex/chain ASA → .int → summary for one PDB ID.
+
+    The input (<pdb_id>.pdb, or .cif/.bcif) is parsed once into a
+    structure.Structure that every stage reuses (its first model only, see
+    trajectory.py for multi-model input); ``structure`` may pass one
+    in (or the path of a saved structure file, which is memory-mapped).  ``progress(stage, message, **data)`` is
+    called after every stage and every chain's accessibilities, e.g. with a
+    job_store.EventSink.
+
+    ``interface_mode`` (chain_contacts.MODES) chooses the chains every
+    chain's ΔASA is taken against: "protein_nucleic" (the default) pairs
+    protein chains only with the DNA/RNA chains they touch, so
+    protein–protein and DNA–DNA contacts are left out; "all" uses the whole
+    complex.  A structure with no pair in contact under the requested mode
+    (a protein-only upload in protein_nucleic mode) is analysed with "all".
+    The NACCESS engine supports "all" only.
+
+    The residue background (compute_summary.load_background()) is the table
+    ``background_table``, else the pinned ``background_set`` (default the
+    built-in reference set) of the store at ``background_db``.  It is never
+    taken from the .rsa files in rsa_dir, so a structure's propensity does not
+    depend on what else was analysed there.
+
+    With a results_dataset.ResultsDataset as ``dataset``, the summary and
+    propensity rows are also appended to it under ``batch``; with an
+    interface_store.InterfaceStore, the interface atoms and residues are
+    stored under ``batch`` (the job) and the result-cache ``key``.
+
+    Every stage is timed as a metrics span labelled with the structure's
+    atom and chain counts (parse, split, contacts, sasa with its
+    neighbors/complex_sasa/chain_sasa parts, ints, interface_store, summary,
+    and "pipeline" for the whole call).
+
+    Returns {"pdb_id", "chains", "int_files", "summary", "propensity",
+    "spans"}: the paths of the two CSVs, or with ``interface_dir=None`` the
+    tables themselves (no CSV is written), and the span records.
+    """
+    progress = progress or (lambda stage, message=None, **data: None)
+    # The worker's PID is kept on the whole-call span, e.g. for attaching py-spy to slow workers
+    with metrics.recording() as spans, metrics.span("pipeline", pid=os.getpid()) as total:
+        result = _run_stages(pdb_id, input_dir, split_dir, rsa_dir, interface_dir, engine, structure, progress,
+                             dataset, batch, interface_store, key, interface_mode, total,
+                             background_db, background_set, background_table)
+    for record in spans:
+        record.setdefault("pdb_id", pdb_id)
+    result["spans"] = spans
+    return result
+
+
+def _run_stages(pdb_id, input_dir, split_dir, rsa_dir, interface_dir, engine, structure, progress,
+                dataset, batch, interface_store, key, interface_mode, total,
+                background_db, background_set, background_table):
+    pdb_path = input_path(input_dir, pdb_id)
+    if engine != "native" and not is_pdb(pdb_path):
+        raise ValueError(f"{pdb_path}: mmCIF/BinaryCIF input needs the native engine")
+    with metrics.span("parse") as record:
+        structure = load_structure(structure if structure is not None else pdb_path, all_models=True)
+        if len(structure.models) > 1:
+            print(f"⚠️ {pdb_id}: {len(structure.models)} models, analysing model {structure.models[0]} only "
+                  f"(scripts/trajectory.py computes every model)")
+            structure = structure.first_model()
+        record["atoms"] = total["atoms"] = len(structure)
+
+    # 1) Split chains (kept on disk: NACCESS and downstream tools read them)
+    with metrics.span("split", atoms=len(structure)) as record:
+        chains = split_chains.split_structure(structure, split_dir, pdb_id)
+        record["chains"] = total["chains"] = len(chains)
+    progress("split", f"{pdb_id}: split into chains {','.join(chains)}", chains=chains)
+    sizes = {"atoms": len(structure), "chains": len(chains)}
+
+    # Chain pairs whose ΔASA is computed; pairs out of contact are skipped
+    if interface_mode != "all" and engine != "native":
+        raise ValueError(f"interface_mode {interface_mode!r} needs the native engine")
+    with metrics.span("contacts", **sizes):
+        requested = interface_mode
+        interface_mode, partners = chain_contacts.partners_or_all(structure, interface_mode, name=pdb_id)
+    if interface_mode != requested:
+        progress("contacts", f"{pdb_id}: no chain pairs in contact under {requested}, using all chains",
+                 interface_mode=interface_mode)
+    if interface_mode != "all":
+        pairs = sorted({tuple(sorted((a, b))) for a, others in partners.items() for b in others})
+        progress("contacts", f"{pdb_id}: chain pairs in contact {', '.join('-'.join(p) for p in pairs)}",
+                 partners=partners)
+
+    def sasa_done(chain, done, total):
+        what = "complex" if chain is None else f"chain {chain}"
+        progress("sasa_chain", f"{pdb_id}: accessibilities of {what} done", chain=chain,
+                 fraction=0.1 + 0.7 * done / total)
+
+    # 2) Accessibilities for the complex and every chain, 3) interface atoms
+    if engine == "native":
+        # The "sasa" span includes the neighbors/complex_sasa/chain_sasa spans and the file output
+        with metrics.span("sasa", **sizes):
+            results = sasa.run_delta_sasa(structure, rsa_dir, progress=sasa_done,
+                                          partners=None if interface_mode == "all" else partners)
+        progress("sasa", f"{pdb_id}: accessibilities done")
+        with metrics.span("ints", **sizes) as record:
+            ints = generate_ints.generate_ints_from_results(pdb_id, results, rsa_dir)
+            record["interface_atoms"] = sum(len(columns["resname"]) for columns in ints.values())
+    else:
+        chain_pdbs = [os.path.join(split_dir, f"{pdb_id}_{ch}.pdb") for ch in chains]
+        with metrics.span("sasa", **sizes):
+            for done, (chain, path) in enumerate(zip([None] + chains, [pdb_path] + chain_pdbs), start=1):
+                with metrics.span("complex_sasa" if chain is None else "chain_sasa", chain=chain):
+                    naccess_runner.run_isolated(path, rsa_dir, engine)
+                sasa_done(chain, done, len(chain_pdbs) + 1)
+        progress("sasa", f"{pdb_id}: accessibilities done")
+        with metrics.span("ints", **sizes) as record:
+            ints = generate_ints.generate_ints(pdb_id, rsa_dir)
+            record["interface_atoms"] = sum(len(columns["resname"]) for columns in ints.values())
+    if interface_store is not None:
+        with metrics.span("interface_store", **sizes):
+            interface_store.add(pdb_id, ints, structure, job_id=batch, key=key, allowed=partners)
+    progress("interface", f"{pdb_id}: interface computed",
+             atoms={chain: len(columns["resname"]) for chain, columns in ints.items()})
+
+    # 4) Summary tables (from the .int columns above, not the files)
+    with metrics.span("summary", **sizes):
+        summary_out, prop_out = compute_summary.compute_interface_summary(
+            {pdb_id: ints}, rsa_dir, interface_dir, background_db, background_set,
+            background_table=background_table)[pdb_id]
+        if dataset is not None:
+            dataset.append(*compute_summary.dataset_rows({pdb_id: (summary_out, prop_out)}, {pdb_id: chains}),
+                           batch=batch)
+    if interface_dir is not None:
+        interface_dir = os.path.abspath(interface_dir)
+        summary_out = os.path.join(interface_dir, f"{pdb_id}_interface_summary.csv")
+        prop_out = os.path.join(interface_dir, f"{pdb_id}_residue_propensity.csv")
+    progress("summary", f"{pdb_id}: summary written")
+    return {
+        "pdb_id": pdb_id,
+        "chains": chains,
+        "int_files": [os.path.join(rsa_dir, f"{pdb_id}{ch}.int") for ch in ints],
+        "summary": summary_out,
+        "propensity": prop_out,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the whole interface pipeline in one process")
+    parser.add_argument("--pdb-id", required=True, help="Comma-separated PDB IDs (e.g. 8ucu,1A3Q)")
+    parser.add_argument("--input-dir", default="input")
+    parser.add_argument("--split-dir", default="split_chains")
+    parser.add_argument("--rsa-dir", default="rsa")
+    parser.add_argument("--interface-dir", default="interface")
+    parser.add_argument("--engine", choices=("native", "naccess"), default="native",
+                        help="native: in-process sasa.py; naccess: external NACCESS binary")
+    parser.add_argument("--interface-mode", choices=chain_contacts.MODES, default=chain_contacts.DEFAULT_MODE,
+                        help="protein_nucleic: ΔASA between protein and DNA/RNA chains in contact; "
+                             "all: every chain against the whole complex")
+    parser.add_argument("--background-set", default=None, metavar="NAME[:VERSION]",
+                        help="Pinned residue background set (default: the built-in 'reference' set)")
+    parser.add_argument("--background-table", default=None, metavar="CSV",
+                        help="Residue,Frequency background table instead of a pinned set")
+    parser.add_argument("--background-db", default=None, help="Background store (default: <rsa-dir>/background.sqlite)")
+    parser.add_argument("--spans", action="store_true", help="Print the time spent in every stage")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="Run under cProfile and write <DIR>/<pdb_id>.prof (pstats format)")
+    args = parser.parse_args()
+
+    for pdb_id in args.pdb_id.split(","):
+        call = functools.partial(run_pipeline, pdb_id, args.input_dir, args.split_dir, args.rsa_dir,
+                                 args.interface_dir, args.engine, interface_mode=args.interface_mode,
+                                 background_set=args.background_set, background_table=args.background_table,
+                                 background_db=args.background_db)
+        if args.profile:
+            os.makedirs(args.profile, exist_ok=True)
+            result = metrics.call_profiled(os.path.join(args.profile, f"{pdb_id}.prof"), call)
+        else:
+            result = call()
+        if args.spans:
+            print(metrics.format_spans(result["spans"]))
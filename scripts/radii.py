@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+NACCESS atom radii and polarities (``vdw.radii``).
+
+A radius and polarity depend on the residue and atom names only, so they are
+assigned once per distinct (residue, atom) pair and broadcast to the atoms:
+structure.py fills its ``radius``/``polarity`` columns this way when a file is
+parsed, and sasa.py reads them from there (or assigns them for another radii
+file) instead of looking every atom up again.
+"""
+import argparse
+import functools
+import os
+
+import numpy as np
+
+NACCESS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "naccess", "Naccess")
+DEFAULT_RADII = os.path.normpath(os.path.join(NACCESS_DIR, "vdw.radii"))
+
+HYDROGEN_RADIUS = 1.00
+OXT_RADIUS = 1.40
+
+
+class RadiiTable:
+    """Residue/atom radii read from a NACCESS ``vdw.radii`` file."""
+
+    def __init__(self, path=DEFAULT_RADII):
+        self.path = path
+        self.residues = {}   # resname -> {atom name: (radius, polar)}
+        self.rtype = {}      # resname -> 1 amino acid, 2 nucleic acid, 3 hetero
+        self.any_residue = {}  # atom name -> (radius, polar, resname), first hit wins
+
+        current = None
+        with open(path) as f:
+            for card in f:
+                card = card.rstrip("\n")
+                parts = card.split()
+                if not parts:
+                    continue
+                if parts[0] == "RESIDUE":
+                    current = parts[2][:3].replace("_", " ")
+                    kind = parts[1][:4]
+                    self.rtype[current] = 2 if kind == "NUCL" else 3 if kind == "HETA" else 1
+                    self.residues[current] = {}
+                elif parts[0] == "ATOM" and current is not None:
+                    name = card[5:9].ljust(4)
+                    radius = float(card[10:14])
+                    polar = int(card[15:16]) if len(parts) >= 4 else -1
+                    self.residues[current][name] = (radius, polar)
+                    self.any_residue.setdefault(name, (radius, polar, current))
+
+    def __len__(self):
+        return len(self.residues)
+
+    @property
+    def is_default(self):
+        return os.path.normpath(os.path.abspath(self.path)) == DEFAULT_RADII
+
+
+@functools.lru_cache(maxsize=1)
+def default_table():
+    """The RadiiTable of DEFAULT_RADII, read once per process."""
+    return RadiiTable(DEFAULT_RADII)
+
+
+def guess_radius(atom):
+    """NACCESS vguess(): radius from the element letters of the atom name."""
+    vdw = 1.80
+    vdw = {"C": 1.80, "N": 1.60, "S": 1.85, "O": 1.40, "P": 1.90}.get(atom[1:2], vdw)
+    return {"CA": 2.07, "FE": 1.47, "CU": 1.78, "ZN": 1.39, "MG": 1.73}.get(atom[0:2], vdw)
+
+
+def guess_polarity(atom):
+    """NACCESS polguess()."""
+    return 1 if atom[1:2] in ("O", "N", "A") else 0
+
+
+def is_hydrogen(atom):
+    """NACCESS' hydrogen test on a 4-character atom name (columns 13-16)."""
+    return atom[1:2] in ("H", "D", "Q") or atom[0:1] == "H"
+
+
+def atom_parameters(radii_table, resname, atom):
+    """(radius, polarity) accall assigns atom of resname; hydrogens get HYDROGEN_RADIUS and -1."""
+    if is_hydrogen(atom):
+        return HYDROGEN_RADIUS, -1
+    if atom == " OXT":
+        return OXT_RADIUS, 1
+    entry = radii_table.residues.get(resname, {}).get(atom)
+    if entry is None:
+        hit = radii_table.any_residue.get(atom)
+        entry = hit[:2] if hit is not None else (guess_radius(atom), -1)
+    vdw, ip = entry
+    return vdw, ip if ip >= 0 else guess_polarity(atom)
+
+
+def atom_pairs(labels):
+    """
+    (pairs, index): the distinct (resname, atom name) pairs of 30-byte record
+    labels, and every label's index into them.
+    """
+    n = len(labels)
+    raw = np.ascontiguousarray(labels, dtype="S30").view("S1").reshape(n, 30)
+    key = np.ascontiguousarray(np.concatenate([raw[:, 17:20], raw[:, 12:16]], axis=1)).view("S7").ravel()
+    table, index = np.unique(key, return_inverse=True)
+    pairs = [(k.decode("ascii").ljust(7)[:3], k.decode("ascii").ljust(7)[3:]) for k in table.tolist()]
+    return pairs, index.reshape(-1)
+
+
+def radius_columns(labels, radii_table=None):
+    """(radius float64, polarity int8) per label, looked up once per (resname, atom) pair."""
+    radii_table = radii_table or default_table()
+    pairs, index = atom_pairs(labels)
+    params = [atom_parameters(radii_table, resname, atom) for resname, atom in pairs]
+    radius = np.array([vdw for vdw, _ in params], dtype=np.float64).reshape(-1)
+    polarity = np.array([ip for _, ip in params], dtype=np.int8).reshape(-1)
+    return radius[index], polarity[index]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the NACCESS radii and polarities of residue types")
+    parser.add_argument("residues", nargs="+", help="Residue names (e.g. ALA DA HOH)")
+    parser.add_argument("--radii", default=DEFAULT_RADII, help="NACCESS vdw.radii file")
+    args = parser.parse_args()
+
+    table = RadiiTable(args.radii)
+    for resname in args.residues:
+        atoms = table.residues.get(resname.rjust(3))
+        if atoms is None:
+            print(f"⚠️ {resname}: not in {args.radii}")
+            continue
+        for atom in atoms:
+            vdw, ip = atom_parameters(table, resname.rjust(3), atom)
+            print(f"{resname.rjust(3)} {atom} {vdw:5.2f} {ip}")
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of pipeline results.
+
+Entries are keyed by a hash of the structure's ATOM/HETATM records together
+with everything else that changes the numbers: probe size, z-slice, the
+contents of vdw.radii and standard.data, the ASA engine, the interface
+mode (which chain pairs ΔASA is computed for) and the residue background
+frequencies the propensities are computed against.  Each entry keeps
+the split chains, the ASA files (plus an ``asa.npz`` of the per-atom values)
+and the interface CSVs.  The cache is bounded in bytes and evicts the least
+recently used entries first.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import sasa
+from background_store import reference_frequencies
+from chain_contacts import DEFAULT_MODE
+from structure import is_pdb, load_structure
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 1 << 30
+
+# Entry sub-directories and the file patterns stored in each of them
+CATEGORIES = ("split_chains", "rsa", "interface")
+
+
+def structure_hash(pdb_path):
+    """
+    SHA-256 of the ATOM/HETATM records (columns 1-54: names, numbering,
+    coordinates).  mmCIF/BinaryCIF files hash the same fields of the parsed
+    records, plus the chain IDs.
+    """
+    digest = hashlib.sha256()
+    if not is_pdb(pdb_path):
+        structure = load_structure(pdb_path, all_models=True)
+        digest.update(structure.labels.tobytes())
+        digest.update(np.round(structure.xyz, 3).tobytes())
+        digest.update(",".join(structure.chain_ids.tolist()).encode())
+        return digest.hexdigest()
+    with open(pdb_path, "rb") as f:
+        for line in f:
+            if line.startswith((b"ATOM", b"HETATM")):
+                digest.update(line[:54].rstrip())
+                digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def background_hash(frequencies):
+    """SHA-256 of a {residue: frequency} background, independent of its name or source."""
+    payload = json.dumps({residue: repr(float(freq)) for residue, freq in frequencies.items()}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def parameters(probe=sasa.DEFAULT_PROBE, zslice=sasa.DEFAULT_ZSLICE, radii_path=sasa.DEFAULT_RADII,
+               standard_path=sasa.DEFAULT_STANDARD, engine="native", interface_mode=DEFAULT_MODE,
+               background=None):
+    """
+    Everything besides the coordinates that the cached results depend on.
+    ``background`` is the {residue: frequency} background (default the
+    built-in reference set).
+    """
+    return {
+        "version": CACHE_VERSION,
+        "probe": round(float(probe), 4),
+        "zslice": round(float(zslice), 4),
+        "radii": file_hash(radii_path),
+        "standard": file_hash(standard_path) if os.path.exists(standard_path) else None,
+        "engine": engine,
+        "interface_mode": interface_mode,
+        "background": background_hash(background if background is not None else reference_frequencies()),
+    }
+
+
+def cache_key(pdb_path, params=None):
+    params = params if params is not None else parameters()
+    payload = json.dumps({"structure": structure_hash(pdb_path), **params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def asa_arrays(asa_paths):
+    """{file base name: per-atom accessibilities} for a list of .asa files."""
+    arrays = {}
+    for path in asa_paths:
+        _, values = sasa.read_asa_values(path)
+        arrays[os.path.basename(path).rsplit(".", 1)[0]] = values
+    return arrays
+
+
+class ResultCache:
+    """Size-bounded LRU store of pipeline outputs under ``root``."""
+
+    def __init__(self, root="cache", max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def lookup(self, key):
+        """Entry directory for ``key`` (marking it recently used), or None."""
+        path = self._entry(key)
+        with self._lock:
+            if os.path.isfile(os.path.join(path, "meta.json")):
+                self.hits += 1
+                os.utime(path)
+                return path
+            self.misses += 1
+            return None
+
+    def files(self, key, category):
+        """Paths stored under one category of an entry."""
+        folder = os.path.join(self._entry(key), category)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(os.path.join(folder, name) for name in os.listdir(folder))
+
+    def meta(self, key):
+        with open(os.path.join(self._entry(key), "meta.json")) as f:
+            return json.load(f)
+
+    def store(self, key, pdb_id, files, extra=None):
+        """
+        Add an entry.  ``files`` maps a category ("split_chains", "rsa",
+        "interface") to the paths to keep.  Writes go to a temp dir that is
+        renamed into place, so concurrent readers never see half an entry.
+        """
+        final = self._entry(key)
+        if os.path.isdir(final):
+            return final
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".store-", dir=self.root)
+        try:
+            for category, paths in files.items():
+                if category not in CATEGORIES:
+                    raise ValueError(f"Unknown cache category: {category}")
+                os.makedirs(os.path.join(staging, category), exist_ok=True)
+                for path in paths:
+                    shutil.copy2(path, os.path.join(staging, category, os.path.basename(path)))
+            asa_paths = [p for p in files.get("rsa", []) if p.endswith(".asa")]
+            if asa_paths:
+                np.savez_compressed(os.path.join(staging, "asa.npz"), **asa_arrays(asa_paths))
+            meta = {"key": key, "pdb_id": pdb_id, "created": time.time(), **(extra or {})}
+            meta["bytes"] = dir_size(staging)
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump(meta, f, indent=2)
+            try:
+                os.rename(staging, final)
+            except OSError:
+                # Another worker stored the same key first
+                return final
+        finally:
+            if os.path.isdir(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+        with self._lock:
+            self.stores += 1
+        self.evict()
+        return final
+
+    def restore(self, key, targets, pdb_id=None):
+        """
+        Copy an entry's files into ``targets`` ({category: directory}); returns
+        the new paths.  With ``pdb_id``, files stored under another name for
+        the same structure are renamed to it.
+        """
+        stored_id = self.meta(key)["pdb_id"] if pdb_id else None
+        restored = {}
+        for category, directory in targets.items():
+            os.makedirs(directory, exist_ok=True)
+            restored[category] = []
+            for path in self.files(key, category):
+                name = os.path.basename(path)
+                if stored_id and name.startswith(stored_id):
+                    name = pdb_id + name[len(stored_id):]
+                dst = os.path.join(directory, name)
+                shutil.copy2(path, dst)
+                restored[category].append(dst)
+        return restored
+
+    def entries(self):
+        """(last access time, bytes, path) of every entry."""
+        found = []
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard.startswith(".") or not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                path = os.path.join(shard_dir, key)
+                try:
+                    with open(os.path.join(path, "meta.json")) as f:
+                        size = json.load(f)["bytes"]
+                    found.append((os.path.getmtime(path), size, path))
+                except (OSError, ValueError, KeyError):
+                    continue
+        return found
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        return total
+
+    def stats(self):
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or trim the result cache")
+    parser.add_argument("--cache-dir", default="cache", help="Cache root directory")
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES, help="Size bound for eviction")
+    parser.add_argument("--key", metavar="PDB", help="Print the cache key of a PDB file")
+    parser.add_argument("--evict", action="store_true", help="Evict down to --max-bytes")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.cache_dir, args.max_bytes)
+    if args.key:
+        print(cache_key(args.key))
+    if args.evict:
+        cache.evict()
+    print(json.dumps(cache.stats(), indent=2))
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Append-only, partitioned Parquet dataset of interface results.
+
+Two tables live under one root directory:
+
+    summary/date=<YYYY-MM-DD>/batch=<batch>/part-<id>.parquet      one row per structure
+    propensity/date=<YYYY-MM-DD>/batch=<batch>/part-<id>.parquet   one row per (structure, residue)
+
+Every append writes a new part file (temp file renamed into place), so
+concurrent writers never touch each other's files and readers never see half
+a part.  Queries filter on the date/batch partitions first, then on columns,
+and page through the matches in a stable order.  compact() merges the parts
+of each partition into one file.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_ROOT = "results"
+DEFAULT_BATCH = "manual"
+
+SCHEMAS = {
+    "summary": pa.schema([
+        ("pdb_id", pa.string()),
+        ("chains", pa.string()),
+        ("total_atoms", pa.int64()),
+        ("total_residues", pa.int64()),
+        ("total_area", pa.float64()),
+        ("local_density", pa.float64()),
+        ("propensity_score", pa.float64()),
+        ("fraction_buried", pa.float64()),
+        ("fraction_nonpolar", pa.float64()),
+        ("nonpolar_area", pa.float64()),
+        ("created_at", pa.timestamp("s")),
+    ]),
+    "propensity": pa.schema([
+        ("pdb_id", pa.string()),
+        ("residue", pa.string()),
+        ("propensity", pa.float64()),
+        ("created_at", pa.timestamp("s")),
+    ]),
+}
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("batch", pa.string())]), flavor="hive")
+SORT_KEYS = {"summary": ["date", "batch", "pdb_id"], "propensity": ["date", "batch", "pdb_id", "residue"]}
+
+FILTER = re.compile(r"^(\w+)\s*(>=|<=|!=|=|>|<)\s*(.+)$")
+OPERATORS = {
+    "=": lambda f, v: f == v,
+    "!=": lambda f, v: f != v,
+    ">": lambda f, v: f > v,
+    ">=": lambda f, v: f >= v,
+    "<": lambda f, v: f < v,
+    "<=": lambda f, v: f <= v,
+}
+
+
+def partition_value(value):
+    """A batch name that is safe as a directory name."""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(value)) or DEFAULT_BATCH
+
+
+def parse_filter(spec, table="summary"):
+    """"column<op>value" (op one of = != > >= < <=) → (column, op, typed value)."""
+    match = FILTER.match(spec.strip())
+    if not match:
+        raise ValueError(f"Invalid filter: {spec}")
+    column, op, value = match.groups()
+    fields = {field.name: field.type for field in SCHEMAS[table]}
+    fields.update(date=pa.string(), batch=pa.string())
+    if column not in fields:
+        raise ValueError(f"Unknown column for {table}: {column}")
+    if pa.types.is_integer(fields[column]):
+        value = int(value)
+    elif pa.types.is_floating(fields[column]):
+        value = float(value)
+    elif pa.types.is_timestamp(fields[column]):
+        value = pd.Timestamp(value).to_pydatetime()
+    return column, op, value
+
+
+class ResultsDataset:
+    """The summary and propensity tables under ``root``."""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    def _frame(self, table, rows, created_at):
+        df = pd.DataFrame(rows)
+        df["created_at"] = created_at
+        for name in SCHEMAS[table].names:
+            if name not in df:
+                df[name] = pd.Series([None] * len(df), dtype=object)
+        return pa.Table.from_pandas(df[SCHEMAS[table].names], schema=SCHEMAS[table], preserve_index=False)
+
+    def append(self, summary_rows, propensity_rows, batch=None, when=None):
+        """
+        Add rows (lists of dicts or DataFrames) as one new part per table in the
+        partition of ``when`` (default: now) and ``batch`` (default: DEFAULT_BATCH);
+        returns the part paths.
+        """
+        when = (when or datetime.now()).replace(microsecond=0)
+        partition = f"date={when.strftime('%Y-%m-%d')}/batch={partition_value(batch or DEFAULT_BATCH)}"
+        part = f"part-{uuid.uuid4().hex}.parquet"
+        written = []
+        for table, rows in (("summary", summary_rows), ("propensity", propensity_rows)):
+            if rows is None or not len(rows):
+                continue
+            folder = os.path.join(self.root, table, partition)
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, part)
+            tmp_path = os.path.join(folder, f".{part}.tmp")
+            pq.write_table(self._frame(table, rows, when), tmp_path)
+            os.replace(tmp_path, path)
+            written.append(path)
+        return written
+
+    def _dataset(self, table):
+        folder = os.path.join(self.root, table)
+        if not os.path.isdir(folder):
+            return None
+        # Temp files start with "." and are skipped
+        schema = pa.unify_schemas([SCHEMAS[table], PARTITIONING.schema])
+        return ds.dataset(folder, schema=schema, format="parquet", partitioning=PARTITIONING,
+                          ignore_prefixes=[".", "_"])
+
+    def query(self, table="summary", filters=(), batch=None, since=None, until=None, pdb_ids=None,
+              limit=100, offset=0):
+        """
+        Rows of ``table`` matching every filter ((column, op, value) tuples or
+        "column<op>value" strings), a batch, a date range (YYYY-MM-DD,
+        inclusive) and PDB IDs, ordered by date, batch, pdb_id.  Returns
+        (total matches, rows of the requested page).
+        """
+        if table not in SCHEMAS:
+            raise ValueError(f"Unknown table: {table}")
+        dataset = self._dataset(table)
+        if dataset is None:
+            return 0, []
+        expr = None
+        conditions = [parse_filter(f, table) if isinstance(f, str) else f for f in filters]
+        if batch is not None:
+            conditions.append(("batch", "=", partition_value(batch)))
+        if since is not None:
+            conditions.append(("date", ">=", since))
+        if until is not None:
+            conditions.append(("date", "<=", until))
+        for column, op, value in conditions:
+            condition = OPERATORS[op](ds.field(column), value)
+            expr = condition if expr is None else expr & condition
+        if pdb_ids:
+            condition = ds.field("pdb_id").isin(list(pdb_ids))
+            expr = condition if expr is None else expr & condition
+
+        matches = dataset.to_table(filter=expr)
+        matches = matches.sort_by([(key, "ascending") for key in SORT_KEYS[table]])
+        rows = matches.slice(offset, limit).to_pylist()
+        for row in rows:
+            for key, value in row.items():
+                if isinstance(value, float) and math.isnan(value):
+                    row[key] = None
+        return matches.num_rows, rows
+
+    def compact(self, table=None):
+        """Merge the parts of every partition into a single file; returns the number of partitions merged."""
+        merged = 0
+        for name in [table] if table else list(SCHEMAS):
+            folder = os.path.join(self.root, name)
+            for directory, _, files in os.walk(folder):
+                parts = sorted(f for f in files if f.startswith("part-") and f.endswith(".parquet"))
+                if len(parts) < 2:
+                    continue
+                paths = [os.path.join(directory, f) for f in parts]
+                combined = pa.concat_tables([pq.read_table(p, schema=SCHEMAS[name]) for p in paths])
+                part = f"part-{uuid.uuid4().hex}.parquet"
+                tmp_path = os.path.join(directory, f".{part}.tmp")
+                pq.write_table(combined, tmp_path)
+                os.replace(tmp_path, os.path.join(directory, part))
+                for path in paths:
+                    os.remove(path)
+                merged += 1
+        return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query or compact the results dataset")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Dataset root directory")
+    parser.add_argument("--table", choices=sorted(SCHEMAS), default="summary")
+    parser.add_argument("--filter", action="append", default=[], metavar="COLUMN<OP>VALUE",
+                        help="Row filter, e.g. total_area>=1000 (repeatable)")
+    parser.add_argument("--batch", default=None)
+    parser.add_argument("--since", default=None, metavar="YYYY-MM-DD")
+    parser.add_argument("--until", default=None, metavar="YYYY-MM-DD")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--compact", action="store_true", help="Merge the parts of every partition first")
+    args = parser.parse_args()
+
+    dataset = ResultsDataset(args.root)
+    if args.compact:
+        print(f"🧹 Compacted {dataset.compact()} partitions")
+    total, rows = dataset.query(args.table, args.filter, args.batch, args.since, args.until,
+                                limit=args.limit, offset=args.offset)
+    for row in rows:
+        print(json.dumps(row, default=str))
+    print(f"{len(rows)} of {total} rows")
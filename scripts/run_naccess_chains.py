@@ -1,42 +1,38 @@
 #!/usr/bin/env python3
-import subprocess, argparse, os, shutil, glob
+import argparse, os, glob
+import naccess_runner
 
-def run_naccess(pdb_path, out_dir):
-    if not os.path.isfile(pdb_path):
-        raise FileNotFoundError(f"Missing chain PDB file: {pdb_path}")
-    
-    print(f"→ Running NACCESS on {os.path.basename(pdb_path)}")
-    subprocess.run(["naccess", pdb_path], check=True)
-
-    base = os.path.basename(pdb_path).rsplit(".", 1)[0]
-    for ext in ("rsa", "asa", "log"):
-        src = f"{base}.{ext}"
-        if os.path.exists(src):
-            dst = os.path.join(out_dir, f"{base}.{ext}")
-            shutil.move(src, dst)
-        else:
-            print(f"  ⚠️  Warning: Expected {src} not found.")
+def run_naccess(pdb_path, out_dir, engine="native"):
+    print(f"→ Running {engine} on {os.path.basename(pdb_path)}")
+    return naccess_runner.run_isolated(pdb_path, out_dir, engine)
 
-def run_all_chains(pdb_id, chains_dir, out_dir):
+def run_all_chains(pdb_id, chains_dir, out_dir, engine="native", workers=None, chains=None):
     os.makedirs(out_dir, exist_ok=True)
     
-    pattern = os.path.join(chains_dir, f"{pdb_id}_*.pdb")
-    chain_paths = sorted(glob.glob(pattern))
+    if chains:
+        chain_paths = [os.path.join(chains_dir, f"{pdb_id}_{ch}.pdb") for ch in chains]
+    else:
+        chain_paths = sorted(glob.glob(os.path.join(chains_dir, f"{pdb_id}_*.pdb")))
     
     if not chain_paths:
         raise FileNotFoundError(f"No chains found for {pdb_id} in {chains_dir}")
     
     print(f"Found {len(chain_paths)} chains for {pdb_id} → {', '.join(os.path.basename(p) for p in chain_paths)}")
 
-    for chain_pdb in chain_paths:
-        run_naccess(chain_pdb, out_dir)
+    # Each chain runs in its own work directory, so they can share a process pool
+    return naccess_runner.run_many(chain_paths, out_dir, engine, workers)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run NACCESS on all chains for a PDB ID")
     parser.add_argument("--pdb-id", required=True, help="PDB ID prefix (e.g. 8ucu)")
     parser.add_argument("--chains-dir", default="split_chains", help="Directory with split chain PDBs")
     parser.add_argument("--out-dir", default="rsa", help="Output directory for .asa/.rsa/.log files")
+    parser.add_argument("--engine", choices=("native", "naccess"), default="native",
+                        help="native: in-process sasa.py; naccess: external NACCESS binary")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size (default: available cores)")
+    parser.add_argument("--chain", action="append", default=None,
+                        help="Only run this chain (repeatable; default: every split chain)")
 
     args = parser.parse_args()
-    run_all_chains(args.pdb_id, args.chains_dir, args.out_dir)
+    run_all_chains(args.pdb_id, args.chains_dir, args.out_dir, args.engine, args.workers, args.chain)
 
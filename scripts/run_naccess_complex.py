@@ -1,35 +1,50 @@
 #!/usr/bin/env python3
-import subprocess, argparse, os, shutil
+import argparse, os
+import chain_contacts
+import naccess_runner
+import sasa
+from structure import input_path, load_structure
 
-def run_naccess(pdb_path, out_dir):
+def run_naccess(pdb_path, out_dir, engine="native"):
     if not os.path.isfile(pdb_path):
         raise FileNotFoundError(f"❌ Input PDB file not found: {pdb_path}")
     
-    print(f"🔄 Running NACCESS on: {pdb_path}")
-    subprocess.run(["naccess", pdb_path], check=True)
-
-    base = os.path.basename(pdb_path).rsplit(".", 1)[0]
-    for ext in ("rsa", "asa", "log"):
-        src = f"{base}.{ext}"
-        if os.path.exists(src):
-            dst = os.path.join(out_dir, f"{base}.{ext}")
-            shutil.move(src, dst)
-            print(f"✅ Moved {src} → {dst}")
-        else:
-            print(f"⚠️  Warning: expected {src} not found")
+    print(f"🔄 Running {engine} on: {pdb_path}")
+    for dst in naccess_runner.run_isolated(pdb_path, out_dir, engine):
+        print(f"✅ Wrote {dst}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run NACCESS on a complex PDB structure")
     parser.add_argument("--pdb-id", required=True,
-                        help="PDB ID of the input file, e.g. 8ucu (looks for input/8ucu.pdb)")
+                        help="PDB ID of the input file, e.g. 8ucu (looks for input/8ucu.pdb, .cif or .bcif)")
     parser.add_argument("--input-dir", default="input",
                         help="Directory containing the input .pdb file")
     parser.add_argument("--out-dir", default="rsa",
                         help="Directory to write .asa, .rsa, .log output")
+    parser.add_argument("--engine", choices=("native", "naccess"), default="native",
+                        help="native: in-process sasa.py; naccess: external NACCESS binary")
+    parser.add_argument("--with-chains", action="store_true",
+                        help="native engine only: also write per-chain outputs from the same neighbour grid")
+    parser.add_argument("--interface-mode", choices=chain_contacts.MODES, default=chain_contacts.DEFAULT_MODE,
+                        help="protein_nucleic (native engine only): the complex of every chain is the chain "
+                             "and the DNA/RNA or protein chains it touches; all: the whole complex")
     args = parser.parse_args()
 
     os.makedirs(args.out_dir, exist_ok=True)
     
-    pdb_path = os.path.join(args.input_dir, f"{args.pdb_id}.pdb")
-    run_naccess(pdb_path, args.out_dir)
+    pdb_path = input_path(args.input_dir, args.pdb_id)
+    if args.interface_mode != "all":
+        if args.engine != "native":
+            parser.error(f"--interface-mode {args.interface_mode} needs the native engine")
+        structure = load_structure(pdb_path)
+        mode, partners = chain_contacts.partners_or_all(structure, args.interface_mode, name=args.pdb_id)
+        print(f"🔄 Computing {mode} ΔASA in-process for: {pdb_path} (partners {partners})")
+        # The chain outputs are left to run_naccess_chains.py
+        sasa.run_delta_sasa(structure, args.out_dir, partners=None if mode == "all" else partners,
+                            write_chains=False)
+    elif args.engine == "native" and args.with_chains:
+        print(f"🔄 Computing complex + chain ΔASA in-process for: {pdb_path}")
+        sasa.run_delta_sasa(pdb_path, args.out_dir)
+    else:
+        run_naccess(pdb_path, args.out_dir, args.engine)
 
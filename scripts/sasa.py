@@ -0,0 +1,905 @@
+#!/usr/bin/env python3
+"""
+In-process Lee & Richards accessibility calculation.
+
+A NumPy port of NACCESS 2.1 (``accall``/``solva`` in naccess/Naccess/accall.f).
+Radii, polarity and backbone assignment follow ``vdw.radii`` and ``standard.data``
+exactly as NACCESS reads them, and the z-slice integration uses the same probe
+and slice parameters, so the ``.asa``/``.rsa`` files written here can be used
+anywhere the NACCESS outputs were used before.
+"""
+import argparse
+import copy
+import math
+import os
+
+import numpy as np
+
+from metrics import span
+from radii import (DEFAULT_RADII, HYDROGEN_RADIUS, NACCESS_DIR, RadiiTable, atom_pairs, guess_polarity,
+                   guess_radius, is_hydrogen, radius_columns)
+from structure import Structure, file_id, first_model_lines, hybrid36, is_pdb, load_structure, record_chain
+
+DEFAULT_STANDARD = os.path.normpath(os.path.join(NACCESS_DIR, "standard.data"))
+DEFAULT_PROBE = 1.40
+DEFAULT_ZSLICE = 0.05
+
+RECORD_LABELS = {1: "RES", 2: "HEM", 3: "HOH"}
+
+# Backbone atom names used by NACCESS' what_atom()
+MAIN_CHAIN = (" N  ", " C  ", " O  ", " OXT", " CA ")
+NUCLEIC_BACKBONE = (" P  ", " O1P", " O2P", " O5*", " C5*", " C4*",
+                    " O4*", " C3*", " O3*", " C2*", " C1*")
+
+# Columns of the residue sums, in NACCESS order
+SUM_COLUMNS = ("all", "nonpolar_side", "polar_side", "total_side",
+               "main_chain", "nonpolar", "polar")
+
+
+# ----------------------
+# 1. Parameter files
+# ----------------------
+def load_standard_data(path=DEFAULT_STANDARD):
+    """Reference accessibilities (7 columns) per residue type from ``standard.data``."""
+    standard = {}
+    if not path or not os.path.exists(path):
+        return standard
+    with open(path) as f:
+        for line in f:
+            if line.startswith("ATOM"):
+                line = line.rstrip("\n").ljust(101)
+                standard[line[12:15]] = np.array([
+                    float(line[16:23]), float(line[29:36]), float(line[42:49]),
+                    float(line[55:62]), float(line[68:75]), float(line[81:88]),
+                    float(line[94:101]),
+                ])
+    return standard
+
+
+def is_side_chain(atom, rtype, nbackbone=4):
+    """NACCESS what_atom(): 0 for backbone atoms, 1 for everything else."""
+    if rtype == 1:
+        return 0 if atom in MAIN_CHAIN[:nbackbone] else 1
+    if rtype == 2:
+        return 0 if atom in NUCLEIC_BACKBONE else 1
+    return 0 if atom in MAIN_CHAIN[:4] or atom in NUCLEIC_BACKBONE else 1
+
+
+# ----------------------
+# 2. PDB atoms
+# ----------------------
+class AtomTable:
+    """Atoms selected from a PDB file, as parallel arrays."""
+
+    def __init__(self, labels, xyz, radii, polar, side_chain, residue_index,
+                 residue_names, residue_types, residue_chains, chain_names, log, chain_ids=None, rows=None,
+                 chain_serials=None):
+        self.labels = labels                  # card[0:30] per atom
+        self.xyz = xyz                        # (n, 3) float64
+        self.radii = radii                    # van der Waals radii
+        self.polar = polar                    # 1 polar, 0 non-polar, -1 unknown
+        self.side_chain = side_chain          # 0 backbone, 1 side chain
+        self.residue_index = residue_index    # atom -> residue
+        self.residue_names = residue_names    # card[17:27] per residue
+        self.residue_types = residue_types    # 1 ATOM, 2 HETATM, 3 water
+        self.residue_chains = residue_chains  # residue -> chain number
+        self.chain_names = chain_names        # chain IDs in order of appearance
+        self.log = log                        # (residue, message) NACCESS-style log entries
+        # Chain ID per atom (column 22 unless the IDs are longer than one character)
+        self.chain_ids = chain_ids if chain_ids is not None else [label[21:22] for label in labels]
+        self.rows = rows                      # index of each atom's record in the input, if known
+        self.chain_serials = chain_serials    # atom serial in the split-chain file, if known
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def chains(self):
+        """Chain ID per atom."""
+        return np.array(self.chain_ids)
+
+    def residue_chain(self, r):
+        """Chain ID of residue r."""
+        return self.chain_names[self.residue_chains[r] - 1]
+
+    def subset(self, mask):
+        """AtomTable of the selected atoms, with residues and chains renumbered."""
+        keep = np.flatnonzero(mask)
+        used, residue_index = np.unique(self.residue_index[keep], return_inverse=True)
+        residue_names = [self.residue_names[r] for r in used]
+        chain_names = []
+        for r in used:
+            if self.residue_chain(r) not in chain_names:
+                chain_names.append(self.residue_chain(r))
+        residue_chains = np.array([chain_names.index(self.residue_chain(r)) + 1 for r in used], dtype=np.int64)
+        renumber = {int(old): new for new, old in enumerate(used)}
+        return AtomTable(
+            [self.labels[i] for i in keep],
+            self.xyz[keep],
+            self.radii[keep],
+            self.polar[keep],
+            self.side_chain[keep],
+            residue_index.astype(np.int64),
+            residue_names,
+            [self.residue_types[r] for r in used],
+            residue_chains,
+            chain_names,
+            [(renumber[r], line) for r, line in self.log if r in renumber],
+            [self.chain_ids[i] for i in keep],
+            None if self.rows is None else self.rows[keep],
+            None if self.chain_serials is None else self.chain_serials[keep],
+        )
+
+    def renumbered(self):
+        """
+        Copy whose labels carry chain_serials, so per-chain output numbers
+        atoms like NACCESS run on the split-chain file.
+        """
+        if self.chain_serials is None:
+            return self
+        table = copy.copy(self)
+        table.labels = [label[:6] + hybrid36(int(serial), 5) + label[11:]
+                        for label, serial in zip(self.labels, self.chain_serials)]
+        return table
+
+
+def record_type(card):
+    """NACCESS restype(): 1 ATOM, 2 HETATM, 3 water, 0 anything else."""
+    kind = 0
+    if card[0:4] == "ATOM":
+        kind = 1
+    if card[0:6] == "HETATM":
+        kind = 2
+    if card[17:20] == "HOH":
+        kind = 3
+    return kind
+
+
+def read_atoms(pdb_path, radii_table, hetatoms=False, waters=False, hydrogens=False, nbackbone=4):
+    """Select and type atoms from (the first model of) a PDB file the way NACCESS' accall does."""
+    with open(pdb_path) as f:
+        cards = [line.rstrip("\n").ljust(80) for line in first_model_lines(f)]
+    return atoms_from_cards(cards, radii_table, hetatoms, waters, hydrogens, nbackbone)
+
+
+def atoms_from_cards(cards, radii_table, hetatoms=False, waters=False, hydrogens=False, nbackbone=4):
+    return atoms_from_labels([card[0:30] for card in cards], lambda i: cards[i][30:54], radii_table,
+                             hetatoms, waters, hydrogens, nbackbone, [record_chain(card) for card in cards])
+
+
+def atoms_from_structure(structure, radii_table, hetatoms=False, waters=False, hydrogens=False, nbackbone=4):
+    """
+    AtomTable of a structure.Structure: the selection and typing of
+    atoms_from_labels() done over its columns.  Radii and polarities are the
+    structure's own columns (assigned when it was parsed) unless another radii
+    file is given; side chains and log lines are worked out once per distinct
+    (residue, atom) pair.
+    """
+    labels = structure.labels
+    n = len(labels)
+    raw = np.ascontiguousarray(labels, dtype="S30").view("S1").reshape(n, 30)
+
+    def field(values, start, end):
+        return np.ascontiguousarray(values[:, start:end]).view(f"S{end - start}").ravel()
+
+    record = field(raw, 0, 6)
+    kind = np.zeros(n, dtype=np.int8)
+    kind[field(raw, 0, 4) == b"ATOM"] = 1
+    kind[record == b"HETATM"] = 2
+    kind[field(raw, 17, 20) == b"HOH"] = 3
+    selected = (kind == 1) | ((kind == 2) & hetatoms) | ((kind == 3) & waters)
+    # Ignore alternate positions other than blank or the first one encountered
+    alternate = selected & (raw[:, 16] != b" ")
+    if alternate.any():
+        selected &= (raw[:, 16] == b" ") | (raw[:, 16] == raw[np.argmax(alternate), 16])
+    hydrogen = np.isin(raw[:, 13], (b"H", b"D", b"Q")) | (raw[:, 12] == b"H")
+    if not hydrogens:
+        selected &= ~hydrogen
+    rows = np.flatnonzero(selected)
+
+    # A residue starts at every heavy atom whose columns 18-27 or chain differ from the previous heavy atom's;
+    # hydrogens belong to the residue of the heavy atom before them
+    heavy = ~hydrogen[rows]
+    chain_index = structure.chain_index[rows]
+    key = field(raw[rows], 17, 27)
+    heavy_pos = np.flatnonzero(heavy)
+    first = np.ones(len(heavy_pos), dtype=bool)
+    first[1:] = (key[heavy_pos[1:]] != key[heavy_pos[:-1]]) | (chain_index[heavy_pos[1:]] != chain_index[heavy_pos[:-1]])
+    starts = np.zeros(len(rows), dtype=bool)
+    starts[heavy_pos[first]] = True
+    residue_index = np.maximum(np.cumsum(starts) - 1, 0)
+    start_pos = np.flatnonzero(starts)
+    residue_names = [name.decode("ascii") for name in key[start_pos].tolist()]
+    start_chains = chain_index[start_pos]
+    seen, first_seen = np.unique(start_chains, return_index=True)
+    chain_order = seen[np.argsort(first_seen, kind="stable")]
+    chain_no = np.zeros(len(structure.chains), dtype=np.int64)
+    chain_no[chain_order] = np.arange(1, len(chain_order) + 1)
+
+    if radii_table.is_default:
+        radius, polar = structure.radius[rows], structure.polarity[rows]
+    else:
+        radius, polar = radius_columns(labels[rows], radii_table)
+    pairs, pair_index = atom_pairs(labels[rows])
+    side = np.array([is_side_chain(atom, radii_table.rtype.get(res, 0), nbackbone) for res, atom in pairs],
+                    dtype=np.int8)
+    side_chain = np.where(heavy, side[pair_index], 0).astype(np.int8)
+
+    # NACCESS' notes on unknown residues and atoms, in record order
+    notes = [(start_pos[r], 0, r, f" UNKNOWN residue type.............> {name}")
+             for r, name in enumerate(residue_names) if name[:3] not in radii_table.residues]
+    nonstandard = np.array([not is_hydrogen(atom) and atom != " OXT" and atom not in radii_table.residues.get(res, {})
+                            for res, atom in pairs], dtype=bool)
+    for i in np.flatnonzero(nonstandard[pair_index] & heavy).tolist():
+        r = int(residue_index[i])
+        atom, last = pairs[pair_index[i]][1], residue_names[r]
+        notes.append((i, 1, r, f" NON-STANDARD atom.|{atom}| in residue> {last}"))
+        hit = radii_table.any_residue.get(atom)
+        if hit is not None:
+            notes.append((i, 2, r, f" ASSUMED vdw of {atom} in {last} = {hit[0]:5.2f} (same as {hit[2]})"))
+        else:
+            notes.append((i, 2, r, f" GUESSED vdw of {atom} in {last} = {guess_radius(atom):5.2f}"))
+    log = [(r, line) for _, _, r, line in sorted(notes, key=lambda note: note[:2])]
+
+    # split_chains.py renumbers every chain's ATOM/HETATM records from 1
+    counted = ((record == b"ATOM  ") | (record == b"HETATM")).astype(np.int64)
+    order = np.argsort(structure.chain_index, kind="stable")
+    sorted_chains = structure.chain_index[order]
+    running = np.cumsum(counted[order])
+    before = np.concatenate([[0], running])[np.searchsorted(sorted_chains, sorted_chains, side="left")]
+    chain_serials = np.empty(n, dtype=np.int64)
+    chain_serials[order] = running - before
+
+    chains = np.asarray(structure.chains)
+    return AtomTable(
+        np.char.decode(labels[rows], "ascii").tolist(),
+        np.asarray(structure.xyz, dtype=np.float64)[rows].reshape(-1, 3),
+        np.asarray(radius, dtype=np.float64),
+        np.asarray(polar, dtype=np.int8),
+        side_chain,
+        residue_index.astype(np.int64),
+        residue_names,
+        kind[rows][start_pos].tolist(),
+        chain_no[start_chains],
+        [structure.chains[c] for c in chain_order.tolist()],
+        log,
+        chains[chain_index].tolist(),
+        rows.astype(np.int64),
+        chain_serials[rows],
+    )
+
+
+def atoms_from_labels(labels, coords, radii_table, hetatoms=False, waters=False, hydrogens=False, nbackbone=4,
+                      chains=None):
+    """
+    NACCESS atom selection and typing over record labels (columns 1-30).
+    ``coords`` is an (n, 3) array, or a callable giving the columns 31-54 text
+    of a record.  ``chains`` gives every record's chain ID when they do not
+    fit column 22.
+    """
+    chains = chains if chains is not None else [card[21] for card in labels]
+    rows, radii, polar, side_chain, residue_index = [], [], [], [], []
+    chain = None
+    residue_names, residue_types, residue_chains, chain_names, log = [], [], [], [], []
+    first_alt = None
+    last = None
+    rtype = 0
+    resok = False
+    chain_no = 0
+    # split_chains.py renumbers every chain's ATOM/HETATM records from 1
+    chain_records = {}
+    chain_serials = []
+
+    for row, card in enumerate(labels):
+        if card[:6] in ("ATOM  ", "HETATM"):
+            chain_records[chains[row]] = chain_records.get(chains[row], 0) + 1
+        kind = record_type(card)
+        if not (kind == 1 or (kind == 2 and hetatoms) or (kind == 3 and waters)):
+            continue
+
+        # Ignore alternate positions other than blank or the first one encountered
+        alt = card[16]
+        if alt != " ":
+            if first_alt is None:
+                first_alt = alt
+            if alt != first_alt:
+                continue
+
+        atom = card[12:16]
+        if card[13] in "HDQ" or card[12] == "H":
+            if not hydrogens:
+                continue
+            vdw, ip, bb = HYDROGEN_RADIUS, -1, 0
+        else:
+            # New residue ?
+            if card[17:27] != last or chains[row] != chain:
+                last = card[17:27]
+                res = card[17:20]
+                resok = res in radii_table.residues
+                rtype = radii_table.rtype[res] if resok else 0
+                if not resok:
+                    log.append((len(residue_names), f" UNKNOWN residue type.............> {last}"))
+                chain = chains[row]
+                if chain not in chain_names:
+                    chain_names.append(chain)
+                chain_no = chain_names.index(chain) + 1
+                residue_names.append(last)
+                residue_types.append(kind)
+                residue_chains.append(chain_no)
+
+            bb = is_side_chain(atom, rtype, nbackbone)
+            ip = -1
+            if atom == " OXT":
+                vdw, ip = 1.40, 1
+            else:
+                entry = radii_table.residues[card[17:20]].get(atom) if resok else None
+                if entry is None:
+                    hit = radii_table.any_residue.get(atom)
+                    log.append((len(residue_names) - 1, f" NON-STANDARD atom.|{atom}| in residue> {last}"))
+                    if hit is not None:
+                        log.append((len(residue_names) - 1,
+                                    f" ASSUMED vdw of {atom} in {last} = {hit[0]:5.2f} (same as {hit[2]})"))
+                        entry = hit[:2]
+                if entry is None:
+                    vdw = guess_radius(atom)
+                    log.append((len(residue_names) - 1, f" GUESSED vdw of {atom} in {last} = {vdw:5.2f}"))
+                else:
+                    vdw, ip = entry
+                if ip < 0:
+                    ip = guess_polarity(atom)
+
+        rows.append(row)
+        chain_serials.append(chain_records[chains[row]])
+        radii.append(vdw)
+        polar.append(ip)
+        side_chain.append(bb)
+        residue_index.append(max(len(residue_names) - 1, 0))
+
+    if callable(coords):
+        text = [coords(row) for row in rows]
+        xyz = np.array([(float(t[0:8]), float(t[8:16]), float(t[16:24])) for t in text], dtype=np.float64)
+    else:
+        xyz = np.asarray(coords, dtype=np.float64)[rows]
+    return AtomTable(
+        [labels[row] for row in rows],
+        xyz.reshape(-1, 3),
+        np.array(radii, dtype=np.float64),
+        np.array(polar, dtype=np.int8),
+        np.array(side_chain, dtype=np.int8),
+        np.array(residue_index, dtype=np.int64),
+        residue_names,
+        residue_types,
+        np.array(residue_chains, dtype=np.int64),
+        chain_names,
+        log,
+        [chains[row] for row in rows],
+        np.array(rows, dtype=np.int64),
+        np.array(chain_serials, dtype=np.int64),
+    )
+
+
+# ----------------------
+# 3. Neighbour grid
+# ----------------------
+class NeighborGrid:
+    """
+    Cell list over atom centres.
+
+    Cells are ``cell`` Å wide, so every pair closer than ``cell`` lies in the
+    same or an adjacent cell.  Pairs are produced for all 27 cell offsets at
+    once with array operations instead of a per-atom Python loop.
+    """
+
+    def __init__(self, xyz, cell):
+        self.xyz = np.asarray(xyz, dtype=np.float64)
+        self.cell = float(cell)
+        n = len(self.xyz)
+        if n == 0:
+            self.dims = np.ones(3, dtype=np.int64)
+            self.cells = np.zeros((0, 3), dtype=np.int64)
+        else:
+            origin = self.xyz.min(axis=0)
+            self.cells = np.floor((self.xyz - origin) / self.cell).astype(np.int64)
+            self.dims = self.cells.max(axis=0) + 1
+        self.keys = self._key(self.cells)
+        self.order = np.argsort(self.keys, kind="stable")
+        self.sorted_keys = self.keys[self.order]
+
+    def _key(self, cells):
+        return (cells[:, 0] * self.dims[1] + cells[:, 1]) * self.dims[2] + cells[:, 2]
+
+    def candidate_pairs(self, atoms=None):
+        """All (i, j), i != j, with j in a cell adjacent to i's cell; i restricted to ``atoms``."""
+        if atoms is None:
+            atoms = np.arange(len(self.xyz))
+        atoms = np.asarray(atoms, dtype=np.int64)
+        firsts, seconds = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    shifted = self.cells[atoms] + (dx, dy, dz)
+                    inside = np.all((shifted >= 0) & (shifted < self.dims), axis=1)
+                    src = atoms[inside]
+                    keys = self._key(shifted[inside])
+                    start = np.searchsorted(self.sorted_keys, keys, side="left")
+                    stop = np.searchsorted(self.sorted_keys, keys, side="right")
+                    counts = stop - start
+                    total = int(counts.sum())
+                    if not total:
+                        continue
+                    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                    firsts.append(np.repeat(src, counts))
+                    seconds.append(self.order[np.repeat(start, counts) + offsets])
+        if not firsts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        i = np.concatenate(firsts)
+        j = np.concatenate(seconds)
+        keep = i != j
+        return i[keep], j[keep]
+
+    def neighbors(self, reach, atoms=None):
+        """
+        Overlapping pairs as CSR arrays ``(indptr, indices)`` over all atoms.
+
+        ``reach`` is a per-atom radius; i and j are neighbours when their
+        centres are closer than ``reach[i] + reach[j]`` (which must not exceed
+        the cell width).  Rows for atoms outside ``atoms`` are empty.
+        """
+        i, j = self.candidate_pairs(atoms)
+        d2 = np.sum((self.xyz[i] - self.xyz[j]) ** 2, axis=1)
+        keep = d2 < (reach[i] + reach[j]) ** 2
+        i, j = i[keep], j[keep]
+        order = np.lexsort((j, i))
+        i, j = i[order], j[order]
+        indptr = np.zeros(len(self.xyz) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(i, minlength=len(self.xyz)), out=indptr[1:])
+        return indptr, j
+
+
+def expanded_radii(radii, probe=DEFAULT_PROBE):
+    return np.asarray(radii, dtype=np.float64) + probe
+
+
+def build_grid(xyz, radii, probe=DEFAULT_PROBE):
+    """Grid with cells as wide as the largest expanded atom diameter (as in solva)."""
+    rad = expanded_radii(radii, probe)
+    cell = 2.0 * rad.max() if len(rad) else 1.0
+    return NeighborGrid(xyz, cell), rad
+
+
+# ----------------------
+# 4. Lee & Richards integration
+# ----------------------
+def _solva_chunk(xyz, rad, atoms, nbr, valid, nzp):
+    """Accessible area of ``atoms`` given padded neighbour indices ``nbr`` (B, K)."""
+    two_pi = 2.0 * math.pi
+    rr = rad[atoms]                                    # (B,)
+    zres = 2.0 * rr / nzp
+    steps = np.arange(1, nzp + 1) - 0.5
+    zgrid = (xyz[atoms, 2] - rr)[:, None] + zres[:, None] * steps  # (B, Z)
+    rsec2r = rr[:, None] ** 2 - (zgrid - xyz[atoms, 2][:, None]) ** 2
+    rsecr = np.sqrt(np.maximum(rsec2r, 0.0))
+
+    dx = xyz[atoms, 0][:, None] - xyz[nbr, 0]          # (B, K)
+    dy = xyz[atoms, 1][:, None] - xyz[nbr, 1]
+    dsq = dx * dx + dy * dy
+    d = np.sqrt(dsq)
+    beta = np.arctan2(dy, dx) + math.pi
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsec2n = rad[nbr][:, None, :] ** 2 - (zgrid[:, :, None] - xyz[nbr, 2][:, None, :]) ** 2  # (B, Z, K)
+        live = valid[:, None, :] & (rsec2n > 0.0)
+        rsecn = np.sqrt(np.where(live, rsec2n, 0.0))
+        d3 = d[:, None, :]
+        live &= d3 < rsecr[:, :, None] + rsecn
+        b = rsecr[:, :, None] - rsecn
+        buried = np.any(live & (d3 <= np.abs(b)) & (b <= 0.0), axis=2)   # (B, Z)
+        cross = live & (d3 > np.abs(b))
+
+        trig = (dsq[:, None, :] + rsec2r[:, :, None] - rsec2n) / (2.0 * d3 * rsecr[:, :, None])
+        trig = np.where(trig >= 1.0, 0.99999, np.where(trig <= -1.0, -0.99999, trig))
+        alpha = np.arccos(np.where(cross, trig, 0.0))
+
+    ti = beta[:, None, :] - alpha
+    tf = beta[:, None, :] + alpha
+    ti = np.where(ti < 0.0, ti + two_pi, ti)
+    tf = np.where(tf > two_pi, tf - two_pi, tf)
+    wraps = tf < ti
+
+    # Arcs crossing zero are split into [ti, 2pi] and [0, tf]
+    starts = np.concatenate([np.where(cross, ti, 0.0), np.zeros_like(ti)], axis=2)
+    ends = np.concatenate([np.where(cross, np.where(wraps, two_pi, tf), 0.0),
+                           np.where(cross & wraps, tf, 0.0)], axis=2)
+    order = np.argsort(starts, axis=2, kind="stable")
+    starts = np.take_along_axis(starts, order, axis=2)
+    ends = np.take_along_axis(ends, order, axis=2)
+    reached = np.maximum.accumulate(ends, axis=2)
+    reached = np.concatenate([np.zeros(reached.shape[:2] + (1,)), reached[:, :, :-1]], axis=2)
+    covered = np.clip(ends - np.maximum(starts, reached), 0.0, None).sum(axis=2)
+
+    arcsum = np.where(buried, 0.0, np.maximum(two_pi - covered, 0.0))
+    return arcsum.sum(axis=1) * zres * rr
+
+
+def atomic_sasa(xyz, radii, probe=DEFAULT_PROBE, zslice=DEFAULT_ZSLICE,
+                neighbors=None, atoms=None, chunk=256):
+    """
+    Accessible surface area per atom (Lee & Richards, as NACCESS solva).
+
+    ``neighbors`` is a CSR ``(indptr, indices)`` pair from NeighborGrid.neighbors;
+    it is built here when omitted.  When ``atoms`` is given only those atoms
+    are computed and the remaining entries of the result are NaN.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64)
+    rad = expanded_radii(radii, probe)
+    n = len(xyz)
+    if neighbors is None:
+        grid, _ = build_grid(xyz, radii, probe)
+        neighbors = grid.neighbors(rad, atoms)
+    indptr, indices = neighbors
+    nzp = int(1.0 / zslice + 0.5)
+
+    if atoms is None:
+        atoms = np.arange(n)
+        accs = np.empty(n)
+    else:
+        atoms = np.asarray(atoms, dtype=np.int64)
+        accs = np.full(n, np.nan)
+
+    degree = indptr[atoms + 1] - indptr[atoms]
+    lonely = atoms[degree == 0]
+    accs[lonely] = 4.0 * math.pi * rad[lonely] ** 2
+
+    # Group atoms of similar neighbour count so the padding stays small
+    busy = atoms[degree > 0]
+    busy = busy[np.argsort(indptr[busy + 1] - indptr[busy], kind="stable")]
+    for first in range(0, len(busy), chunk):
+        block = busy[first:first + chunk]
+        counts = indptr[block + 1] - indptr[block]
+        width = int(counts.max())
+        slots = np.arange(width)
+        valid = slots[None, :] < counts[:, None]
+        nbr = indices[np.minimum(indptr[block][:, None] + slots, len(indices) - 1)]
+        nbr = np.where(valid, nbr, block[:, None])
+        accs[block] = _solva_chunk(xyz, rad, block, nbr, valid, nzp)
+    return accs
+
+
+def restrict_neighbors(neighbors, keep_pair):
+    """CSR neighbour lists keeping only the pairs flagged in ``keep_pair`` (one flag per stored pair)."""
+    indptr, indices = neighbors
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    counts = np.bincount(rows[keep_pair], minlength=len(indptr) - 1)
+    restricted = np.zeros_like(indptr)
+    np.cumsum(counts, out=restricted[1:])
+    return restricted, indices[keep_pair]
+
+
+def chain_delta_sasa(xyz, radii, chain_ids, probe=DEFAULT_PROBE, zslice=DEFAULT_ZSLICE, partners=None,
+                     neighbors=None, chains=True):
+    """
+    Complex and isolated-chain accessibilities from a single neighbour search.
+
+    An atom's isolated-chain area differs from its in-complex area only if it
+    overlaps (centre distance < r_i + r_j + 2*probe) an atom of another chain.
+    Those atoms are recomputed once against their own chain's neighbours; all
+    other isolated-chain values are copied from the complex.
+
+    ``partners`` ({chain: partner chains}, see chain_contacts) restricts the
+    complex of every chain to the chain and its partners: the isolated-chain
+    areas are computed for all atoms, and only atoms overlapping a partner
+    chain are recomputed with the partner's neighbours added.
+
+    ``neighbors`` (CSR, as from NeighborGrid.neighbors) skips the
+    neighbour search, e.g. for trajectory frames sharing a Verlet list.
+    With chains=False only the complex pass runs and chain_accs is None.
+
+    The neighbour search and the two area passes are timed as metrics spans
+    ("neighbors", "complex_sasa", "chain_sasa", labelled with their atoms).
+
+    Returns ``(complex_accs, chain_accs, interface_atoms)``.
+    """
+    xyz = np.asarray(xyz, dtype=np.float64)
+    chain_ids = np.asarray(chain_ids)
+    if neighbors is None:
+        with span("neighbors", atoms=len(xyz)):
+            grid, rad = build_grid(xyz, radii, probe)
+            neighbors = grid.neighbors(rad)
+    indptr, indices = neighbors
+    rows = np.repeat(np.arange(len(xyz)), np.diff(indptr))
+    same_chain = chain_ids[rows] == chain_ids[indices]
+    if partners is not None:
+        return partner_delta_sasa(xyz, radii, chain_ids, neighbors, rows, same_chain, partners, probe, zslice,
+                                  chains)
+
+    with span("complex_sasa", atoms=len(xyz)):
+        complex_accs = atomic_sasa(xyz, radii, probe, zslice, neighbors=neighbors)
+    interface_atoms = np.unique(rows[~same_chain])
+    if not chains:
+        return complex_accs, None, interface_atoms
+
+    chain_accs = complex_accs.copy()
+    if len(interface_atoms):
+        with span("chain_sasa", atoms=len(interface_atoms)):
+            isolated = atomic_sasa(xyz, radii, probe, zslice,
+                                   neighbors=restrict_neighbors(neighbors, same_chain),
+                                   atoms=interface_atoms)
+        chain_accs[interface_atoms] = isolated[interface_atoms]
+    return complex_accs, chain_accs, interface_atoms
+
+
+def partner_delta_sasa(xyz, radii, chain_ids, neighbors, rows, same_chain, partners, probe, zslice, chains=True):
+    """chain_delta_sasa() with each chain's complex restricted to the chain and its ``partners``."""
+    names, codes = np.unique(chain_ids.astype(str), return_inverse=True)
+    lookup = {name: code for code, name in enumerate(names.tolist())}
+    allowed = np.zeros((len(names), len(names)), dtype=bool)
+    for chain, others in partners.items():
+        for other in others:
+            if chain in lookup and other in lookup:
+                allowed[lookup[chain], lookup[other]] = True
+    partner_pair = allowed[codes[rows], codes[neighbors[1]]]
+    interface_atoms = np.unique(rows[partner_pair])
+    if not chains:
+        # Complex only: one pass over every atom with its own chain and partner neighbours
+        with span("complex_sasa", atoms=len(xyz)):
+            complex_accs = atomic_sasa(xyz, radii, probe, zslice,
+                                       neighbors=restrict_neighbors(neighbors, same_chain | partner_pair))
+        return complex_accs, None, interface_atoms
+
+    with span("chain_sasa", atoms=len(xyz)):
+        chain_accs = atomic_sasa(xyz, radii, probe, zslice, neighbors=restrict_neighbors(neighbors, same_chain))
+    complex_accs = chain_accs.copy()
+    if len(interface_atoms):
+        with span("complex_sasa", atoms=len(interface_atoms)):
+            buried = atomic_sasa(xyz, radii, probe, zslice,
+                                 neighbors=restrict_neighbors(neighbors, same_chain | partner_pair),
+                                 atoms=interface_atoms)
+        complex_accs[interface_atoms] = buried[interface_atoms]
+    return complex_accs, chain_accs, interface_atoms
+
+
+# ----------------------
+# 5. Residue sums
+# ----------------------
+def residue_sums(atoms, accs, standard=None):
+    """
+    Per-residue absolute and relative sums, shape (n_residues, 7) each,
+    columns as in SUM_COLUMNS.
+    """
+    n_res = len(atoms.residue_names)
+    side = atoms.side_chain == 1
+    nonpolar = atoms.polar == 0
+    polar_side = atoms.polar == 1
+    masks = (
+        np.ones(len(accs), dtype=bool),
+        side & nonpolar,
+        side & polar_side,
+        side,
+        ~side,
+        nonpolar,
+        ~nonpolar,
+    )
+    absolute = np.zeros((n_res, 7))
+    for col, mask in enumerate(masks):
+        absolute[:, col] = np.bincount(atoms.residue_index[mask], weights=accs[mask], minlength=n_res)
+
+    relative = np.full((n_res, 7), -99.9)
+    if standard:
+        for r, name in enumerate(atoms.residue_names):
+            ref = standard.get(name[:3])
+            if ref is not None:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    relative[r] = np.where(ref > 0.0, 100.0 * absolute[r] / ref, 0.0)
+    return absolute, relative
+
+
+class SasaResult:
+    """Per-atom and per-residue accessibilities of one structure."""
+
+    def __init__(self, atoms, accs, standard=None):
+        self.atoms = atoms
+        self.accs = accs
+        self.residue_abs, self.residue_rel = residue_sums(atoms, accs, standard)
+
+
+def compute_sasa(pdb_path, probe=DEFAULT_PROBE, zslice=DEFAULT_ZSLICE,
+                 radii_path=DEFAULT_RADII, standard_path=DEFAULT_STANDARD,
+                 hetatoms=False, waters=False, hydrogens=False):
+    """Read a PDB file and return its SasaResult."""
+    table = RadiiTable(radii_path)
+    atoms = read_atoms(pdb_path, table, hetatoms, waters, hydrogens)
+    accs = atomic_sasa(atoms.xyz, atoms.radii, probe, zslice)
+    return SasaResult(atoms, accs, load_standard_data(standard_path))
+
+
+# ----------------------
+# 6. NACCESS-format output
+# ----------------------
+def extended_chain(chain):
+    """Trailing field of a record whose chain ID does not fit column 22 (see structure.record_chain)."""
+    return f" {chain}" if len(chain) > 1 else ""
+
+
+def write_asa(path, atoms, accs):
+    with open(path, "w") as f:
+        for label, (x, y, z), acc, r, chain in zip(atoms.labels, atoms.xyz, accs, atoms.radii, atoms.chain_ids):
+            f.write(f"{label:<30s}{x:8.3f}{y:8.3f}{z:8.3f}{acc:8.3f} {r:5.2f}{extended_chain(chain)}\n")
+
+
+def write_rsa(path, result, standard_path=DEFAULT_STANDARD):
+    atoms = result.atoms
+    cols = (0, 3, 4, 5, 6)
+    with open(path, "w") as f:
+        if standard_path and os.path.exists(standard_path):
+            f.write(f'REM  Relative accessibilites read from external file "{standard_path}"\n')
+        f.write("REM  File of summed (Sum) and % (per.) accessibilities for \n")
+        f.write("REM RES _ NUM      All-atoms   Total-Side   Main-Chain    Non-polar    All polar\n")
+        f.write("REM                ABS   REL    ABS   REL    ABS   REL    ABS   REL    ABS   REL\n")
+        for r, name in enumerate(atoms.residue_names):
+            values = "".join(f"{result.residue_abs[r, c]:7.2f}{result.residue_rel[r, c]:6.1f}" for c in cols)
+            f.write(f"{RECORD_LABELS[atoms.residue_types[r]]} {name} {values}{extended_chain(atoms.residue_chain(r))}\n")
+        f.write("END  Absolute sums over single chains surface \n")
+        for number, chain in enumerate(atoms.chain_names, start=1):
+            sums = result.residue_abs[atoms.residue_chains == number].sum(axis=0)
+            values = "     ".join(f"{sums[c]:8.1f}" for c in cols)
+            f.write(f"CHAIN {number:2d} {chain if chain != ' ' else '_'}   {values}\n")
+        totals = result.residue_abs.sum(axis=0)
+        f.write("END  Absolute sums over all chains \n")
+        f.write("TOTAL        " + "     ".join(f"{totals[c]:8.1f}" for c in cols) + "\n")
+
+
+def write_log(path, pdb_path, atoms, probe, zslice, radii_table):
+    with open(path, "w") as f:
+        f.write(" ACCALL - Accessibility calculations (sasa.py)\n")
+        f.write(f" PDB FILE INPUT {pdb_path}\n")
+        f.write(f" PROBE SIZE     {probe:6.2f}\n")
+        f.write(f" Z-SLICE WIDTH  {zslice:6.3f}\n")
+        f.write(f" VDW RADII FILE {radii_table.path}\n")
+        f.write(f" READVDW {len(radii_table):3d} residues input\n")
+        for _, line in atoms.log:
+            f.write(line + "\n")
+        f.write(" ADDED VDW RADII\n")
+        f.write(f" CHAINS   {len(atoms.chain_names):5d}\n")
+        f.write(f" RESIDUES {len(atoms.residue_names):5d}\n")
+        f.write(f" ATOMS    {len(atoms):5d}\n")
+        f.write(" CALCULATED ATOMIC ACCESSIBILITES\n")
+
+
+def load_atoms(source, radii_table):
+    """(pdb path, AtomTable) for a PDB/mmCIF path or a parsed structure.Structure."""
+    if isinstance(source, Structure):
+        return source.source, atoms_from_structure(source, radii_table)
+    if not os.path.isfile(source):
+        raise FileNotFoundError(f"Input PDB file not found: {source}")
+    if not is_pdb(source):
+        return source, atoms_from_structure(load_structure(source), radii_table)
+    return source, read_atoms(source, radii_table)
+
+
+def run_sasa(pdb_path, out_dir, probe=DEFAULT_PROBE, zslice=DEFAULT_ZSLICE,
+             radii_path=DEFAULT_RADII, standard_path=DEFAULT_STANDARD):
+    """
+    Drop-in for ``naccess <pdb>``: writes <base>.asa/.rsa/.log into out_dir.
+    ``pdb_path`` may also be a structure.Structure.
+    """
+    table = RadiiTable(radii_path)
+    pdb_path, atoms = load_atoms(pdb_path, table)
+    accs = atomic_sasa(atoms.xyz, atoms.radii, probe, zslice)
+    result = SasaResult(atoms, accs, load_standard_data(standard_path))
+
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, file_id(pdb_path))
+    write_asa(base + ".asa", atoms, accs)
+    write_rsa(base + ".rsa", result, standard_path)
+    write_log(base + ".log", pdb_path, atoms, probe, zslice, table)
+    return result
+
+
+def run_delta_sasa(pdb_path, out_dir, probe=DEFAULT_PROBE, zslice=DEFAULT_ZSLICE,
+                   radii_path=DEFAULT_RADII, standard_path=DEFAULT_STANDARD, progress=None, partners=None,
+                   write_chains=True):
+    """
+    Complex and per-chain outputs in one pass: writes <base>.asa/.rsa/.log and
+    <base>_<chain>.asa/.rsa/.log, matching what running NACCESS on the complex
+    and on every split chain would produce.  ``pdb_path`` may also be a
+    structure.Structure.  ``progress(chain, done, total)`` is called as each
+    output set is written (chain None for the complex).
+
+    With ``partners`` (see chain_delta_sasa) the complex files hold every
+    atom's accessibility in the presence of its own chain and its partner
+    chains only.  With write_chains=False only the complex files are written
+    (and returned); the isolated-chain pass is skipped.
+    """
+    table = RadiiTable(radii_path)
+    standard = load_standard_data(standard_path)
+    pdb_path, atoms = load_atoms(pdb_path, table)
+    chains = atoms.chains
+    complex_accs, chain_accs, interface_atoms = chain_delta_sasa(atoms.xyz, atoms.radii, chains, probe, zslice,
+                                                                 partners, chains=write_chains)
+
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, file_id(pdb_path))
+    results = {None: SasaResult(atoms, complex_accs, standard)}
+    write_asa(base + ".asa", atoms, complex_accs)
+    write_rsa(base + ".rsa", results[None], standard_path)
+    write_log(base + ".log", pdb_path, atoms, probe, zslice, table)
+    if not write_chains:
+        if progress:
+            progress(None, 1, 1)
+        print(f"ASA: complex of {len(atoms)} atoms, {len(interface_atoms)} at chain interfaces")
+        return results
+    if progress:
+        progress(None, 1, len(atoms.chain_names) + 1)
+
+    for done, chain in enumerate(atoms.chain_names, start=2):
+        mask = chains == chain
+        sub = atoms.subset(mask).renumbered()
+        results[chain] = SasaResult(sub, chain_accs[mask], standard)
+        write_asa(f"{base}_{chain}.asa", sub, chain_accs[mask])
+        write_rsa(f"{base}_{chain}.rsa", results[chain], standard_path)
+        write_log(f"{base}_{chain}.log", pdb_path, sub, probe, zslice, table)
+        if progress:
+            progress(chain, done, len(atoms.chain_names) + 1)
+    print(f"ΔASA: recomputed {len(interface_atoms)} of {len(atoms)} atoms for {len(atoms.chain_names)} chains")
+    return results
+
+
+# ----------------------
+# 7. Validation against NACCESS output
+# ----------------------
+def read_asa_values(path):
+    """(labels, accessibilities) from an existing ``.asa`` file."""
+    labels, values = [], []
+    with open(path) as f:
+        for line in f:
+            if line.startswith(("ATOM", "HETATM")):
+                labels.append(line[0:30])
+                values.append(float(line[54:62]))
+    return labels, np.array(values)
+
+
+def compare_with_asa(result, reference_path, tolerance=0.5):
+    """Largest and mean absolute per-atom difference to a reference ``.asa`` file."""
+    labels, ref = read_asa_values(reference_path)
+    if len(labels) != len(result.accs):
+        raise ValueError(f"{reference_path} has {len(labels)} atoms, computed {len(result.accs)}")
+    diff = np.abs(result.accs - ref)
+    return {
+        "atoms": len(ref),
+        "max_abs_diff": float(diff.max()) if len(diff) else 0.0,
+        "mean_abs_diff": float(diff.mean()) if len(diff) else 0.0,
+        "over_tolerance": int((diff > tolerance).sum()),
+        "total_diff": float(result.accs.sum() - ref.sum()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lee & Richards accessibility (NACCESS-compatible) for a PDB file")
+    parser.add_argument("pdb", help="Path to input PDB (e.g. input/1A3Q.pdb)")
+    parser.add_argument("--out-dir", default="rsa", help="Directory to write .asa, .rsa, .log output")
+    parser.add_argument("-p", "--probe", type=float, default=DEFAULT_PROBE, help="Probe radius (Å)")
+    parser.add_argument("-z", "--zslice", type=float, default=DEFAULT_ZSLICE, help="Z-slice width")
+    parser.add_argument("-r", "--radii", default=DEFAULT_RADII, help="vdw.radii file")
+    parser.add_argument("-s", "--standard", default=DEFAULT_STANDARD, help="standard.data file")
+    parser.add_argument("--chains", action="store_true",
+                        help="Also write <base>_<chain> outputs for every chain (single-pass ΔASA mode)")
+    parser.add_argument("--validate", metavar="ASA",
+                        help="Compare against an existing NACCESS .asa file instead of writing output")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Per-atom tolerance (Å²) for --validate")
+    args = parser.parse_args()
+
+    if args.validate:
+        result = compute_sasa(args.pdb, args.probe, args.zslice, args.radii, args.standard)
+        stats = compare_with_asa(result, args.validate, args.tolerance)
+        print(f"{args.pdb} vs {args.validate}: " + ", ".join(f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}"
+                                                          for k, v in stats.items()))
+        raise SystemExit(1 if stats["over_tolerance"] else 0)
+
+    if args.chains:
+        results = run_delta_sasa(args.pdb, args.out_dir, args.probe, args.zslice, args.radii, args.standard)
+        print(f"✅ Complex + {len(results) - 1} chains → {args.out_dir}")
+        raise SystemExit(0)
+
+    result = run_sasa(args.pdb, args.out_dir, args.probe, args.zslice, args.radii, args.standard)
+    print(f"✅ {len(result.accs)} atoms, total ASA {result.accs.sum():.1f} Å² → {args.out_dir}")
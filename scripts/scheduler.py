@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Admission control and priority scheduling of analysis jobs.
+
+The API admits a job into a bounded queue when it is uploaded.  A full
+queue, or a client that already has too many jobs queued, is answered with
+QueueFull (HTTP 429 with a Retry-After estimate) instead of piling up work.
+Admitted jobs wait in JobScheduler.slot() for one of ``slots`` job slots.
+One client holds at most ``client_slots`` of them, so a burst from one
+client leaves slots for everybody else.
+
+Waiting jobs are served smallest first, by the atom count estimated at
+upload.  To keep huge structures from starving behind a stream of small
+ones, a job's effective size halves every ``aging`` seconds it waits.
+
+The scheduler lives in the event loop of one API process; it is not shared
+between uvicorn workers.
+"""
+import argparse
+import asyncio
+import contextlib
+import gzip
+import itertools
+import math
+import re
+import time
+from collections import Counter
+
+import mmcif
+from metrics import span
+
+# Lines of PDB ATOM/HETATM records and of mmCIF _atom_site loop rows start alike
+ATOM_LINE = re.compile(rb"^(?:ATOM|HETATM)", re.M)
+# Bytes of an ATOM record line, for inputs whose atoms cannot be counted (tarballs)
+PDB_BYTES_PER_ATOM = 81
+# Run time assumed for Retry-After before any job has finished
+DEFAULT_RUN_SECONDS = 30.0
+
+
+class QueueFull(Exception):
+    """A job was refused; ``retry_after`` is the suggested wait in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AtomCounter:
+    """Counts ATOM/HETATM lines of PDB or mmCIF data fed to it in chunks of any size."""
+
+    def __init__(self):
+        self.atoms = 0
+        self._tail = b""
+
+    def update(self, data):
+        data = self._tail + data
+        cut = data.rfind(b"\n") + 1
+        self.atoms += len(ATOM_LINE.findall(data, 0, cut))
+        self._tail = data[cut:]
+
+    def finish(self):
+        self.update(b"\n")
+        return self.atoms
+
+
+def estimate_atoms(path):
+    """Atom count of a .pdb/.cif/.bcif file (optionally gzipped), without parsing the records."""
+    if mmcif.is_bcif(path):
+        return mmcif.atom_site_rows(mmcif.read_bytes(path))
+    counter = AtomCounter()
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            counter.update(block)
+    return counter.finish()
+
+
+class Entry:
+    """One admitted job."""
+
+    def __init__(self, job_id, client, atoms, seq):
+        self.job_id = job_id
+        self.client = client
+        self.atoms = max(int(atoms), 1)
+        self.seq = seq
+        self.admitted = time.monotonic()
+        self.started = None
+        # Set by slot(): the job is waiting for a slot, resolved when it gets one
+        self.ready = None
+
+
+class JobScheduler:
+    """Bounded, per-client-limited priority queue in front of the job slots."""
+
+    def __init__(self, slots, max_queued=100, client_slots=None, client_queued=None, aging=120.0):
+        self.slots = slots
+        self.max_queued = max_queued
+        self.client_slots = client_slots or slots
+        self.client_queued = client_queued or max_queued
+        self.aging = aging
+        self.queued = {}
+        self.running = {}
+        self.rejected = Counter()
+        self.run_seconds = None
+        self._seq = itertools.count()
+
+    def check(self, client):
+        """Raise QueueFull if a new job of ``client`` would not be admitted."""
+        if len(self.queued) >= self.max_queued:
+            self.rejected["queue_full"] += 1
+            raise QueueFull(f"The job queue is full ({self.max_queued} jobs)", self.retry_after())
+        waiting = sum(entry.client == client for entry in self.queued.values())
+        if waiting >= self.client_queued:
+            self.rejected["client_quota"] += 1
+            raise QueueFull(f"Client {client} already has {waiting} jobs queued", self.retry_after(client))
+
+    def admit(self, job_id, client, atoms):
+        """Queue a new job of ``client`` with ``atoms`` estimated atoms; raises QueueFull."""
+        self.check(client)
+        self.queued[job_id] = Entry(job_id, client, atoms, next(self._seq))
+
+    def discard(self, job_id):
+        """Forget a queued job that needs no slot (served from the cache, or failed before computing)."""
+        entry = self.queued.pop(job_id, None)
+        if entry is not None and entry.ready is not None and not entry.ready.done():
+            entry.ready.cancel()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, job_id):
+        """Wait for a job slot (the wait is timed as a "queue" span) and hold it for the block."""
+        entry = self.queued[job_id]
+        entry.ready = asyncio.get_running_loop().create_future()
+        self._dispatch()
+        try:
+            with span("queue", atoms=entry.atoms):
+                await entry.ready
+        except asyncio.CancelledError:
+            self.queued.pop(job_id, None)
+            if self.running.pop(job_id, None) is not None:
+                self._dispatch()
+            raise
+        try:
+            yield
+        finally:
+            self.release(job_id)
+
+    def release(self, job_id):
+        entry = self.running.pop(job_id, None)
+        if entry is None:
+            return
+        seconds = time.monotonic() - entry.started
+        self.run_seconds = seconds if self.run_seconds is None else 0.8 * self.run_seconds + 0.2 * seconds
+        self._dispatch()
+
+    def score(self, entry, now):
+        """Effective size of a queued job: its atoms, halved for every ``aging`` seconds of waiting."""
+        return entry.atoms * 0.5 ** ((now - entry.admitted) / self.aging)
+
+    def order(self):
+        """Queued jobs in the order they would be served, ignoring client quotas."""
+        now = time.monotonic()
+        return sorted(self.queued.values(), key=lambda entry: (self.score(entry, now), entry.seq))
+
+    def _dispatch(self):
+        """Start the best waiting jobs while slots are free and their clients are under quota."""
+        while len(self.running) < self.slots:
+            busy = Counter(entry.client for entry in self.running.values())
+            for entry in self.order():
+                if entry.ready is not None and not entry.ready.done() and busy[entry.client] < self.client_slots:
+                    break
+            else:
+                return
+            del self.queued[entry.job_id]
+            entry.started = time.monotonic()
+            self.running[entry.job_id] = entry
+            entry.ready.set_result(None)
+
+    def position(self, job_id):
+        """1-based place of a queued job in the serving order, or None if it is not queued here."""
+        for place, entry in enumerate(self.order(), start=1):
+            if entry.job_id == job_id:
+                return place
+        return None
+
+    def retry_after(self, client=None):
+        """Seconds until a slot is likely to free up for ``client``'s next job."""
+        ahead = len(self.queued) if client is None else sum(e.client == client for e in self.queued.values())
+        slots = self.slots if client is None else min(self.slots, self.client_slots)
+        per_job = self.run_seconds if self.run_seconds is not None else DEFAULT_RUN_SECONDS
+        return max(1, math.ceil(per_job * (ahead + 1) / slots))
+
+    def stats(self):
+        return {
+            "queued": len(self.queued),
+            "running": len(self.running),
+            "slots": self.slots,
+            "max_queued": self.max_queued,
+            "client_slots": self.client_slots,
+            "client_queued": self.client_queued,
+            "rejected": dict(self.rejected),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate the atom counts the scheduler orders jobs by")
+    parser.add_argument("paths", nargs="+", help="Structure files (.pdb, .cif, .bcif, optionally .gz)")
+    args = parser.parse_args()
+
+    sizes = {path: estimate_atoms(path) for path in args.paths}
+    for place, (path, atoms) in enumerate(sorted(sizes.items(), key=lambda item: item[1]), start=1):
+        print(f"{place:3d}  {atoms:9d} atoms  {path}")
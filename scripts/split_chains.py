@@ -1,25 +1,88 @@
 #!/usr/bin/env python3
+"""
+Split a PDB into one file per chain in a single pass over the input.
+
+Every ATOM/HETATM record is routed to the buffer of its chain (column 22) as
+it is read; nothing else is parsed.  The chain files are laid out the way
+Bio.PDB's PDBIO wrote them before: atoms renumbered from 1, one TER after the
+chain's last residue and a closing END record.  Only the first model of a
+multi-model entry is split (mixing NMR models or MD snapshots in one chain
+file would merge their atoms); with all_models every model is kept, with
+MODEL/ENDMDL around each one.  split_structure() writes the same files from an
+already parsed structure.Structure; mmCIF/BinaryCIF inputs go through it.
+Chain IDs longer than column 22 are taken from (and kept in) the extended
+field after column 80, and name the files in full.
+"""
 import argparse
 import os
-from Bio.PDB import PDBParser, PDBIO, Select
 
-class ChainSelect(Select):
-    def __init__(self, chain_id):
-        self.chain_id = chain_id
-    def accept_chain(self, chain):
-        return chain.id == self.chain_id
+from structure import (ATOM_RECORDS, LINE_WIDTH, file_id, first_model_lines, hybrid36, is_pdb, iter_lines,
+                       load_structure, record_chain)
+
+
+def route_records(lines):
+    """
+    Route ATOM/HETATM lines per chain.  Returns (models, buffers): the MODEL
+    serial numbers in file order (None for a single-model file) and
+    {chain: {model: [lines]}}.
+    """
+    models = [None]
+    buffers = {}
+    for line in lines:
+        record = line[:6]
+        if record in ATOM_RECORDS:
+            line = line.rstrip(b"\r\n")
+            chain = record_chain(line).decode()
+            buffers.setdefault(chain, {}).setdefault(models[-1], []).append(line)
+        elif record == b"MODEL ":
+            serial = int(line[10:14]) if line[10:14].strip() else len(models)
+            if models == [None] and not buffers:
+                models = [serial]
+            else:
+                models.append(serial)
+    return models, buffers
+
 
+def chain_block(lines, out):
+    """Renumbered records of one chain in one model followed by its TER; appends bytes to out."""
+    serial = 1
+    for line in lines:
+        out.append(line[:6] + hybrid36(serial, 5).encode() + line[11:LINE_WIDTH].ljust(LINE_WIDTH - 11)
+                   + line[LINE_WIDTH:] + b"\n")
+        serial += 1
+    last = lines[-1]
+    out.append(b"TER   %5s      %3s %c%4s%c" % (hybrid36(serial, 5).encode(), last[17:20].strip(), last[21],
+                                                last[22:26], last[26]) + b" " * 54 + b"\n")
+
+
+def write_chain_files(base, out_dir, models, buffers):
+    """Write <base>_<chain>.pdb for every chain of buffers ({chain: {model: [lines]}})."""
+    os.makedirs(out_dir, exist_ok=True)
+    multi_model = len(models) > 1
+    for ch, chain_models in buffers.items():
+        out = []
+        for model in models:
+            if multi_model:
+                out.append(b"MODEL      %d\n" % (model or 1))
+            lines = chain_models.get(model)
+            if lines:
+                chain_block(lines, out)
+                if multi_model:
+                    out.append(b"ENDMDL\n")
+        out.append(b"END   \n")
+        out_file = os.path.join(out_dir, f"{base}_{ch}.pdb")
+        with open(out_file, "wb") as f:
+            f.writelines(out)
 
-def detect_and_split(pdb_path, out_dir):
-    parser    = PDBParser(QUIET=True)
-    structure = parser.get_structure("complex", pdb_path)
+
+def detect_and_split(pdb_path, out_dir, use_mmap=False, all_models=False):
+    if not is_pdb(pdb_path):
+        return split_structure(load_structure(pdb_path, all_models=all_models), out_dir, file_id(pdb_path))
+    lines = iter_lines(pdb_path, use_mmap)
+    models, buffers = route_records(lines if all_models else first_model_lines(lines))
 
     # 1) Collect all unique chain IDs
-    chains = sorted({
-        chain.id
-        for model in structure
-        for chain in model
-    })
+    chains = sorted(buffers)
     if not chains:
         raise RuntimeError("No chains found in " + pdb_path)
 
@@ -27,25 +90,33 @@ def detect_and_split(pdb_path, out_dir):
     base = os.path.splitext(os.path.basename(pdb_path))[0]
 
     # 3) Write one PDB per chain: <base>_<chain>.pdb
-    os.makedirs(out_dir, exist_ok=True)
-    io = PDBIO()
-    io.set_structure(structure)
-    for ch in chains:
-        sel = ChainSelect(ch)
-        out_file = os.path.join(out_dir, f"{base}_{ch}.pdb")
-        io.save(out_file, sel)
-
+    write_chain_files(base, out_dir, models, buffers)
     return chains
 
 
+def split_structure(structure, out_dir, base):
+    """detect_and_split() for an already parsed structure.Structure."""
+    if not len(structure):
+        raise RuntimeError(f"No chains found in {structure.source}")
+    lines = structure.pdb_lines()
+    models = structure.models if len(structure.models) > 1 else [None]
+    buffers = {}
+    for i, (chain, model) in enumerate(zip(structure.chain_ids.tolist(), structure.model_index.tolist())):
+        buffers.setdefault(chain, {}).setdefault(models[model], []).append(lines[i])
+    write_chain_files(base, out_dir, models, buffers)
+    return sorted(buffers)
+
+
 if __name__ == "__main__":
     p = argparse.ArgumentParser(
         description="Split a PDB into one file per chain, named <base>_<chain>.pdb"
     )
-    p.add_argument("pdb",     help="Path to input PDB (e.g. input/8ucu.pdb)")
+    p.add_argument("pdb",     help="Path to input PDB or mmCIF/BinaryCIF (e.g. input/8ucu.pdb)")
     p.add_argument("out_dir", help="Directory where split chains will be written")
+    p.add_argument("--mmap", action="store_true", help="Read the input through a memory map")
+    p.add_argument("--all-models", action="store_true",
+                   help="Write every model of a multi-model entry (MODEL/ENDMDL blocks) instead of the first")
     args = p.parse_args()
 
-    chains = detect_and_split(args.pdb, args.out_dir)
+    chains = detect_and_split(args.pdb, args.out_dir, args.mmap, args.all_models)
     print("FOUND_CHAINS=" + ",".join(chains))
-
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Columnar in-memory structure shared by the pipeline stages.
+
+A PDB file is parsed once into NumPy columns: coordinates, interned atom
+name / residue name / element / chain codes, residue and chain indices, the
+NACCESS radius and polarity of every atom (radii.py), plus the raw
+30-character record labels that NACCESS-format output is keyed on.
+Splitting, the native SASA engine, .int generation and the summary all take
+this object instead of re-reading text.
+
+mmCIF and BinaryCIF files (see mmcif.py) are read into the same columns,
+with PDB-style record labels built from them.  Chain IDs may be longer than
+the one character of column 22; text records then keep the first character
+there and carry the whole ID in an extended field after the record (columns
+81+ of PDB lines; see record_chain()).  Serial and residue numbers that
+overflow their columns are written in hybrid-36.
+
+Multi-model files (NMR ensembles, MD snapshots) are parsed in full, with a
+model index per atom, but the pipeline analyses the first model only
+(load_structure(), first_model_lines()); trajectory.py treats every model
+as a frame.
+
+Structures can be saved to a single binary file (a JSON header followed by
+64-byte aligned arrays) and loaded back through a memory map, so worker
+processes share the parsed arrays without copying them.
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+
+import numpy as np
+
+import mmcif
+import radii
+
+MAGIC = b"PDISTRC1"
+ALIGN = 64
+LINE_WIDTH = 80
+ATOM_RECORDS = (b"ATOM  ", b"HETATM")
+ENDMDL_RECORDS = (b"ENDMDL", "ENDMDL")
+
+# Per-atom and per-residue columns, in file order
+ATOM_ARRAYS = ("labels", "xyz", "serial", "name_code", "element_code", "residue_index", "chain_index",
+               "model_index", "occupancy", "bfactor", "segid", "charge", "radius", "polarity")
+RESIDUE_ARRAYS = ("residue_name_code", "residue_seq", "residue_icode", "residue_chain")
+TABLES = ("atom_names", "residue_names", "elements", "chains", "models")
+
+# Chain IDs the pipeline's file names accept (<pdb>_<chain>.pdb, <pdb><chain>.int): up to 4
+# characters, as auth_asym_id in the PDB archive
+CHAIN_ID_PATTERN = r"[A-Za-z0-9]{1,4}"
+INPUT_SUFFIXES = (".pdb",) + mmcif.MMCIF_SUFFIXES + mmcif.BCIF_SUFFIXES
+HYBRID36_DIGITS = ("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ", "0123456789abcdefghijklmnopqrstuvwxyz")
+
+
+def iter_lines(pdb_path, use_mmap=False):
+    """Lines of pdb_path as bytes, optionally read through a memory map."""
+    with open(pdb_path, "rb") as f:
+        if use_mmap and os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield from iter(mm.readline, b"")
+        else:
+            yield from f
+
+
+def first_model_lines(lines):
+    """Lines (bytes or str) up to the first ENDMDL record: every line of a single-model file."""
+    for line in lines:
+        if line[:6] in ENDMDL_RECORDS:
+            return
+        yield line
+
+
+def intern(values):
+    """(table, codes): distinct values in order of first appearance and each value's index in it."""
+    table, first, inverse = np.unique(values, return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return [v.decode() if isinstance(v, bytes) else str(v) for v in table[order]], rank[inverse].astype(np.int32)
+
+
+def float_column(col):
+    """Fixed-width text column → float64, NaN where blank."""
+    stripped = np.char.strip(col)
+    out = np.full(len(col), np.nan)
+    filled = stripped != b""
+    out[filled] = stripped[filled].astype(np.float64)
+    return out
+
+
+def hybrid36(value, width):
+    """Text of ``value`` in ``width`` columns: decimal while it fits, hybrid-36 (A000 = 10000, ...) beyond."""
+    if -10 ** (width - 1) < value < 10 ** width:
+        return f"{value:{width}d}"
+    rest = value - 10 ** width
+    for digits in HYBRID36_DIGITS:
+        if 0 <= rest < 26 * 36 ** (width - 1):
+            rest += 10 * 36 ** (width - 1)
+            text = ""
+            while rest:
+                rest, digit = divmod(rest, 36)
+                text = digits[digit] + text
+            return text
+        rest -= 26 * 36 ** (width - 1)
+    raise ValueError(f"{value} does not fit in {width} hybrid-36 columns")
+
+
+def hybrid36_value(text, default=-1):
+    """Integer of a decimal or hybrid-36 field; blanks and unreadable values become ``default``."""
+    text = text.decode() if isinstance(text, bytes) else text
+    text = text.strip()
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    width = len(text)
+    if not text.isalnum() or not text[0].isalpha():
+        return default
+    value = int(text, 36) - 10 * 36 ** (width - 1) + 10 ** width
+    return value + (26 * 36 ** (width - 1) if text[0].islower() else 0)
+
+
+def hybrid36_column(values, width):
+    """Integer array → S-array of ``width``-column fields (hybrid-36 where decimal overflows)."""
+    text = np.char.mod(f"%{width}d", values).astype(f"S{width}")
+    overflow = np.flatnonzero((values >= 10 ** width) | (values <= -10 ** (width - 1)))
+    for i in overflow.tolist():
+        text[i] = hybrid36(int(values[i]), width).encode()
+    return text
+
+
+def int_column(col, default=-1):
+    """Fixed-width text column → int64; hybrid-36 values are decoded, blanks become ``default``."""
+    try:
+        return col.astype(np.int64)
+    except ValueError:
+        return np.array([hybrid36_value(v, default) for v in col], dtype=np.int64)
+
+
+def record_chain(line, width=LINE_WIDTH):
+    """
+    Chain ID of a fixed-width record (bytes or str): the extended field after
+    its first ``width`` columns if there is one, else column 22.
+    """
+    return line[width:].strip() or line[21:22]
+
+
+def input_path(input_dir, pdb_id):
+    """<input_dir>/<pdb_id>.pdb, or the mmCIF/BinaryCIF file of pdb_id if input_dir holds that instead."""
+    for suffix in INPUT_SUFFIXES:
+        path = os.path.join(input_dir, pdb_id + suffix)
+        if os.path.exists(path):
+            return path
+    return os.path.join(input_dir, f"{pdb_id}.pdb")
+
+
+def file_id(path):
+    """Base name of a structure file without its suffix (input/8ucu.cif.gz → 8ucu)."""
+    name = os.path.basename(path)
+    for suffix in INPUT_SUFFIXES:
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[:-len(suffix)]
+    return name.rsplit(".", 1)[0]
+
+
+def is_pdb(path):
+    """False for mmCIF/BinaryCIF files, which NACCESS and the line-based tools cannot read."""
+    return not (mmcif.is_mmcif(path) or mmcif.is_bcif(path))
+
+
+class Structure:
+    """ATOM/HETATM records of one PDB or mmCIF file as parallel arrays."""
+
+    def __init__(self, arrays, tables, source=None):
+        if "radius" not in arrays:
+            # Saved before structures carried radii
+            arrays = dict(arrays)
+            arrays["radius"], arrays["polarity"] = radii.radius_columns(arrays["labels"])
+        for name in ATOM_ARRAYS + RESIDUE_ARRAYS:
+            setattr(self, name, arrays[name])
+        for name in TABLES:
+            setattr(self, name, tables[name])
+        self.source = source
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def n_residues(self):
+        return len(self.residue_name_code)
+
+    @property
+    def chain_ids(self):
+        """Chain ID per atom."""
+        return np.asarray(self.chains)[self.chain_index]
+
+    # ----------------------
+    # 1. Parsing
+    # ----------------------
+    @classmethod
+    def from_records(cls, labels, xyz, columns, model_index, models, source=None):
+        """
+        Structure from per-atom columns: 30-byte record ``labels``, ``xyz``,
+        ``model_index`` and ``columns`` holding serial, chain (whole IDs),
+        resname, resseq, element, occupancy, bfactor, segid and charge.
+        """
+        n = len(labels)
+        raw = labels.view("S1").reshape(n, 30)
+        chain = columns["chain"]
+        # A residue is a run of records with the same columns 18-27 (name, chain, number, icode) and chain ID
+        key = np.ascontiguousarray(raw[:, 17:27]).view("S10").ravel()
+        new_residue = np.ones(n, dtype=bool)
+        new_residue[1:] = (key[1:] != key[:-1]) | (chain[1:] != chain[:-1]) | (model_index[1:] != model_index[:-1])
+        residue_index = (np.cumsum(new_residue) - 1).astype(np.int32)
+        starts = np.flatnonzero(new_residue)
+
+        atom_names, name_code = intern(np.ascontiguousarray(raw[:, 12:16]).view("S4").ravel())
+        elements, element_code = intern(np.char.strip(columns["element"]))
+        chains, chain_index = intern(chain)
+        residue_names, residue_name_code = intern(columns["resname"][starts])
+        radius, polarity = radii.radius_columns(labels)
+
+        arrays = {
+            "labels": labels,
+            "xyz": np.asarray(xyz, dtype=np.float64).reshape(-1, 3),
+            "serial": columns["serial"],
+            "name_code": name_code,
+            "element_code": element_code,
+            "residue_index": residue_index,
+            "chain_index": chain_index,
+            "model_index": model_index,
+            "occupancy": columns["occupancy"],
+            "bfactor": columns["bfactor"],
+            "segid": columns["segid"],
+            "charge": columns["charge"],
+            "radius": radius,
+            "polarity": polarity,
+            "residue_name_code": residue_name_code,
+            "residue_seq": columns["resseq"][starts],
+            "residue_icode": np.ascontiguousarray(raw[:, 26:27]).view("S1").ravel()[starts],
+            "residue_chain": chain_index[starts],
+        }
+        tables = {
+            "atom_names": atom_names,
+            "residue_names": residue_names,
+            "elements": elements,
+            "chains": chains,
+            "models": models or [1],
+        }
+        return cls(arrays, tables, source)
+
+    @classmethod
+    def from_lines(cls, lines, source=None):
+        models = []
+        model = 0
+        records, model_of, extended = [], [], []
+        for line in lines:
+            record = line[:6]
+            if record in ATOM_RECORDS:
+                line = line.rstrip(b"\r\n")
+                records.append(line.ljust(LINE_WIDTH)[:LINE_WIDTH])
+                extended.append(line[LINE_WIDTH:].strip())
+                model_of.append(model)
+            elif record == b"MODEL ":
+                serial = int(line[10:14]) if line[10:14].strip() else len(models) + 1
+                if records or models:
+                    model += 1
+                models.append(serial)
+        n = len(records)
+        raw = np.frombuffer(b"".join(records), dtype="S1").reshape(n, LINE_WIDTH)
+
+        def field(start, end):
+            return np.ascontiguousarray(raw[:, start:end]).view(f"S{end - start}").ravel()
+
+        chain = field(21, 22)
+        extended = np.array(extended, dtype=bytes)
+        if n and (extended != b"").any():
+            chain = np.where(extended != b"", extended, chain)
+        columns = {
+            "serial": int_column(field(6, 11)),
+            "chain": chain,
+            "resname": np.char.strip(field(17, 20)),
+            "resseq": int_column(field(22, 26)),
+            "element": field(76, 78),
+            "occupancy": float_column(field(54, 60)),
+            "bfactor": float_column(field(60, 66)),
+            "segid": field(72, 76),
+            "charge": field(78, 80),
+        }
+        xyz = np.stack([field(30, 38), field(38, 46), field(46, 54)], axis=1).astype(np.float64)
+        return cls.from_records(field(0, 30), xyz, columns, np.array(model_of, dtype=np.int32), models, source)
+
+    @classmethod
+    def from_mmcif(cls, path):
+        """Structure of the _atom_site records of an mmCIF or BinaryCIF file (auth_* fields preferred)."""
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Input structure file not found: {path}")
+        site = mmcif.read_atom_site(path)
+        n = len(next(iter(site.values())))
+
+        def text(*names):
+            for name in names:
+                if name in site:
+                    values = site[name]
+                    return values if values.dtype.kind == "S" else np.char.mod("%d", values).astype(bytes)
+            return np.full(n, b"", dtype="S1")
+
+        def number(name, dtype, default):
+            values = site.get(name)
+            if values is None:
+                return np.full(n, default, dtype=dtype)
+            if values.dtype.kind == "S":
+                values = np.where(values == b"", str(default).encode(), values).astype(np.float64)
+            return values.astype(dtype)
+
+        chain = text("auth_asym_id", "label_asym_id")
+        bad = sorted({c.decode() for c in set(chain.tolist())
+                      if not re.fullmatch(CHAIN_ID_PATTERN, c.decode())})
+        if bad:
+            raise ValueError(f"{path}: unsupported chain IDs {', '.join(map(repr, bad))} "
+                             f"(expected {CHAIN_ID_PATTERN})")
+        atom = text("auth_atom_id", "label_atom_id")
+        element = np.char.upper(text("type_symbol"))
+        serial = number("id", np.int64, 0)
+        resseq = number("auth_seq_id", np.int64, 0) if "auth_seq_id" in site else number("label_seq_id", np.int64, 0)
+        charge = number("pdbx_formal_charge", np.int64, 0)
+        models, model_index = intern(number("pdbx_PDB_model_num", np.int64, 1))
+
+        def blank_one(values):
+            return np.where(values == b"", b" ", values).astype("S1")
+
+        # PDB alignment: names of up to 3 characters of one-letter elements start in column 14
+        short = (np.char.str_len(atom) < 4) & (np.char.str_len(element) == 1)
+        name = np.where(short, np.char.add(b" ", np.char.ljust(atom, 3)), np.char.ljust(atom, 4)).astype("S4")
+        resname = text("auth_comp_id", "label_comp_id")
+        labels = np.char.ljust(text("group_PDB"), 6).astype("S6")
+        for part in (hybrid36_column(serial, 5), b" ", name, blank_one(text("label_alt_id")),
+                     np.char.rjust(resname.astype("S3"), 3), b" ", blank_one(chain),
+                     hybrid36_column(resseq, 4), blank_one(text("pdbx_PDB_ins_code")), b"   "):
+            labels = np.char.add(labels, part)
+
+        columns = {
+            "serial": serial,
+            "chain": chain,
+            "resname": resname,
+            "resseq": resseq,
+            "element": element,
+            "occupancy": number("occupancy", np.float64, np.nan),
+            "bfactor": number("B_iso_or_equiv", np.float64, np.nan),
+            "segid": np.full(n, b"    ", dtype="S4"),
+            "charge": np.where(charge == 0, b"  ", np.char.add(np.char.mod("%d", np.abs(charge)).astype(bytes),
+                                                               np.where(charge > 0, b"+", b"-"))).astype("S2"),
+        }
+        xyz = np.stack([number(f"Cartn_{axis}", np.float64, np.nan) for axis in "xyz"], axis=1)
+        return cls.from_records(labels.astype("S30"), xyz, columns, model_index, [int(m) for m in models], path)
+
+    @classmethod
+    def from_pdb(cls, pdb_path, use_mmap=False):
+        """Parse the ATOM/HETATM records of a PDB file in one pass."""
+        if not os.path.isfile(pdb_path):
+            raise FileNotFoundError(f"Input PDB file not found: {pdb_path}")
+        return cls.from_lines(iter_lines(pdb_path, use_mmap), source=pdb_path)
+
+    # ----------------------
+    # 2. Views
+    # ----------------------
+    def take(self, mask):
+        """Structure of the selected atoms (residues renumbered, tables shared)."""
+        keep = np.flatnonzero(mask)
+        used, residue_index = np.unique(self.residue_index[keep], return_inverse=True)
+        arrays = {name: getattr(self, name)[keep] for name in ATOM_ARRAYS}
+        arrays["residue_index"] = residue_index.astype(np.int32)
+        arrays.update({name: getattr(self, name)[used] for name in RESIDUE_ARRAYS})
+        return Structure(arrays, {name: getattr(self, name) for name in TABLES}, self.source)
+
+    def chain(self, chain_id):
+        return self.take(self.chain_ids == chain_id)
+
+    def model(self, index):
+        """Structure of the index-th model (in file order), as a single-model structure."""
+        sub = self.take(self.model_index == index)
+        sub.model_index = np.zeros(len(sub), dtype=np.int32)
+        sub.models = [self.models[index]]
+        return sub
+
+    def first_model(self):
+        """The structure itself if it has one model, else model(0)."""
+        return self if len(self.models) <= 1 else self.model(0)
+
+    def pdb_lines(self, rows=None):
+        """
+        80-column ATOM/HETATM records (bytes) of the given rows, rebuilt from
+        the columns; chain IDs longer than column 22 follow in columns 81+.
+        """
+        rows = range(len(self)) if rows is None else rows
+        elements = [e.encode() for e in self.elements]
+        extended = [chain.encode() if len(chain) > 1 else b"" for chain in self.chains]
+        lines = []
+        for i in rows:
+            occ, bfac = self.occupancy[i], self.bfactor[i]
+            x, y, z = self.xyz[i]
+            lines.append(
+                self.labels[i]
+                + b"%8.3f%8.3f%8.3f" % (x, y, z)
+                + (b"      " if np.isnan(occ) else b"%6.2f" % occ)
+                + (b"      " if np.isnan(bfac) else b"%6.2f" % bfac)
+                + b"      " + self.segid[i].ljust(4) + elements[self.element_code[i]].rjust(2)
+                + self.charge[i].ljust(2) + extended[self.chain_index[i]]
+            )
+        return lines
+
+    # ----------------------
+    # 3. Binary file
+    # ----------------------
+    def save(self, path):
+        """Write a single binary file: MAGIC, header length, JSON header, aligned arrays."""
+        arrays = {name: np.ascontiguousarray(getattr(self, name)) for name in ATOM_ARRAYS + RESIDUE_ARRAYS}
+        header = {
+            "tables": {name: getattr(self, name) for name in TABLES},
+            "source": self.source,
+            "arrays": {},
+        }
+        sizes = {name: -(-arr.nbytes // ALIGN) * ALIGN for name, arr in arrays.items()}
+        # The array offsets depend on the header size and vice versa: grow until they agree
+        data_start = 0
+        while True:
+            offset = data_start
+            for name, arr in arrays.items():
+                header["arrays"][name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+                offset += sizes[name]
+            blob = json.dumps(header).encode()
+            needed = -(-(len(MAGIC) + 8 + len(blob)) // ALIGN) * ALIGN
+            if needed <= data_start:
+                break
+            data_start = needed
+        blob = blob.ljust(data_start - len(MAGIC) - 8)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + len(blob).to_bytes(8, "little") + blob)
+            for name, arr in arrays.items():
+                f.seek(header["arrays"][name]["offset"])
+                f.write(arr.tobytes())
+            f.truncate(max([data_start] + [spec["offset"] + arrays[name].nbytes
+                                           for name, spec in header["arrays"].items()]))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, use_mmap=True):
+        """Read a file written by save(); with use_mmap the arrays are read-only views of the file."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a structure file")
+            header = json.loads(f.read(int.from_bytes(f.read(8), "little")))
+        data = np.memmap(path, dtype=np.uint8, mode="r") if use_mmap else np.fromfile(path, dtype=np.uint8)
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            arrays[name] = data[spec["offset"]:spec["offset"] + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+        return cls(arrays, header["tables"], header["source"])
+
+
+def load_structure(source, use_mmap=False, all_models=False):
+    """
+    A Structure from a Structure, a saved structure file, an mmCIF/BinaryCIF
+    file or a PDB file.  Only the first model is kept unless ``all_models``.
+    """
+    if isinstance(source, Structure):
+        structure = source
+    elif not is_pdb(source):
+        structure = Structure.from_mmcif(source)
+    else:
+        with open(source, "rb") as f:
+            is_binary = f.read(len(MAGIC)) == MAGIC
+        structure = Structure.load(source) if is_binary else Structure.from_pdb(source, use_mmap)
+    return structure if all_models else structure.first_model()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse a PDB/mmCIF file once and save it as a memory-mappable "
+                                                 "structure file")
+    parser.add_argument("pdb", help="Input PDB, mmCIF or BinaryCIF file")
+    parser.add_argument("out", help="Output structure file (e.g. input/8ucu.struct)")
+    parser.add_argument("--mmap", action="store_true", help="Read the input through a memory map")
+    args = parser.parse_args()
+
+    structure = load_structure(args.pdb, args.mmap, all_models=True)
+    structure.save(args.out)
+    print(f"✅ {args.out}: {len(structure)} atoms, {structure.n_residues} residues, chains {','.join(structure.chains)}")
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Interface ΔASA over the frames of an NMR ensemble or an MD trajectory.
+
+Frames are the models of a multi-model PDB/mmCIF file, or come from a
+coordinate file that holds the atoms of a topology (the first model of a
+PDB/mmCIF file) in the same order: a NumPy .npy array of shape
+(frames, atoms, 3) in Å, a CHARMM/NAMD .dcd trajectory or another
+multi-model file.  Coordinates are memory-mapped and read frame by frame.
+
+Atom selection and typing (radii, polarity, residues, chains) and the chain
+partners are set up once from the topology; a frame only brings new
+coordinates.  Neighbours come from a Verlet list: candidate pairs are
+searched with ``skin`` Å added to every pair's reach, and each frame keeps
+the candidates that overlap at its own coordinates.  The search is repeated
+only after an atom has moved more than skin / 2 since the last one, so every
+frame gets the same neighbours, and areas, as a fresh search.
+
+Chunks of consecutive frames are spread over a process pool whose workers
+set the topology up once.  Outputs in ``out_dir``:
+
+    <id>_trajectory_summary.csv   one row per frame: the interface summary
+                                  (total_atoms, total_area, propensity_score, ...)
+    <id>_residue_occupancy.csv    one row per residue that is ever at the
+                                  interface: frames, occupancy (fraction of
+                                  frames) and mean ΔASA over all frames
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import chain_contacts
+import compute_summary
+import sasa
+from background_store import BackgroundStore, parse_set
+from generate_ints import MIN_DELTA
+from naccess_runner import available_cores
+from structure import Structure, file_id, hybrid36_value, load_structure
+
+DEFAULT_SKIN = 2.0
+# Frames per work item when --chunk is not given: about four items per worker
+CHUNKS_PER_WORKER = 4
+
+# CHARMM/NAMD DCD: an 84-byte header record ("CORD" + 20 control words)
+DCD_HEADER = 84
+
+
+# ----------------------
+# 1. Frames
+# ----------------------
+class DcdFrames:
+    """Coordinates of a CHARMM/NAMD .dcd file; frames[i] is an (atoms, 3) float32 array."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            head = f.read(4 + DCD_HEADER + 4)
+            endian = next((e for e in "<>" if np.frombuffer(head[:4], dtype=f"{e}i4")[0] == DCD_HEADER), None)
+            if endian is None or head[4:8] != b"CORD":
+                raise ValueError(f"{path} is not a DCD file")
+            control = np.frombuffer(head[8:88], dtype=f"{endian}i4")
+            title_size = int(np.frombuffer(f.read(4), dtype=f"{endian}i4")[0])
+            f.seek(title_size + 4, os.SEEK_CUR)
+            self.n_atoms = int(np.frombuffer(f.read(12), dtype=f"{endian}i4")[1])
+            offset = f.tell()
+        charmm = control[19] != 0
+        if control[8]:
+            raise ValueError(f"{path}: DCD files with fixed atoms are not supported")
+        if charmm and control[11]:
+            raise ValueError(f"{path}: 4-dimensional DCD files are not supported")
+
+        # Every Fortran record is framed by its length; the unit cell record is optional
+        fields = []
+        if charmm and control[10]:
+            fields += [("cell_head", f"{endian}i4"), ("cell", f"{endian}f8", 6), ("cell_tail", f"{endian}i4")]
+        for axis in "xyz":
+            fields += [(f"{axis}_head", f"{endian}i4"), (axis, f"{endian}f4", self.n_atoms),
+                       (f"{axis}_tail", f"{endian}i4")]
+        dtype = np.dtype(fields)
+        # The frame count of the header is not updated by every writer: count the complete frames
+        count = (os.path.getsize(path) - offset) // dtype.itemsize
+        self.records = (np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)) if count
+                        else np.zeros(0, dtype=dtype))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        record = self.records[index]
+        return np.stack([record["x"], record["y"], record["z"]], axis=-1)
+
+
+def model_frames(structure):
+    """(models, atoms, 3) coordinates of a multi-model structure whose models hold the same atoms."""
+    n_models = len(structure.models)
+    n = len(structure) // n_models
+    if n * n_models != len(structure) or (structure.model_index != np.repeat(np.arange(n_models), n)).any():
+        raise ValueError(f"{structure.source}: models differ in their number of atoms")
+    # Atom name, altloc, residue name, chain, residue number and icode (serials may run on across models)
+    names = structure.labels.view("S1").reshape(n_models, n, 30)[:, :, 12:27]
+    chains = structure.chain_index.reshape(n_models, n)
+    if (names != names[0]).any() or (chains != chains[0]).any():
+        raise ValueError(f"{structure.source}: models differ in their atoms")
+    return structure.xyz.reshape(n_models, n, 3)
+
+
+def open_frames(kind, path):
+    """Frame sequence of a coordinate source: "npy", "dcd" or "structure" (a saved structure file)."""
+    if kind == "npy":
+        frames = np.load(path, mmap_mode="r")
+        if frames.ndim != 3 or frames.shape[2] != 3:
+            raise ValueError(f"{path}: expected an array of shape (frames, atoms, 3), got {frames.shape}")
+        return frames
+    if kind == "dcd":
+        return DcdFrames(path)
+    return model_frames(Structure.load(path))
+
+
+def frame_atoms(frames):
+    """Number of atoms per frame of an open_frames() sequence."""
+    return frames.n_atoms if isinstance(frames, DcdFrames) else frames.shape[1]
+
+
+def prepare_frames(path, topology_path, work_dir):
+    """
+    (topology Structure, saved topology path, frame source, model serials)
+    of the inputs.  Parsed structures are saved into work_dir, so the
+    workers memory-map them instead of parsing them again.
+    """
+    if topology_path is not None and path.endswith((".npy", ".dcd")):
+        source = (path.rsplit(".", 1)[1], path)
+        models = None
+        topology = load_structure(topology_path)
+    else:
+        structure = load_structure(path, all_models=True)
+        source = ("structure", structure.save(os.path.join(work_dir, "frames.struct")))
+        models = structure.models
+        topology = load_structure(topology_path) if topology_path else structure.first_model()
+    saved = topology.save(os.path.join(work_dir, "topology.struct"))
+    n_atoms = frame_atoms(open_frames(*source))
+    if n_atoms != len(topology):
+        raise ValueError(f"{path} has {n_atoms} atoms per frame, the topology {len(topology)}")
+    return topology, saved, source, models
+
+
+# ----------------------
+# 2. Per-frame ΔASA
+# ----------------------
+class FrameEngine:
+    """Interface atoms of one topology frame by frame; typing, partners and the Verlet list are reused."""
+
+    def __init__(self, topology, interface_mode=chain_contacts.DEFAULT_MODE, probe=sasa.DEFAULT_PROBE,
+                 zslice=sasa.DEFAULT_ZSLICE, radii_path=sasa.DEFAULT_RADII, skin=DEFAULT_SKIN):
+        self.atoms = sasa.atoms_from_structure(topology, sasa.RadiiTable(radii_path))
+        # Partners by chain type: contacts change between frames, and chains out of contact bury nothing
+        self.partners = None if interface_mode == "all" else chain_contacts.type_partners(topology, interface_mode)
+        self.probe, self.zslice, self.skin = probe, zslice, skin
+        self.rad = sasa.expanded_radii(self.atoms.radii, probe)
+        self.chain_ids = self.atoms.chains
+        labels = self.atoms.labels
+        self.resname = np.array([label[17:20].strip() for label in labels])
+        self.resnum = np.array([hybrid36_value(label[22:26]) for label in labels], dtype=np.int64)
+        self.icode = np.array([label[26].strip() for label in labels])
+        self.reference = None   # coordinates of the last neighbour search
+        self.pairs = None       # candidate pairs (i, j) of that search, sorted by i then j
+        self.searches = 0
+
+    def neighbors(self, xyz):
+        """CSR neighbour lists of xyz, as NeighborGrid.neighbors gives them, from the Verlet list."""
+        n = len(xyz)
+        if self.reference is None or np.max(np.sum((xyz - self.reference) ** 2, axis=1), initial=0.0) \
+                > (self.skin / 2) ** 2:
+            cell = 2.0 * self.rad.max() + self.skin if n else 1.0
+            indptr, indices = sasa.NeighborGrid(xyz, cell).neighbors(self.rad + self.skin / 2)
+            self.pairs = np.repeat(np.arange(n), np.diff(indptr)), indices
+            self.reference = xyz.copy()
+            self.searches += 1
+        i, j = self.pairs
+        keep = np.sum((xyz[i] - xyz[j]) ** 2, axis=1) < (self.rad[i] + self.rad[j]) ** 2
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(i[keep], minlength=n), out=indptr[1:])
+        return indptr, j[keep]
+
+    def frame(self, frame):
+        """
+        (atoms, columns) of one frame's interface: the atom indices and their
+        .int columns (as generate_ints.int_arrays), chain by chain.
+        """
+        xyz = np.asarray(frame, dtype=np.float64)[self.atoms.rows]
+        complex_accs, chain_accs, candidates = sasa.chain_delta_sasa(
+            xyz, self.atoms.radii, self.chain_ids, self.probe, self.zslice, self.partners,
+            neighbors=self.neighbors(xyz))
+        # Same test as generate_ints: the .asa files' %8.3f values in single precision
+        asa_c = np.char.mod("%8.3f", complex_accs[candidates]).astype(np.float32)
+        asa_m = np.char.mod("%8.3f", chain_accs[candidates]).astype(np.float32)
+        hit = np.flatnonzero(asa_m - asa_c >= np.float32(MIN_DELTA))
+        # .int files come one per chain, in sorted chain order
+        hit = hit[np.argsort(self.chain_ids[candidates[hit]], kind="stable")]
+        atoms = candidates[hit]
+        return atoms, {
+            "resname": self.resname[atoms],
+            "chain": self.chain_ids[atoms],
+            "resnum": self.resnum[atoms],
+            "icode": self.icode[atoms],
+            "asa_chain": np.char.mod("%6.2f", asa_m[hit]).astype(np.float64),
+            "asa_complex": np.char.mod("%6.2f", asa_c[hit]).astype(np.float64),
+        }
+
+
+def topology_background(atoms):
+    """Amino-acid frequencies of the topology's ATOM residues: the background of a fresh pipeline run."""
+    names = [name[:3] for name, kind in zip(atoms.residue_names, atoms.residue_types) if kind == 1]
+    counts = {aa: names.count(aa) for aa in compute_summary.AMINO_ACIDS}
+    total = sum(counts.values())
+    return {aa: counts[aa] / total if total else 0 for aa in compute_summary.AMINO_ACIDS}
+
+
+def run_frames(engine, frames, indices, background):
+    """(summary rows, frames at the interface per residue, ΔASA sum per residue, searches) of some frames."""
+    n_residues = len(engine.atoms.residue_names)
+    counts = np.zeros(n_residues, dtype=np.int64)
+    delta = np.zeros(n_residues)
+    rows = []
+    searches = engine.searches
+    for index in indices:
+        atoms, columns = engine.frame(frames[index])
+        summary, _ = compute_summary.summarize(columns, background)
+        row = compute_summary.wide_summary(None, summary)
+        del row["pdb_id"]
+        rows.append({"frame": int(index), **row})
+        residues = engine.atoms.residue_index[atoms]
+        counts[np.unique(residues)] += 1
+        delta += np.bincount(residues, weights=columns["asa_chain"] - columns["asa_complex"], minlength=n_residues)
+    return rows, counts, delta, engine.searches - searches
+
+
+# Per-process state of the pool workers (set by init_worker)
+_worker = {}
+
+
+def init_worker(topology_path, source, options, background):
+    _worker["engine"] = FrameEngine(Structure.load(topology_path), **options)
+    _worker["frames"] = open_frames(*source)
+    _worker["background"] = background
+
+
+def run_chunk(indices):
+    return run_frames(_worker["engine"], _worker["frames"], indices, _worker["background"])
+
+
+# ----------------------
+# 3. Driver
+# ----------------------
+def residue_table(atoms, counts, delta, n_frames):
+    """Occupancy rows of the residues that were at the interface in at least one frame."""
+    rows = []
+    for r in np.flatnonzero(counts).tolist():
+        name = atoms.residue_names[r]
+        rows.append({
+            "chain": atoms.residue_chain(r),
+            "resnum": hybrid36_value(name[5:9]),
+            "icode": name[9].strip(),
+            "resname": name[:3].strip(),
+            "frames": int(counts[r]),
+            "occupancy": round(counts[r] / n_frames, 3),
+            "mean_delta_asa": round(delta[r] / n_frames, 2),
+        })
+    return pd.DataFrame(rows, columns=["chain", "resnum", "icode", "resname", "frames", "occupancy",
+                                       "mean_delta_asa"])
+
+
+def run_trajectory(path, out_dir="interface", topology=None, name=None, interface_mode=chain_contacts.DEFAULT_MODE,
+                   workers=None, chunk=None, start=0, stop=None, stride=1, skin=DEFAULT_SKIN,
+                   probe=sasa.DEFAULT_PROBE, zslice=sasa.DEFAULT_ZSLICE, background_db=None, background_set=None):
+    """
+    Per-frame interface summary and per-residue occupancy of the frames
+    ``start:stop:stride`` of ``path`` (see the module docstring), written as
+    <name>_trajectory_summary.csv and <name>_residue_occupancy.csv into
+    out_dir.  The residue background is the topology's own composition, or
+    the pinned ``background_set`` of the store at ``background_db``.
+
+    Returns {"frames", "summary", "occupancy"}: the frame count and the two tables.
+    """
+    name = name or file_id(topology or path)
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix=".trajectory-", dir=out_dir)
+    try:
+        topology, topology_path, source, models = prepare_frames(path, topology, work_dir)
+        options = {"interface_mode": interface_mode, "probe": probe, "zslice": zslice, "skin": skin}
+        engine = FrameEngine(topology, **options)
+        if background_set:
+            with BackgroundStore(background_db or os.path.join("rsa", "background.sqlite")) as store:
+                background = store.frequencies(*parse_set(background_set))
+        else:
+            background = topology_background(engine.atoms)
+
+        indices = list(range(*slice(start, stop, stride).indices(len(open_frames(*source)))))
+        if not indices:
+            raise ValueError(f"No frames selected from {path}")
+        workers = max(1, min(workers or available_cores(), len(indices)))
+        chunk = chunk or -(-len(indices) // (workers * CHUNKS_PER_WORKER))
+        chunks = [indices[i:i + chunk] for i in range(0, len(indices), chunk)]
+        print(f"🔄 {name}: {len(indices)} frames of {len(engine.atoms)} atoms, {len(chunks)} chunks "
+              f"on {workers} workers")
+
+        rows, searches = [], 0
+        counts = np.zeros(len(engine.atoms.residue_names), dtype=np.int64)
+        delta = np.zeros(len(counts))
+        if workers == 1:
+            frames = open_frames(*source)
+            results = (run_frames(engine, frames, part, background) for part in chunks)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=init_worker,
+                                       initargs=(topology_path, source, options, background))
+            results = pool.map(run_chunk, chunks)
+        try:
+            for part, (part_rows, part_counts, part_delta, part_searches) in zip(chunks, results):
+                rows += part_rows
+                counts += part_counts
+                delta += part_delta
+                searches += part_searches
+                print(f"✅ frames {part[0]}–{part[-1]}: mean interface area "
+                      f"{np.mean([row['total_area'] for row in part_rows]):.1f} Å²")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    summary = pd.DataFrame(rows)
+    if models is not None:
+        summary.insert(1, "model", [models[row["frame"]] for row in rows])
+    occupancy = residue_table(engine.atoms, counts, delta, len(indices))
+    summary_out = os.path.join(out_dir, f"{name}_trajectory_summary.csv")
+    occupancy_out = os.path.join(out_dir, f"{name}_residue_occupancy.csv")
+    summary.to_csv(summary_out, index=False)
+    occupancy.to_csv(occupancy_out, index=False)
+    print(f"✅ {len(indices)} frames ({searches} neighbour searches) → {summary_out}, {occupancy_out}")
+    return {"frames": len(indices), "summary": summary, "occupancy": occupancy}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-frame interface ΔASA of an NMR ensemble or MD trajectory")
+    parser.add_argument("frames", help="Multi-model PDB/mmCIF file, or with --topology a .npy/.dcd coordinate "
+                                       "file (or multi-model file) with the topology's atoms")
+    parser.add_argument("--topology", default=None, help="PDB/mmCIF file whose first model gives the atoms")
+    parser.add_argument("--name", default=None, help="Output file prefix (default: topology or input file name)")
+    parser.add_argument("--out-dir", default="interface", help="Directory for the two CSV files")
+    parser.add_argument("--interface-mode", choices=chain_contacts.MODES, default=chain_contacts.DEFAULT_MODE,
+                        help="protein_nucleic: ΔASA between protein and DNA/RNA chains; "
+                             "all: every chain against the whole complex")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: available cores)")
+    parser.add_argument("--chunk", type=int, default=None, help="Consecutive frames per work item")
+    parser.add_argument("--start", type=int, default=0, help="First frame (0-based)")
+    parser.add_argument("--stop", type=int, default=None, help="Stop before this frame")
+    parser.add_argument("--stride", type=int, default=1, help="Use every n-th frame")
+    parser.add_argument("--skin", type=float, default=DEFAULT_SKIN,
+                        help="Verlet-list margin (Å); neighbours are searched again after a move of skin / 2")
+    parser.add_argument("-p", "--probe", type=float, default=sasa.DEFAULT_PROBE, help="Probe radius (Å)")
+    parser.add_argument("-z", "--zslice", type=float, default=sasa.DEFAULT_ZSLICE, help="Z-slice width")
+    parser.add_argument("--background-db", default=None,
+                        help="Background store of --background-set (default: rsa/background.sqlite)")
+    parser.add_argument("--background-set", default=None, metavar="NAME[:VERSION]",
+                        help="Pinned residue background (default: the topology's own composition)")
+    args = parser.parse_args()
+
+    run_trajectory(args.frames, args.out_dir, args.topology, args.name, args.interface_mode, args.workers,
+                   args.chunk, args.start, args.stop, args.stride, args.skin, args.probe, args.zslice,
+                   args.background_db, args.background_set)